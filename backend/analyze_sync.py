@@ -2,16 +2,34 @@ import re
 import math
 import sys
 import os
+import glob
+import gzip
 import time
 import argparse
-from datetime import datetime
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
 from collections import defaultdict
 
+from collection import TOO_FAR, collection_outcome
+from journal import MAGIC, JournalReader, decode_records, is_journal, read_journals
+from logtail import LogFollower, split_lines
+
 # Configuration
 LOG_FILE = "game_state.log"
 ANALYSIS_LOG_FILE = "sync_analysis.log"
-MAX_COLLECTION_DISTANCE = 150  # Pixels. Player size ~80, Coin ~30. 150 is generous.
+CHECKPOINT_FILE = "sync_analysis.checkpoint"  # Monitor mode resumes from the offset saved here
 MAX_SPEED_THRESHOLD = 2000     # Pixels per second. Sanity check for teleportation.
+HISTORY_SIZE = 64              # Position updates kept per player (rolling window)
+MIN_WINDOW = 8                 # Updates in the window before the rolling checks below kick in
+TELEPORT_DISTANCE = 300        # Pixels in one update...
+TELEPORT_FACTOR = 4            # ...at this many times the player's recent average speed
+TELEPORT_BASELINE_SPEED = 50   # Pixels per second. Floor for that average (players standing still)
+JITTER_DISTANCE = 20           # Pixels. Steps up to this long count as jitter when they reverse direction
+JITTER_RATIO = 0.5             # Share of reversing steps in the window that counts as jittering
+
+EPOCH = datetime(1970, 1, 1)
 
 def log_output(message, to_console=True):
     """Log message to file and optionally to console"""
@@ -24,6 +42,87 @@ def log_output(message, to_console=True):
     with open(ANALYSIS_LOG_FILE, "a", encoding='utf-8') as f:
         f.write(formatted_message + "\n")
 
+class PositionHistory:
+    """
+    The last `size` position updates of an entity in a ring of arrays, so
+    memory stays the same however long the log is, with rolling speed,
+    acceleration and direction reversal figures over them.
+
+    Each update's speed is measured from the update before it, its
+    acceleration and reversal from the two before it. Once those have
+    dropped out of the ring the figures are zeroed, so the rolling values
+    only ever depend on the updates in the ring (and are summed with fsum,
+    independent of where the ring starts).
+    """
+
+    def __init__(self, size):
+        self.size = max(3, size)
+        self.count = 0
+        self.head = 0  # Slot of the next update
+        self.reversal_total = 0
+        # Allocated on the first update (items never move)
+        self.times = self.xs = self.ys = self.speeds = self.accels = self.reversals = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """(seconds since the epoch, x, y) oldest first"""
+        start = (self.head - self.count) % self.size
+        for i in range(self.count):
+            slot = (start + i) % self.size
+            yield self.times[slot], self.xs[slot], self.ys[slot]
+
+    def full(self):
+        return self.count == self.size
+
+    def append(self, t, x, y):
+        if self.times is None:
+            self.times, self.xs, self.ys, self.speeds, self.accels, self.reversals = (
+                array('d', bytes(8 * self.size)) for _ in range(6))
+        size, head, count = self.size, self.head, self.count
+        xs, ys, speeds = self.xs, self.ys, self.speeds
+        speed = accel = reversal = 0.0
+        if count:
+            prev = head - 1  # Negative indexes wrap around the arrays
+            dt = t - self.times[prev]
+            dx, dy = x - xs[prev], y - ys[prev]
+            step = math.hypot(dx, dy)
+            if dt > 0:
+                speed = step / dt
+            if count > 1:
+                if dt > 0:
+                    accel = (speed - speeds[prev]) / dt
+                pdx, pdy = xs[prev] - xs[prev - 1], ys[prev] - ys[prev - 1]
+                if (dx * pdx + dy * pdy < 0 and step <= JITTER_DISTANCE
+                        and math.hypot(pdx, pdy) <= JITTER_DISTANCE):
+                    reversal = 1.0
+        self.times[head], xs[head], ys[head] = t, x, y
+        speeds[head], self.accels[head], self.reversals[head] = speed, accel, reversal
+        self.reversal_total += int(reversal)  # The slot overwritten is the oldest one, already zeroed
+        self.head = (head + 1) % size
+        if count < size:
+            self.count = count + 1
+        else:
+            # The oldest update was overwritten: zero what was measured from it
+            oldest, second = self.head, (self.head + 1) % size
+            self.reversal_total -= int(self.reversals[oldest] + self.reversals[second])
+            self.speeds[oldest] = self.accels[oldest] = self.reversals[oldest] = 0.0
+            self.accels[second] = self.reversals[second] = 0.0
+
+    def mean_speed(self):
+        return math.fsum(self.speeds) / (self.count - 1) if self.count > 1 else 0.0
+
+    def max_acceleration(self):
+        return max(map(abs, self.accels)) if self.count > 2 else 0.0
+
+    def reversal_count(self):
+        return self.reversal_total
+
+    def jittering(self):
+        return (self.count >= min(MIN_WINDOW, self.size)
+                and self.reversal_total >= JITTER_RATIO * (self.count - 2))
+
 class GameEntity:
     def __init__(self, id, x, y, type=None, timestamp=None):
         self.id = id
@@ -31,21 +130,23 @@ class GameEntity:
         self.y = float(y)
         self.type = type
         self.last_update = timestamp
-        self.history = [] # List of (timestamp, x, y)
+        self.history = PositionHistory(HISTORY_SIZE)
 
     def update(self, x, y, timestamp):
         self.x = float(x)
         self.y = float(y)
         self.last_update = timestamp
-        self.history.append((timestamp, self.x, self.y))
+        self.history.append((timestamp - EPOCH).total_seconds(), self.x, self.y)
 
 class GameRoom:
-    def __init__(self, room_id):
+    def __init__(self, room_id, partial=False):
         self.room_id = room_id
         self.players = {}
         self.enemies = {}
         self.items = {} # Coins and Powerups
         self.anomalies = []
+        # Batch mode: events whose checks need state from earlier files, settled by merge_room()
+        self.unresolved = [] if partial else None
 
     def get_player(self, player_id):
         if player_id not in self.players:
@@ -59,12 +160,21 @@ class GameRoom:
             "message": message,
             "severity": severity
         })
-        # Immediate output for monitoring
-        log_output(f"ANOMALY in Room {self.room_id}: {anomaly_msg}")
+        # Immediate output for monitoring (partial rooms are reported once merged)
+        if self.unresolved is None:
+            log_output(f"ANOMALY in Room {self.room_id}: {anomaly_msg}")
+
+class PartialRooms(dict):
+    """Rooms of one file in batch mode, see merge_room()"""
+
+@lru_cache(maxsize=4096)
+def _parse_second(second_str):
+    return datetime.strptime(second_str, "%Y-%m-%d %H:%M:%S")
 
 def parse_timestamp(ts_str):
     # Format: 2025-12-03 10:15:30,123
-    return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S,%f")
+    # strptime only runs once per distinct second, the milliseconds are added on
+    return _parse_second(ts_str[:19]) + timedelta(milliseconds=int(ts_str[20:23]))
 
 def calculate_distance(x1, y1, x2, y2):
     return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
@@ -78,6 +188,11 @@ def parse_pos(pos_str):
     except:
         return 0.0, 0.0
 
+def get_room(rooms, room_id):
+    if room_id not in rooms:
+        rooms[room_id] = GameRoom(room_id, partial=isinstance(rooms, PartialRooms))
+    return rooms[room_id]
+
 def process_line(line, rooms, patterns):
     base_pattern, player_state_pattern, spawn_pattern, collect_pattern = patterns
     
@@ -87,93 +202,284 @@ def process_line(line, rooms, patterns):
 
     ts_str, room_id, msg_type, content = match.groups()
     timestamp = parse_timestamp(ts_str)
-
-    if room_id not in rooms:
-        rooms[room_id] = GameRoom(room_id)
-    room = rooms[room_id]
+    room = get_room(rooms, room_id)
 
     if msg_type == "PLAYER_STATE":
         m = player_state_pattern.search(content)
         if m:
             pid, pos_str = m.groups()
             x, y = parse_pos(pos_str)
-            
-            player = room.get_player(pid)
-            
-            # Speed Check
-            if player.last_update:
-                dt = (timestamp - player.last_update).total_seconds()
-                if dt > 0:
-                    dist = calculate_distance(player.x, player.y, x, y)
-                    
-                    # Ignore small movements (jitter) to prevent false positives on high-frequency updates
-                    # Only check speed if distance is significant (> 20px)
-                    if dist > 20:
-                        speed = dist / dt
-                        if speed > MAX_SPEED_THRESHOLD:
-                            room.log_anomaly(timestamp, f"Player {pid} moved too fast: {speed:.2f} px/s (Dist: {dist:.2f}, Time: {dt:.3f}s)", "SUSPICIOUS")
-            
-            player.update(x, y, timestamp)
+            apply_event(room, timestamp, msg_type, pid, x, y)
 
     elif msg_type in ["COIN_SPAWN", "ENEMY_SPAWN", "POWERUP_SPAWN"]:
         m = spawn_pattern.search(content)
         if m:
             eid, pos_str = m.groups()
             x, y = parse_pos(pos_str)
-            # Store item authoritative position
-            room.items[eid] = GameEntity(eid, x, y, type=msg_type, timestamp=timestamp)
+            apply_event(room, timestamp, msg_type, eid, x, y)
 
     elif msg_type == "ITEM_COLLECT":
         m = collect_pattern.search(content)
         if m:
-            pid, itype, iid = m.groups()
-            
-            if iid in room.items:
-                item = room.items[iid]
+            pid, itype, iid, pos_str = m.groups()
+            x, y = parse_pos(pos_str) if pos_str else (None, None)
+            apply_event(room, timestamp, msg_type, pid, x, y, item_type=itype, item_id=iid)
+
+def process_record(record, rooms):
+    """process_line for a journal record (journal.py) - the fields come parsed already"""
+    room = get_room(rooms, record.room)
+    if record.x == record.x:
+        x, y = record.x, record.y
+    elif record.type == "ITEM_COLLECT":
+        x = y = None  # Collector's position not logged, process_line does the same
+    else:
+        x = y = 0.0  # Missing positions count as (0, 0), like parse_pos does for text lines
+    apply_event(room, datetime.fromtimestamp(record.ts), record.type, record.entity_id, x, y,
+                item_type=record.kind, item_id=record.item_id)
+
+def check_speed(room, timestamp, pid, dist, dt):
+    # Ignore small movements (jitter) to prevent false positives on high-frequency updates
+    # Only check speed if distance is significant (> 20px)
+    if dist > 20:
+        speed = dist / dt
+        if speed > MAX_SPEED_THRESHOLD:
+            room.log_anomaly(timestamp, f"Player {pid} moved too fast: {speed:.2f} px/s (Dist: {dist:.2f}, Time: {dt:.3f}s)", "SUSPICIOUS")
+
+def check_teleport(room, timestamp, pid, history, dist, dt):
+    # A jump far beyond the player's recent speed, even if it stays under MAX_SPEED_THRESHOLD
+    speed = dist / dt
+    if dist <= TELEPORT_DISTANCE or speed > MAX_SPEED_THRESHOLD:
+        return  # Short step, or already reported by check_speed
+    if len(history) < min(MIN_WINDOW, history.size):
+        return
+    recent = history.mean_speed()
+    if speed > TELEPORT_FACTOR * max(recent, TELEPORT_BASELINE_SPEED):
+        room.log_anomaly(timestamp, f"Player {pid} teleported: {dist:.2f}px at {speed:.2f} px/s (Recent avg: {recent:.2f} px/s, Peak accel: {history.max_acceleration():.0f} px/s², Time: {dt:.3f}s)", "SUSPICIOUS")
+
+def track_player(room, timestamp, pid, player, x, y):
+    history = player.history
+    
+    # Speed and Teleport Checks
+    if player.last_update:
+        dt = (timestamp - player.last_update).total_seconds()
+        if dt > 0:
+            dist = calculate_distance(player.x, player.y, x, y)
+            check_speed(room, timestamp, pid, dist, dt)
+            check_teleport(room, timestamp, pid, history, dist, dt)
+    
+    # Jitter Check: reported when the window starts reversing back and forth, not on every update after
+    was_jittering = history.jittering()
+    player.update(x, y, timestamp)
+    if not was_jittering and history.jittering():
+        room.log_anomaly(timestamp, f"Player {pid} is jittering: {history.reversal_count()} direction reversals in the last {len(history)} updates (Avg speed: {history.mean_speed():.2f} px/s)")
+
+def check_collect(room, timestamp, pid, itype, iid, px, py, item):
+    # SYNC CHECK: Distance between Player and Item
+    # Player position is from their last state update (which might be slightly old, but usually frequent)
+    # Item position is from when it spawned (static for coins)
+    # Same tolerance rules as the live check in the server (collection.py),
+    # including the extra leeway below dropped coins (they fall due to gravity)
+    outcome, dist = collection_outcome(iid, px, py, item.x, item.y)
+    
+    if outcome == TOO_FAR:
+        room.log_anomaly(timestamp, 
+            f"SYNC ERROR: Player {pid} collected {itype} {iid} but was {dist:.2f}px away.\n"
+            f"      Player Pos: ({px:.1f}, {py:.1f})\n"
+            f"      Item Pos:   ({item.x:.1f}, {item.y:.1f})", 
+            "CRITICAL")
+
+def apply_event(room, timestamp, msg_type, entity_id, x=0.0, y=0.0, item_type=None, item_id=None):
+    if msg_type == "PLAYER_STATE":
+        pid = entity_id
+        player = room.players.get(pid)
+        if room.unresolved is not None and (player is None or not player.history.full()):
+            # The checks look back over the window, which needs the previous file's updates
+            # until this file has filled it
+            room.unresolved.append((timestamp, msg_type, pid, x, y, None, None))
+            room.get_player(pid).update(x, y, timestamp)
+        else:
+            track_player(room, timestamp, pid, room.get_player(pid), x, y)
+
+    elif msg_type in ["COIN_SPAWN", "ENEMY_SPAWN", "POWERUP_SPAWN"]:
+        # Store item authoritative position
+        room.items[entity_id] = GameEntity(entity_id, x, y, type=msg_type, timestamp=timestamp)
+
+    elif msg_type == "ITEM_COLLECT":
+        pid, itype, iid = entity_id, item_type, item_id
+        # Logged with the collection when known, otherwise the player's last PLAYER_STATE
+        position = (x, y) if x is not None else None
+        
+        if room.unresolved is not None and (iid not in room.items or (position is None and pid not in room.players)):
+            # Player or item may come from an earlier file - keep what this file knows for merge_room()
+            player, item = room.players.get(pid), room.items.get(iid)
+            room.unresolved.append((timestamp, msg_type, pid, position or (player and (player.x, player.y)),
+                                    item and (item.x, item.y), itype, iid))
+        elif iid in room.items:
+            if position is None:
                 player = room.get_player(pid)
-                
-                # SYNC CHECK: Distance between Player and Item
-                # Player position is from their last state update (which might be slightly old, but usually frequent)
-                # Item position is from when it spawned (static for coins)
-                
-                dist = calculate_distance(player.x, player.y, item.x, item.y)
-                
-                # Special handling for dropped coins (they fall due to gravity)
-                # If it's a dropped coin, we allow a larger Y-distance downwards
-                is_dropped_coin = "coin_drop_" in iid
-                
-                # Calculate vertical distance (Player Y - Item Y)
-                # Positive means player is below item (item fell)
-                dy = player.y - item.y
-                
-                threshold = MAX_COLLECTION_DISTANCE
-                
-                # If it's a dropped coin and the player is below the spawn point (gravity), allow more leeway
-                if is_dropped_coin and dy > 0:
-                    # Allow up to 400px drop distance (approx 2-3 screen heights of falling)
-                    if dy < 400 and abs(player.x - item.x) < MAX_COLLECTION_DISTANCE:
-                        # Valid drop collection
-                        pass
-                    elif dist > threshold:
-                         room.log_anomaly(timestamp, 
-                            f"SYNC ERROR: Player {pid} collected {itype} {iid} but was {dist:.2f}px away.\n"
-                            f"      Player Pos: ({player.x:.1f}, {player.y:.1f})\n"
-                            f"      Item Pos:   ({item.x:.1f}, {item.y:.1f})", 
-                            "CRITICAL")
-                elif dist > threshold:
-                    room.log_anomaly(timestamp, 
-                        f"SYNC ERROR: Player {pid} collected {itype} {iid} but was {dist:.2f}px away.\n"
-                        f"      Player Pos: ({player.x:.1f}, {player.y:.1f})\n"
-                        f"      Item Pos:   ({item.x:.1f}, {item.y:.1f})", 
-                        "CRITICAL")
+                position = player.x, player.y
+            check_collect(room, timestamp, pid, itype, iid, *position, room.items[iid])
+        else:
+            # Item not found in server memory (maybe spawned before log started?)
+            pass
+
+def merge_room(room, part):
+    """
+    Reduce step of batch mode: fold part (the room as seen by one file) into
+    room (the same room after all earlier files), with the same result as
+    reading the files one after the other
+    """
+    # Checks that needed the earlier files, against the merged state
+    replayed = GameRoom(room.room_id, partial=True)
+    replayed.players, replayed.items = room.players, room.items
+    for timestamp, msg_type, pid, a, b, itype, iid in part.unresolved:
+        if msg_type == "PLAYER_STATE":
+            track_player(replayed, timestamp, pid, replayed.get_player(pid), a, b)
+        else:
+            item = GameEntity(iid, *b) if b else room.items.get(iid)
+            if item:
+                if a:
+                    px, py = a
                 else:
-                    # Valid collection
-                    pass
+                    player = replayed.get_player(pid)
+                    px, py = player.x, player.y
+                check_collect(replayed, timestamp, pid, itype, iid, px, py, item)
+
+    # Anomalies in event order, echoed like a sequential run would
+    for a in sorted(replayed.anomalies + part.anomalies, key=lambda a: a["timestamp"]):
+        room.log_anomaly(a["timestamp"], a["message"], a["severity"])
+
+    # Players whose window filled up within the file were checked there, the rest were replayed above
+    for pid, player in part.players.items():
+        if player.history.full():
+            room.players[pid] = player
+    room.items.update(part.items)
+
+# Regex patterns
+PATTERNS = (
+    re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - \[ROOM:(.*?)\] \[(.*?)\] (.*)'),
+    re.compile(r'Player:(.*?) Pos:(\(.*?\))'),
+    re.compile(r'ID:(.*?) Pos:(\(.*?\))'),
+    re.compile(r'Player:(.*?) Type:(.*?) ID:(.*?)(?: Pos:(\(.*?\)))?$')
+)
+
+def read_text_log(filepath, rooms):
+    with open_log(filepath) as f:
+        for line in f:
+            process_line(line, rooms, PATTERNS)
+
+def read_journal(filepath, rooms):
+    # Rotated backups first, see journal.py
+    for record in read_journals(filepath):
+        process_record(record, rooms)
+
+def monitor_log(filepath, rooms, checkpoint=CHECKPOINT_FILE, resume=True):
+    """
+    Follow a log or journal as it is written (logtail.py): waits on inotify
+    (or polls), keeps going across rotation, and resumes from the offset in
+    checkpoint instead of re-reading the whole log on a restart
+    """
+    journal = is_journal(filepath)
+    if journal:
+        follower = LogFollower(filepath, decode_records, MAGIC, checkpoint, resume=resume)
+    else:
+        follower = LogFollower(filepath, split_lines, checkpoint=checkpoint, resume=resume)
+    if checkpoint and follower.offset > len(MAGIC if journal else b""):
+        log_output(f"Resuming from byte {follower.offset} (checkpoint {checkpoint})")
+
+    def process(events):
+        for event in events:
+            if journal:
+                process_record(event, rooms)
             else:
-                # Item not found in server memory (maybe spawned before log started?)
-                pass
+                process_line(event, rooms, PATTERNS)
+        follower.save_checkpoint()  # Only once the events were applied
+
+    try:
+        process(follower.read())
+        log_output(f"Caught up with existing logs. Monitoring for new events ({follower.watcher.name})...")
+        while True:
+            follower.wait()
+            process(follower.read())
+    finally:
+        follower.close()
+
+def open_log(filepath):
+    # Rotated logs may have been gzip'd
+    with open(filepath, 'rb') as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    return gzip.open(filepath, 'rt') if gzipped else open(filepath, 'r')
 
-def analyze_logs(filepath, monitor=False):
+def rotation_order(filepath):
+    # game_state.log.3(.gz) is older than game_state.log.1, which is older than game_state.log
+    name = filepath[:-3] if filepath.endswith(".gz") else filepath
+    suffix = name.rsplit(".", 1)[-1]
+    base = name[:-len(suffix) - 1] if suffix.isdigit() else name
+    return (base, -int(suffix) if suffix.isdigit() else 0, filepath)
+
+def analyze_file(filepath):
+    """Batch mode worker: the rooms of one file, partial until merged"""
+    rooms = PartialRooms()
+    if is_journal(filepath):
+        reader = JournalReader(filepath)
+        try:
+            for record in reader.records():
+                process_record(record, rooms)
+        finally:
+            reader.close()
+    else:
+        read_text_log(filepath, rooms)
+    return dict(rooms)
+
+def set_history_size(size):
+    # Batch mode workers use the parent's --history
+    global HISTORY_SIZE
+    HISTORY_SIZE = size
+
+def analyze_batch(pattern, workers=None):
+    """
+    Analyze every file matching pattern (rotated and gzip'd logs, journals),
+    one process per file, and merge the per-room results in rotation order
+    """
+    files = sorted(glob.glob(pattern), key=rotation_order)
+    rooms = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_history_size, initargs=(HISTORY_SIZE,)) as executor:
+        # map() hands the results back in file order, each one is merged as soon as it's in
+        for filepath, parts in zip(files, executor.map(analyze_file, files)):
+            log_output(f"Merged {filepath}", to_console=False)
+            for room_id, part in parts.items():
+                merge_room(get_room(rooms, room_id), part)
+    return files, rooms
+
+def print_report(rooms):
+    print("\n" + "="*60)
+    print("SYNC ANALYSIS REPORT")
+    print("="*60)
+
+    for room_id, room in rooms.items():
+        print(f"\nROOM: {room_id}")
+        print(f"Players: {list(room.players.keys())}")
+        print(f"Items Tracked: {len(room.items)}")
+        
+        if not room.anomalies:
+            print("✅ No sync anomalies detected.")
+        else:
+            print(f"⚠️  {len(room.anomalies)} ANOMALIES DETECTED:")
+            for a in room.anomalies:
+                icon = "🔴" if a['severity'] == "CRITICAL" else "🟠"
+                print(f"  {icon} [{a['timestamp'].strftime('%H:%M:%S')}] {a['message']}")
+
+    print("\n" + "="*60)
+    print("INTERPRETATION GUIDE:")
+    print("1. 'SYNC ERROR' (Critical): Player collected an item that the server thinks is far away.")
+    print("   - This usually means the Player's local map is different from the Host's map.")
+    print("   - The Player sees the item at X, but Host spawned it at Y.")
+    print("2. 'Moved too fast' (Suspicious): Lag spike or teleportation.")
+    print("3. 'Teleported' (Suspicious): A jump far beyond the player's recent speed - a lost stretch of updates or a position reset.")
+    print("4. 'Jittering' (Warning): The position keeps flipping back and forth by a few pixels - competing position corrections.")
+    print("="*60)
+
+def analyze_logs(filepath, monitor=False, checkpoint=CHECKPOINT_FILE, resume=True):
     if not os.path.exists(filepath):
         if monitor:
             log_output(f"Waiting for log file '{filepath}' to be created...")
@@ -187,63 +493,49 @@ def analyze_logs(filepath, monitor=False):
     
     rooms = {}
     
-    # Regex patterns
-    patterns = (
-        re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - \[ROOM:(.*?)\] \[(.*?)\] (.*)'),
-        re.compile(r'Player:(.*?) Pos:(\(.*?\))'),
-        re.compile(r'ID:(.*?) Pos:(\(.*?\))'),
-        re.compile(r'Player:(.*?) Type:(.*?) ID:(.*)')
-    )
-
-    with open(filepath, 'r') as f:
-        # Process existing lines
-        for line in f:
-            process_line(line, rooms, patterns)
-            
+    # Binary event journals (game_state.journal) need no parsing, text logs go through the regexes
+    try:
         if monitor:
-            log_output("Caught up with existing logs. Monitoring for new events...")
-            try:
-                while True:
-                    line = f.readline()
-                    if not line:
-                        time.sleep(0.1)
-                        continue
-                    process_line(line, rooms, patterns)
-            except KeyboardInterrupt:
-                log_output("Monitoring stopped by user.")
-                return
+            monitor_log(filepath, rooms, checkpoint, resume)
+        elif is_journal(filepath):
+            read_journal(filepath, rooms)
+        else:
+            read_text_log(filepath, rooms)
+    except KeyboardInterrupt:
+        log_output("Monitoring stopped by user.")
+        return
 
     # Generate Report (Only for non-monitor mode)
     if not monitor:
-        print("\n" + "="*60)
-        print("SYNC ANALYSIS REPORT")
-        print("="*60)
-
-        for room_id, room in rooms.items():
-            print(f"\nROOM: {room_id}")
-            print(f"Players: {list(room.players.keys())}")
-            print(f"Items Tracked: {len(room.items)}")
-            
-            if not room.anomalies:
-                print("✅ No sync anomalies detected.")
-            else:
-                print(f"⚠️  {len(room.anomalies)} ANOMALIES DETECTED:")
-                for a in room.anomalies:
-                    icon = "🔴" if a['severity'] == "CRITICAL" else "🟠"
-                    print(f"  {icon} [{a['timestamp'].strftime('%H:%M:%S')}] {a['message']}")
-
-        print("\n" + "="*60)
-        print("INTERPRETATION GUIDE:")
-        print("1. 'SYNC ERROR' (Critical): Player collected an item that the server thinks is far away.")
-        print("   - This usually means the Player's local map is different from the Host's map.")
-        print("   - The Player sees the item at X, but Host spawned it at Y.")
-        print("2. 'Moved too fast' (Suspicious): Lag spike or teleportation.")
-        print("="*60)
+        print_report(rooms)
+
+def analyze_logs_batch(pattern, workers=None):
+    log_output(f"Analyzing {pattern} (Batch Mode)...")
+    files, rooms = analyze_batch(pattern, workers)
+    if not files:
+        print(f"Error: No log files match '{pattern}'.")
+        return
+    log_output(f"Analyzed {len(files)} files.")
+    print_report(rooms)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Analyze game state logs for sync issues.')
-    parser.add_argument('logfile', nargs='?', default=LOG_FILE, help='Path to the log file')
+    parser.add_argument('logfile', nargs='?', default=LOG_FILE,
+                        help='Path to the log file (game_state.log, or the binary game_state.journal)')
     parser.add_argument('--monitor', '-m', action='store_true', help='Run in continuous monitoring mode')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE,
+                        help=f'Offset checkpoint for --monitor to resume from (default: {CHECKPOINT_FILE})')
+    parser.add_argument('--from-start', action='store_true', help='Ignore the --monitor checkpoint and read the whole log')
+    parser.add_argument('--batch', '-b', action='store_true',
+                        help='Treat logfile as a glob of rotated logs (e.g. "game_state.log*", .gz included) '
+                             'and analyze the files in parallel')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes for --batch (default: CPU count)')
+    parser.add_argument('--history', type=int, default=HISTORY_SIZE,
+                        help=f'Position updates kept per player for the rolling checks (default: {HISTORY_SIZE})')
     
     args = parser.parse_args()
-    analyze_logs(args.logfile, args.monitor)
+    set_history_size(args.history)
+    if args.batch:
+        analyze_logs_batch(args.logfile, args.workers)
+    else:
+        analyze_logs(args.logfile, args.monitor, args.checkpoint, resume=not args.from_start)
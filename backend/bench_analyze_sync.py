@@ -0,0 +1,84 @@
+"""
+Benchmark for analyze_sync.py: one file at a time vs batch mode
+
+Writes a rotated set of synthetic game_state logs (every other one gzip'd)
+to a temporary directory and prints lines/s for a sequential read of the
+files and for analyze_batch() with 1..N worker processes.
+Run with: python bench_analyze_sync.py [lines] [files]
+"""
+
+import glob
+import gzip
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import analyze_sync
+
+ROOMS = 8
+PLAYERS_PER_ROOM = 4
+
+
+def write_logs(directory: str, lines: int, files: int):
+    start = datetime(2025, 12, 3, 10, 0, 0).timestamp()
+    per_file = lines // files
+    for index in range(files):
+        rotation = files - 1 - index  # game_state.log.N is the oldest
+        name = "game_state.log" + (f".{rotation}" if rotation else "") + (".gz" if rotation % 2 else "")
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(os.path.join(directory, name), "wt") as f:
+            for i in range(index * per_file, (index + 1) * per_file):
+                ts = start + i * 0.002
+                asctime = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") + f",{int(ts % 1 * 1000):03d}"
+                room = f"ROOM{i % ROOMS:02d}"
+                player = f"p{i // ROOMS % PLAYERS_PER_ROOM}"
+                if i % 20 == 0:
+                    details = f"[COIN_SPAWN] ID:coin_{i} Pos:({i % 2000}.0, 300.0)"
+                elif i % 20 == 10:
+                    details = f"[ITEM_COLLECT] Player:{player} Type:coin ID:coin_{i - 10}"
+                else:
+                    details = f"[PLAYER_STATE] Player:{player} Pos:({i % 2000}.5, 300.0)"
+                f.write(f"{asctime} - [ROOM:{room}] {details}\n")
+    return per_file * files
+
+
+def sequential(pattern: str) -> dict:
+    rooms = {}
+    for filepath in sorted(glob.glob(pattern), key=analyze_sync.rotation_order):
+        analyze_sync.read_text_log(filepath, rooms)
+    return rooms
+
+
+def anomalies(rooms: dict) -> int:
+    return sum(len(room.anomalies) for room in rooms.values())
+
+
+def bench(lines: int, files: int):
+    with tempfile.TemporaryDirectory() as directory:
+        analyze_sync.ANALYSIS_LOG_FILE = os.path.join(directory, "sync_analysis.log")
+        analyze_sync.log_output = lambda message, to_console=True: None  # Time the analysis, not the console
+        total = write_logs(directory, lines, files)
+        pattern = os.path.join(directory, "game_state.log*")
+        print(f"{total} lines in {files} files, {os.cpu_count()} CPUs")
+
+        start = time.perf_counter()
+        expected = anomalies(sequential(pattern))
+        elapsed = time.perf_counter() - start
+        print(f"{'sequential':<12} {total / elapsed:>10.0f} lines/s  {elapsed:.2f} s  {expected} anomalies")
+
+        workers = 1
+        while workers <= min(files, os.cpu_count() or 1):
+            start = time.perf_counter()
+            _, rooms = analyze_sync.analyze_batch(pattern, workers)
+            elapsed = time.perf_counter() - start
+            found = anomalies(rooms)
+            print(f"{f'batch x{workers}':<12} {total / elapsed:>10.0f} lines/s  {elapsed:.2f} s  {found} anomalies"
+                  + ("" if found == expected else "  MISMATCH"))
+            workers *= 2
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 400000,
+          int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,54 @@
+"""
+Micro-benchmark for the WebSocket message handlers (handlers.py)
+
+Drives each handler through the dispatcher with fake sockets and prints the
+per-type latency histograms the dispatcher collected.
+Run with: python bench_handlers.py [iterations]
+"""
+
+import asyncio
+import sys
+import time
+
+from handlers import Connection, dispatcher, rate_limit_stats
+from ratelimit import ConnectionLimits
+from test_rooms import FakeWebSocket
+
+MESSAGES = [
+    {"type": "player_state", "state": {"x": 120.25, "y": 340.5, "velocity_x": 3.5, "velocity_y": -1.0}},
+    {"type": "enemy_state", "enemy_id": "enemy_1", "state": {"x": 400.0, "y": 320.0, "is_alive": True}},
+    {"type": "game_action", "action": "shoot", "data": {"x": 120, "y": 340}},
+    {"type": "chat", "message": "hello"},
+    {"type": "ping"},
+    {"type": "time_sync", "client_time": 0},
+]
+
+
+async def bench(iterations: int):
+    host, guest = Connection(FakeWebSocket(), "new"), Connection(FakeWebSocket(), "new")
+    # Measure the handlers themselves - no rate limits (ratelimit.py) on the benchmark connections
+    host.limits = ConnectionLimits({}, rate_limit_stats)
+    guest.limits = ConnectionLimits({}, rate_limit_stats)
+    await dispatcher.dispatch(host, {"type": "create_room", "player_id": "host"})
+    await dispatcher.dispatch(guest, {"type": "join_room", "room_id": host.room.room_id, "player_id": "guest"})
+    await dispatcher.dispatch(host, {"type": "enemy_spawn", "enemy": {"enemy_id": "enemy_1", "x": 400, "y": 320}})
+
+    for message in MESSAGES:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await dispatcher.dispatch(host, message)
+        await host.room.drain()
+        # Don't let recorded frames pile up between message types
+        host.websocket.sent.clear()
+        guest.websocket.sent.clear()
+        elapsed = time.perf_counter() - start
+        stats = dispatcher.histograms[message["type"]].to_dict()
+        print(f"{message['type']:<14} {iterations / elapsed:>10.0f} msg/s  "
+              f"mean {stats['mean_ms']:.4f} ms  p99 <= {stats['p99_ms']} ms")
+
+    await dispatcher.dispatch(guest, {"type": "leave_room"})
+    await dispatcher.dispatch(host, {"type": "leave_room"})
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,67 @@
+"""
+Micro-benchmark for the JSON serializer backends (serializer.py)
+
+Decodes and encodes realistic player_state frames with every installed
+backend: decode is what the endpoint does per received frame, encode is
+what a broadcast does once per player_state_update.
+Run with: python bench_serializer.py [iterations]
+"""
+
+import random
+import sys
+import time
+
+import serializer
+
+
+def make_frames(count: int = 64):
+    """player_state frames as a client sends them (a few shapes, varying values)"""
+    rng = random.Random(42)
+    frames = []
+    for i in range(count):
+        state = {
+            "x": round(rng.uniform(0, 4000), 2),
+            "y": round(rng.uniform(0, 720), 2),
+            "velocity_x": round(rng.uniform(-300, 300), 2),
+            "velocity_y": round(rng.uniform(-600, 600), 2),
+            "facing_right": rng.random() < 0.5,
+            "is_jumping": rng.random() < 0.3,
+            "is_shooting": rng.random() < 0.2,
+            "animation": rng.choice(["idle", "run", "jump", "fall"]),
+        }
+        if i % 8 == 0:
+            state.update(health=rng.randint(0, 100), lives=rng.randint(0, 3), score=rng.randint(0, 50000))
+        frames.append({"type": "player_state", "state": state})
+    return frames
+
+
+def bench(iterations: int):
+    frames = make_frames()
+    texts = [serializer.BACKENDS["json"].dumps(frame).decode("utf-8") for frame in frames]
+    updates = [{"type": "player_state_update", "player_id": "a1b2c3d4e5f6a7b8", "state": frame["state"]}
+               for frame in frames]
+    rounds = max(1, iterations // len(frames))
+    total = rounds * len(frames)
+
+    for name, backend in sorted(serializer.BACKENDS.items()):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                backend.loads(text)
+        decode = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for update in updates:
+                backend.dumps(update).decode("utf-8")
+        encode = time.perf_counter() - start
+
+        print(f"{name:<7} decode {total / decode:>10.0f} frames/s ({decode / total * 1e6:.2f} us)  "
+              f"encode {total / encode:>10.0f} frames/s ({encode / total * 1e6:.2f} us)")
+
+    if "orjson" not in serializer.BACKENDS:
+        print("orjson not installed - only the stdlib backend was measured")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,132 @@
+"""
+Response cache for read-heavy REST endpoints
+
+Stores pre-serialized JSON bodies keyed by endpoint + query params, with a
+TTL per entry and LRU eviction. Each body carries a strong ETag so clients
+that send If-None-Match get a 304 without the body being rebuilt or resent.
+Writes invalidate the affected endpoint (e.g. submit_score -> leaderboard).
+Invalidation also bumps the endpoint's generation, so a body built from
+data read before the write isn't stored after it.
+
+Cached responses say Cache-Control: private, no-cache, so clients keep the
+body and revalidate it with If-None-Match; the security middleware only
+stamps no-store on /api/ responses that don't set Cache-Control themselves.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 30.0  # Seconds
+CACHE_CONTROL = "private, no-cache"  # Keep it, but revalidate before every use
+
+CacheKey = Tuple[Hashable, ...]  # First element is the endpoint name
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+def serialize_json(content) -> bytes:
+    """Serialize like FastAPI's JSONResponse so cached bodies are byte-identical"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header (weak comparison, "*" matches anything)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """TTL + LRU cache of serialized responses, safe to use from threadpool workers"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # Bumped by invalidate(None)
+        self._endpoint_generations: Dict[Hashable, int] = {}  # Bumped by invalidate(endpoint)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generation(self, key: CacheKey) -> Tuple[int, int]:
+        """Changes whenever key's endpoint is invalidated - read it before building a body for put()"""
+        with self._lock:
+            return self._generation, self._endpoint_generations.get(key[0], 0)
+
+    def put(self, key: CacheKey, body: bytes, ttl: Optional[float] = None,
+            generation: Optional[Tuple[int, int]] = None) -> CachedResponse:
+        """Store a body; with generation, it is only stored if nothing was invalidated since"""
+        entry = CachedResponse(body, make_etag(body), time.monotonic() + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            if generation is not None and generation != (self._generation,
+                                                         self._endpoint_generations.get(key[0], 0)):
+                return entry  # Built from data that was invalidated meanwhile - serve it once, don't keep it
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        """Drop every entry for one endpoint, or everything"""
+        with self._lock:
+            if endpoint is None:
+                self._generation += 1
+                self._entries.clear()
+                return
+            self._endpoint_generations[endpoint] = self._endpoint_generations.get(endpoint, 0) + 1
+            for key in [key for key in self._entries if key[0] == endpoint]:
+                del self._entries[key]
+
+    def respond(self, request: Request, key: CacheKey, build: Callable[[], object],
+                ttl: Optional[float] = None) -> Response:
+        """
+        Serve a JSON response from the cache, building it on a miss
+
+        build() returns JSON-compatible content; it only runs when the entry
+        is missing or expired.
+        """
+        entry = self.get(key)
+        if entry is None:
+            generation = self.generation(key)
+            entry = self.put(key, serialize_json(build()), ttl, generation)
+
+        headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
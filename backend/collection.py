@@ -0,0 +1,134 @@
+"""
+Server-side validation of item collection
+
+collect_item is a claim by the client ("I picked up coin X"). Each room
+keeps an ItemHash of where its coins and powerups spawned, and every claim
+is checked against the collector's last known position with the same
+tolerance rules analyze_sync.py applies when replaying game_state.log
+(collection_outcome is shared by both), so desyncs and cheating show up
+while the game runs instead of in an offline report.
+
+COLLECTION_CHECK selects what happens to claims out of range:
+- "monitor" (default): logged as SYNC_ERROR and counted, still accepted
+- "enforce": rejected with item_collect_rejected
+- "off": not checked
+
+Items the server never saw spawn (level coins placed by the client) can't
+be checked and are counted as unknown. Positions are in pixels.
+"""
+
+import math
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+MAX_COLLECTION_DISTANCE = 150  # Pixels. Player size ~80, Coin ~30. 150 is generous.
+MAX_DROP_DISTANCE = 400  # Dropped coins fall - how far below their spawn point they can be picked up
+DROPPED_COIN_PREFIX = "coin_drop_"
+
+# Check modes
+OFF = "off"
+MONITOR = "monitor"
+ENFORCE = "enforce"
+MODES = (OFF, MONITOR, ENFORCE)
+
+# Outcomes of a collection check
+VALID = "valid"
+DROP_LEEWAY = "drop_leeway"  # Out of reach, but below a dropped coin's spawn point
+TOO_FAR = "too_far"
+UNKNOWN = "unknown"  # Item (or collector position) not known to the server
+REJECTED = "rejected"  # TOO_FAR claims refused in enforce mode
+
+
+def collection_outcome(item_id: str, player_x: float, player_y: float,
+                       item_x: float, item_y: float) -> Tuple[str, float]:
+    """Apply the collection tolerance rules, returns (outcome, distance)"""
+    distance = math.hypot(player_x - item_x, player_y - item_y)
+    if distance <= MAX_COLLECTION_DISTANCE:
+        return VALID, distance
+    # Dropped coins fall due to gravity: a player below the spawn point gets more leeway
+    dy = player_y - item_y
+    if (DROPPED_COIN_PREFIX in item_id and 0 < dy < MAX_DROP_DISTANCE
+            and abs(player_x - item_x) < MAX_COLLECTION_DISTANCE):
+        return DROP_LEEWAY, distance
+    return TOO_FAR, distance
+
+
+class ItemHash:
+    """Spatial hash of item spawn positions: (column, row) cell -> item IDs"""
+
+    def __init__(self, cell_size: float = MAX_COLLECTION_DISTANCE):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], Set[str]] = {}
+        self.positions: Dict[str, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.positions
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, item_id: str, x, y):
+        """Insert or move an item (ignored without a numeric position)"""
+        if type(x) not in (int, float) or type(y) not in (int, float):
+            return
+        self.remove(item_id)
+        self.positions[item_id] = (x, y)
+        self.cells.setdefault(self._cell(x, y), set()).add(item_id)
+
+    def remove(self, item_id: str):
+        position = self.positions.pop(item_id, None)
+        if position is not None:
+            cell = self._cell(*position)
+            self.cells[cell].discard(item_id)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+
+    def get(self, item_id: str) -> Optional[Tuple[float, float]]:
+        return self.positions.get(item_id)
+
+    def near(self, x: float, y: float) -> List[str]:
+        """IDs of the items within MAX_COLLECTION_DISTANCE-ish reach (the 3x3 cells around a point)"""
+        column, row = self._cell(x, y)
+        return [item_id
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                for item_id in self.cells.get((column + dx, row + dy), ())]
+
+    def check(self, item_id: str, player_x: float, player_y: float) -> Tuple[str, float]:
+        """Check a claim against the item's spawn position, returns (outcome, distance)"""
+        position = self.positions.get(item_id)
+        if position is None:
+            return UNKNOWN, 0.0
+        return collection_outcome(item_id, player_x, player_y, *position)
+
+
+class CollectionStats:
+    """Counts of collection check outcomes, exported at /api/metrics/collections"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {outcome: 0 for outcome in (VALID, DROP_LEEWAY, TOO_FAR, UNKNOWN, REJECTED)}
+        self.max_distance = 0.0  # Furthest TOO_FAR claim seen
+
+    def record(self, outcome: str, distance: float = 0.0):
+        self.counts[outcome] += 1
+        if outcome == TOO_FAR and distance > self.max_distance:
+            self.max_distance = distance
+
+    def to_dict(self) -> dict:
+        return {"mode": mode, **self.counts, "max_distance": round(self.max_distance, 2)}
+
+
+def mode_from_env() -> str:
+    """Check mode from COLLECTION_CHECK (unknown values fall back to monitor)"""
+    value = os.getenv("COLLECTION_CHECK", MONITOR).lower()
+    return value if value in MODES else MONITOR
+
+
+mode = mode_from_env()
+stats = CollectionStats()
@@ -0,0 +1,15 @@
+"""
+Keep test runs out of the source tree: main.py creates game.db in DATA_DIR
+and game_state.log/.journal at GAME_LOG_PATH when it's imported, so point
+both at a temporary directory before any test module imports it
+"""
+
+import os
+import tempfile
+
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="jumpjumpjump-tests-")
+TEST_PATHS = {
+    "DATA_DIR": TEST_DATA_DIR,
+    "GAME_LOG_PATH": os.path.join(TEST_DATA_DIR, "game_state.log"),
+}
+os.environ.update(TEST_PATHS)
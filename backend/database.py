@@ -0,0 +1,210 @@
+"""
+SQLite connection pool and schema migrations shared by the REST endpoints
+
+Connections are opened once (WAL journal, tuned pragmas, statement cache)
+and handed out per request instead of calling sqlite3.connect every time.
+
+The schema version is stored in PRAGMA user_version; migrate() applies
+every entry of SCHEMA_MIGRATIONS newer than that, one transaction each.
+Add new schema changes by appending to the list - never edit old entries.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence, Tuple
+
+DEFAULT_POOL_SIZE = 8
+ACQUIRE_TIMEOUT = 10.0  # Seconds to wait for a free connection
+BUSY_TIMEOUT = 5.0  # Seconds SQLite waits on a locked database
+STATEMENT_CACHE_SIZE = 128  # Prepared statements cached per connection
+
+# Applied to every new connection
+PRAGMAS = (
+    ("journal_mode", "WAL"),      # Readers don't block the writer
+    ("synchronous", "NORMAL"),    # Safe with WAL, fsync only at checkpoints
+    ("cache_size", -16000),       # ~16 MB page cache per connection
+    ("mmap_size", 268435456),     # Memory-map up to 256 MB of the file
+    ("temp_store", "MEMORY"),
+)
+
+# SCHEMA_MIGRATIONS[n - 1] upgrades the database to user_version n
+SCHEMA_MIGRATIONS: Tuple[Tuple[str, ...], ...] = (
+    # 1: base schema (IF NOT EXISTS so databases created before versioning upgrade cleanly)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS scores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_name TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            coins INTEGER NOT NULL,
+            enemies_defeated INTEGER NOT NULL,
+            distance INTEGER NOT NULL,
+            level INTEGER NOT NULL,
+            game_mode TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_score_desc ON scores(score DESC)",
+        """
+        CREATE TABLE IF NOT EXISTS bosses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            boss_index INTEGER NOT NULL UNIQUE,
+            boss_name TEXT NOT NULL,
+            notorious_title TEXT NOT NULL,
+            frame_x INTEGER NOT NULL,
+            frame_y INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS saved_games (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_name TEXT NOT NULL UNIQUE,
+            level INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            lives INTEGER NOT NULL,
+            health INTEGER NOT NULL,
+            coins INTEGER NOT NULL,
+            weapon TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ),
+    # 2: per-mode and per-player score lookups (leaderboard/rank by game_mode, player high score)
+    (
+        "CREATE INDEX IF NOT EXISTS idx_scores_mode_score ON scores(game_mode, score DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_scores_player_score ON scores(player_name, score DESC)",
+    ),
+    # 3: checkpointed multiplayer rooms (roomstate.py)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS room_snapshots (
+            room_id TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            saved_at REAL NOT NULL,
+            state TEXT NOT NULL
+        )
+        """,
+    ),
+)
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections that can be used from any thread"""
+
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,  # Connections move between threadpool workers
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for name, value in PRAGMAS:
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+        return self._idle.get(timeout=ACQUIRE_TIMEOUT)
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            # Don't hand an open transaction to the next request
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of a with-block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close every connection (idle or not) - the pool is unusable afterwards"""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+
+class ChangeWatcher:
+    """
+    Notices commits made to the database through other connections
+
+    PRAGMA data_version changes when another connection (this process's
+    pool, or another worker process) has committed since the last check.
+    It is per connection, so the watcher keeps one of its own; checks are
+    throttled to one per interval.
+    """
+
+    def __init__(self, db_path: str, interval: float = 1.0):
+        self.interval = interval
+        self._conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._version = self._data_version()
+        self._checked_at = time.monotonic()
+
+    def _data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed(self) -> bool:
+        """True once after the database was committed to since the last change was reported"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.interval:
+                return False
+            self._checked_at = now
+            version = self._data_version()
+            if version == self._version:
+                return False
+            self._version = version
+            return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def migrate(conn: sqlite3.Connection, migrations: Sequence[Sequence[str]] = SCHEMA_MIGRATIONS) -> int:
+    """Bring the schema up to date, returns the resulting schema version"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, statements in enumerate(migrations, start=1):
+        if target <= version:
+            continue
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA doesn't accept parameters; target is always an int
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+    return version
@@ -0,0 +1,197 @@
+"""
+Room directory: which worker process owns which room
+
+A room (and every socket in it) lives in exactly one worker. The directory
+maps room_id -> worker so any worker can route a join/reconnect to the
+owner, and collects each worker's room list so /api/rooms shows every room.
+
+- LocalRoomDirectory: single process (default), nothing shared
+- FileRoomDirectory: several workers on one machine sharing a JSON file
+  guarded by an fcntl lock (set ROOM_DIRECTORY=/path/to/rooms.json)
+
+Workers that stop publishing for WORKER_TTL seconds are treated as dead:
+their rooms disappear from listings and can't be routed to.
+"""
+
+import fcntl
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+WORKER_TTL = 10.0  # Seconds without a publish before a worker counts as dead
+
+
+class WorkerInfo(NamedTuple):
+    worker_id: str
+    url: Optional[str] = None  # Base WebSocket URL other workers proxy to, e.g. ws://127.0.0.1:8001
+
+
+class RoomDirectory:
+    """Interface shared by the directory implementations"""
+
+    shared = False  # True if other processes can see this directory
+
+    def claim(self, room_id: str, worker: WorkerInfo) -> bool:
+        """Reserve a room_id for a worker, returns False if another worker owns it"""
+        raise NotImplementedError
+
+    def release(self, room_id: str, worker: WorkerInfo):
+        """Give up a room_id (only if this worker owns it)"""
+        raise NotImplementedError
+
+    def lookup(self, room_id: str) -> Optional[WorkerInfo]:
+        """Owner of a room, or None if unknown / owner is dead"""
+        raise NotImplementedError
+
+    def publish(self, worker: WorkerInfo, rooms: List[dict]):
+        """Replace a worker's room listing (also serves as its heartbeat)"""
+        raise NotImplementedError
+
+    def list_rooms(self, exclude_worker: Optional[str] = None) -> List[dict]:
+        """Room listings published by live workers"""
+        raise NotImplementedError
+
+
+class LocalRoomDirectory(RoomDirectory):
+    """In-process directory for a single worker"""
+
+    def __init__(self):
+        self.owners: Dict[str, WorkerInfo] = {}
+        self.listings: Dict[str, List[dict]] = {}
+
+    def claim(self, room_id: str, worker: WorkerInfo) -> bool:
+        owner = self.owners.get(room_id)
+        if owner is not None and owner.worker_id != worker.worker_id:
+            return False
+        self.owners[room_id] = worker
+        return True
+
+    def release(self, room_id: str, worker: WorkerInfo):
+        if self.owners.get(room_id) == worker:
+            del self.owners[room_id]
+
+    def lookup(self, room_id: str) -> Optional[WorkerInfo]:
+        return self.owners.get(room_id)
+
+    def publish(self, worker: WorkerInfo, rooms: List[dict]):
+        self.listings[worker.worker_id] = rooms
+
+    def list_rooms(self, exclude_worker: Optional[str] = None) -> List[dict]:
+        return [room for worker_id, rooms in self.listings.items() if worker_id != exclude_worker
+                for room in rooms]
+
+
+class FileRoomDirectory(RoomDirectory):
+    """
+    Directory shared by worker processes on one machine
+
+    File layout:
+    {"rooms": {room_id: worker_id},
+     "workers": {worker_id: {"url": str, "heartbeat": float, "rooms": [room info, ...]}}}
+    """
+
+    shared = True
+
+    def __init__(self, path: str, worker_ttl: float = WORKER_TTL):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.worker_ttl = worker_ttl
+
+    @contextmanager
+    def _locked(self, write: bool) -> Iterator[dict]:
+        """Load the directory under an exclusive (write) or shared (read) lock"""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                try:
+                    with open(self.path) as f:
+                        data = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    data = {}
+                data.setdefault("rooms", {})
+                data.setdefault("workers", {})
+                yield data
+                if write:
+                    # Write-then-rename so readers never see a half-written file
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w") as f:
+                        json.dump(data, f)
+                    os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _is_live(self, data: dict, worker_id: str) -> bool:
+        worker = data["workers"].get(worker_id)
+        return worker is not None and time.time() - worker["heartbeat"] < self.worker_ttl
+
+    def _prune(self, data: dict):
+        """Forget dead workers and the rooms they owned"""
+        dead = {worker_id for worker_id in data["workers"] if not self._is_live(data, worker_id)}
+        for worker_id in dead:
+            del data["workers"][worker_id]
+        data["rooms"] = {room_id: owner for room_id, owner in data["rooms"].items()
+                         if owner in data["workers"]}
+
+    def claim(self, room_id: str, worker: WorkerInfo) -> bool:
+        with self._locked(write=True) as data:
+            self._prune(data)
+            # Re-claiming our own room is fine (restart with the same WORKER_ID)
+            if data["rooms"].get(room_id, worker.worker_id) != worker.worker_id:
+                return False
+            data["rooms"][room_id] = worker.worker_id
+            self._touch(data, worker)
+            return True
+
+    def release(self, room_id: str, worker: WorkerInfo):
+        with self._locked(write=True) as data:
+            if data["rooms"].get(room_id) == worker.worker_id:
+                del data["rooms"][room_id]
+
+    def lookup(self, room_id: str) -> Optional[WorkerInfo]:
+        with self._locked(write=False) as data:
+            worker_id = data["rooms"].get(room_id)
+            if worker_id is None or not self._is_live(data, worker_id):
+                return None
+            return WorkerInfo(worker_id, data["workers"][worker_id].get("url"))
+
+    def publish(self, worker: WorkerInfo, rooms: List[dict]):
+        with self._locked(write=True) as data:
+            self._prune(data)
+            self._touch(data, worker)["rooms"] = rooms
+
+    def list_rooms(self, exclude_worker: Optional[str] = None) -> List[dict]:
+        with self._locked(write=False) as data:
+            return [room for worker_id, worker in data["workers"].items()
+                    if worker_id != exclude_worker and self._is_live(data, worker_id)
+                    for room in worker.get("rooms", [])]
+
+    def _touch(self, data: dict, worker: WorkerInfo) -> dict:
+        entry = data["workers"].setdefault(worker.worker_id, {"rooms": []})
+        entry["url"] = worker.url
+        entry["heartbeat"] = time.time()
+        return entry
+
+
+def directory_from_env() -> RoomDirectory:
+    """FileRoomDirectory if ROOM_DIRECTORY is set, otherwise a local one"""
+    path = os.getenv("ROOM_DIRECTORY")
+    if path:
+        return FileRoomDirectory(path)
+    return LocalRoomDirectory()
+
+
+def worker_from_env() -> WorkerInfo:
+    """
+    This process's identity (WORKER_ID / WORKER_URL)
+
+    The ID also keys room checkpoints, so it should stay the same across
+    restarts: a single process defaults to "local"; sharded workers should
+    set WORKER_ID (otherwise host + pid is used and rooms aren't restored).
+    """
+    worker_id = os.getenv("WORKER_ID")
+    if not worker_id:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}" if os.getenv("ROOM_DIRECTORY") else "local"
+    return WorkerInfo(worker_id, os.getenv("WORKER_URL") or None)
@@ -0,0 +1,243 @@
+"""
+Compact entity storage for game rooms
+
+Enemies, coins and powerups are stored as __slots__ records instead of one
+dict per entity, and each EntityStore keeps an index of its active entities
+(alive enemies / uncollected items) that is maintained on spawn, update,
+kill and collect. Queries only walk the active index (plus a short window
+of recently deactivated entities) instead of every entity ever spawned.
+
+Rooms with area-of-interest filtering also keep a spatial grid per store
+(see spatial.py), updated whenever an entity's x/y changes.
+"""
+
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Type
+
+from spatial import XGrid
+
+# Marks a slot that was never set (the field is left out of to_dict)
+_UNSET = object()
+
+
+class EntityRecord:
+    """Base class for slotted entity records"""
+    FIELDS: Tuple[str, ...] = ()
+    _FIELD_SET: frozenset = frozenset()
+    __slots__ = ("extra",)
+
+    def __init__(self, data: dict):
+        for field in self.FIELDS:
+            setattr(self, field, _UNSET)
+        self.extra: Optional[dict] = None
+        self.update(data)
+
+    def update(self, data: dict):
+        """Apply a partial state update (unknown keys are kept in extra)"""
+        for key, value in data.items():
+            if key in self._FIELD_SET:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def get(self, key: str, default=None):
+        """Dict-style field access"""
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            return default if value is _UNSET else value
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def to_dict(self) -> dict:
+        """Build the wire representation of this entity"""
+        data = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not _UNSET:
+                data[field] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+
+class EnemyRecord(EntityRecord):
+    FIELDS = ("enemy_id", "enemy_type", "x", "y", "velocity_x", "velocity_y", "health", "max_health",
+              "coin_reward", "scale", "is_alive", "facing_right", "state", "killed_by", "death_timestamp")
+    __slots__ = FIELDS
+
+
+class CoinRecord(EntityRecord):
+    FIELDS = ("coin_id", "x", "y", "is_collected", "collected_by", "value", "velocity_x", "velocity_y",
+              "collected_timestamp")
+    __slots__ = FIELDS
+
+
+class PowerUpRecord(EntityRecord):
+    FIELDS = ("powerup_id", "type", "x", "y", "is_collected", "collected_by", "collected_timestamp")
+    __slots__ = FIELDS
+
+
+class EntityStore:
+    """
+    Records of one entity kind plus an index of the active ones
+
+    active_field/active_value decide whether a record is active
+    (e.g. is_alive == True for enemies, is_collected == False for items);
+    records missing the field count as active.
+    """
+
+    def __init__(self, record_cls: Type[EntityRecord], active_field: str, active_value: bool,
+                 timestamp_field: str):
+        self.record_cls = record_cls
+        self.active_field = active_field
+        self.active_value = active_value
+        self.timestamp_field = timestamp_field  # When the record stopped being active
+        self.records: Dict[str, EntityRecord] = {}
+        self.active: Dict[str, None] = {}  # Insertion-ordered set of active IDs
+        self.deactivated: Deque[Tuple[float, str]] = deque()  # (timestamp, id), oldest first
+        self.grid: Optional[XGrid] = None  # Spatial index, only for area-of-interest rooms
+
+    def enable_grid(self, cell_size: float):
+        """Start maintaining a spatial grid over the records' x/y"""
+        self.grid = XGrid(cell_size)
+        for entity_id, record in self.records.items():
+            self.grid.move(entity_id, record.get('x'), record.get('y'))
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self.records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.records)
+
+    def get(self, entity_id: str) -> Optional[EntityRecord]:
+        return self.records.get(entity_id)
+
+    def get_dict(self, entity_id: str) -> Optional[dict]:
+        record = self.records.get(entity_id)
+        return record.to_dict() if record else None
+
+    def is_active(self, entity_id: str) -> bool:
+        return entity_id in self.active
+
+    def put(self, entity_id: str, data: dict) -> EntityRecord:
+        """Insert or fully replace an entity"""
+        record = self.record_cls(data)
+        previous = self.records.get(entity_id)
+        if (previous is not None and entity_id not in self.active and not self._is_active(record)
+                and record.get(self.timestamp_field) is None):
+            # Still inactive (e.g. resent by a host sync) - it stopped being active back then, not now
+            record.update({self.timestamp_field: previous.get(self.timestamp_field)})
+        self.records[entity_id] = record
+        self.active.pop(entity_id, None)
+        self._reindex(entity_id, record, is_new=True)
+        if self.grid is not None:
+            self.grid.move(entity_id, record.get('x'), record.get('y'))
+        return record
+
+    def update(self, entity_id: str, data: dict) -> bool:
+        """Apply a partial update, returns True if the entity exists"""
+        record = self.records.get(entity_id)
+        if record is None:
+            return False
+        record.update(data)
+        if self.active_field in data or self.timestamp_field in data:
+            self._reindex(entity_id, record)
+        if self.grid is not None and ('x' in data or 'y' in data):
+            self.grid.move(entity_id, record.get('x'), record.get('y'))
+        return True
+
+    def remove(self, entity_id: str) -> bool:
+        """Drop an entity entirely"""
+        if self.records.pop(entity_id, None) is None:
+            return False
+        self.active.pop(entity_id, None)
+        if self.grid is not None:
+            self.grid.remove(entity_id)
+        return True
+
+    def _is_active(self, record: EntityRecord) -> bool:
+        return record.get(self.active_field, self.active_value) == self.active_value
+
+    def _reindex(self, entity_id: str, record: EntityRecord, is_new: bool = False):
+        if self._is_active(record):
+            self.active[entity_id] = None
+            return
+        was_active = self.active.pop(entity_id, _UNSET) is not _UNSET
+        # Only transitions are recorded, so repeated "dead" updates don't grow the queue
+        if not (was_active or is_new):
+            return
+        timestamp = record.get(self.timestamp_field)
+        if timestamp is None:
+            # Deactivated without a time (e.g. dead in a host sync) - count from now, or it's never evicted
+            timestamp = time.time()
+            record.update({self.timestamp_field: timestamp})
+        self.deactivated.append((timestamp, entity_id))
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Wire dicts of every record by ID (for checkpointing)"""
+        return {entity_id: record.to_dict() for entity_id, record in self.records.items()}
+
+    def restore(self, entities: Dict[str, dict]):
+        """Replace the contents with checkpointed records"""
+        self.records.clear()
+        self.active.clear()
+        self.deactivated.clear()
+        if self.grid is not None:
+            self.grid.clear()
+        for entity_id, data in entities.items():
+            self.put(entity_id, data)
+        # put() appends in record order, eviction expects oldest first
+        self.deactivated = deque(sorted(self.deactivated))
+
+    def active_dicts(self) -> List[dict]:
+        """Wire dicts of all active entities"""
+        records = self.records
+        return [records[entity_id].to_dict() for entity_id in self.active]
+
+    def recently_deactivated(self, now: float, window: float) -> List[str]:
+        """IDs deactivated within the last window seconds"""
+        deactivated = self.deactivated
+        result = []
+        seen = set()
+        for timestamp, entity_id in deactivated:
+            record = self.records.get(entity_id)
+            # Skip stale entries (entity removed, reactivated or deactivated again later)
+            if (record is None or entity_id in self.active or entity_id in seen
+                    or record.get(self.timestamp_field) != timestamp or now - timestamp >= window):
+                continue
+            seen.add(entity_id)
+            result.append(entity_id)
+        return result
+
+    def evict_deactivated(self, cutoff: float) -> List[Tuple[str, float]]:
+        """
+        Remove records that were deactivated before cutoff
+
+        Returns (id, timestamp) for every evicted record so the caller can
+        keep a tombstone for it.
+        """
+        deactivated = self.deactivated
+        evicted = []
+        while deactivated and deactivated[0][0] < cutoff:
+            timestamp, entity_id = deactivated.popleft()
+            record = self.records.get(entity_id)
+            # Entry is stale if the entity was reactivated or deactivated again since
+            if (record is None or entity_id in self.active
+                    or record.get(self.timestamp_field) != timestamp):
+                continue
+            del self.records[entity_id]
+            if self.grid is not None:
+                self.grid.remove(entity_id)
+            evicted.append((entity_id, timestamp))
+        return evicted
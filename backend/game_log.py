@@ -0,0 +1,233 @@
+"""
+Queue-backed game_state logging
+
+Handlers log room events (PLAYER_STATE, ITEM_COLLECT, ...) to
+game_state.log for analyze_sync.py. Writing those lines straight from the
+event loop meant formatting a string and a blocking file write per
+message, so the pipeline is split:
+
+- event() first checks sampling (SAMPLING: log 1 in N events of a type,
+  types not listed are always logged) and returns before anything is
+  formatted for an event that is sampled out
+- the record goes onto a bounded queue with its arguments unformatted;
+  if the queue is full the line is dropped and counted, the game loop
+  never waits for the disk
+- a QueueListener thread formats the lines and writes them to the file,
+  flushing every FLUSH_EVERY lines or FLUSH_INTERVAL seconds, and/or
+  writes them to the binary event journal (journal.py)
+
+Sampling can be overridden with GAME_LOG_SAMPLING, e.g.
+"PLAYER_STATE=20,ENEMY_STATE=50" (1 logs everything, 0 nothing). The line
+format is unchanged: "<asctime> - [ROOM:<id>] [<EVENT>] <details>".
+
+Sampling trades analyze_sync accuracy for log volume. ITEM_COLLECT
+carries the collector's position, so the collection distance check works
+whatever the sampling. The speed, teleport and jitter checks measure
+consecutive PLAYER_STATE lines though: with 1 in N of them logged, speeds
+are averaged over N updates and back-and-forth movement goes unseen. So
+PLAYER_STATE is logged in full by default; only sample it where the log
+volume matters more than those checks. ENEMY_STATE isn't analyzed.
+GAME_LOG_FORMAT picks the outputs: "text", "journal" or "both" (default).
+Each worker process writes (and rotates) its own files: with several
+workers (ROOM_DIRECTORY set) the worker ID goes into the file names, e.g.
+game_state.w1.log and game_state.w1.journal.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+from journal import JournalHandler
+
+game_logger = logging.getLogger("game_state")
+
+LOG_FORMAT = '%(asctime)s - %(message)s'
+QUEUE_SIZE = 10000  # Records waiting for the writer thread before new ones are dropped
+FLUSH_EVERY = 200  # Lines
+FLUSH_INTERVAL = 0.5  # Seconds
+
+# Outputs (GAME_LOG_FORMAT)
+TEXT = "text"
+JOURNAL = "journal"
+BOTH = "both"
+
+# Log 1 in N events of a type - events analyze_sync needs all of (player
+# states, spawns, collections) are logged in full, see the module docstring
+DEFAULT_SAMPLING: Dict[str, int] = {
+    "PLAYER_STATE": 1,
+    "ENEMY_STATE": 10,
+}
+
+
+def sampling_from_env(default: Dict[str, int] = DEFAULT_SAMPLING) -> Dict[str, int]:
+    """DEFAULT_SAMPLING with the GAME_LOG_SAMPLING overrides applied (malformed entries are skipped)"""
+    sampling = dict(default)
+    for entry in os.getenv("GAME_LOG_SAMPLING", "").split(","):
+        event, _, rate = entry.partition("=")
+        if event.strip() and rate.strip().isdigit():
+            sampling[event.strip().upper()] = int(rate)
+    return sampling
+
+
+SAMPLING = sampling_from_env()
+
+
+class GameLogStats:
+    def __init__(self):
+        self.logged = 0
+        self.sampled_out = 0
+        self.dropped = 0  # Queue full
+
+    def to_dict(self) -> dict:
+        return {"logged": self.logged, "sampled_out": self.sampled_out, "dropped": self.dropped}
+
+
+stats = GameLogStats()
+_seen: Dict[str, int] = {}  # event type -> events seen, for 1-in-N sampling
+
+
+def event(event_type: str, room_id: str, details: str, *args, level: int = logging.INFO):
+    """
+    Log a room event, formatted lazily by the writer thread
+
+    details is a %-format string for args, e.g.
+    event("PLAYER_STATE", room_id, "Player:%s Pos:(%s, %s)", player_id, x, y)
+    """
+    rate = SAMPLING.get(event_type, 1)
+    if rate != 1:
+        seen = _seen.get(event_type, 0)
+        _seen[event_type] = seen + 1
+        if rate <= 0 or seen % rate:
+            stats.sampled_out += 1
+            return
+    if not game_logger.isEnabledFor(level):
+        return
+    stats.logged += 1
+    game_logger.log(level, "[ROOM:%s] [%s] " + details, room_id, event_type, *args)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Enqueue records as they are - the listener thread formats them - and drop them if the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats.dropped += 1
+
+
+class BatchingFileHandler(logging.FileHandler):
+    """FileHandler that flushes every FLUSH_EVERY lines instead of after each one"""
+
+    def __init__(self, filename: str, flush_every: int = FLUSH_EVERY):
+        super().__init__(filename)
+        self.flush_every = flush_every
+        self.unflushed = 0
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self.unflushed += 1
+            if self.unflushed >= self.flush_every:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        super().flush()
+        self.unflushed = 0
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that also flushes its handlers whenever the queue has been idle for FLUSH_INTERVAL"""
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        while True:
+            try:
+                return self.queue.get(block, timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    handler.flush()
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # Waits for room if the queue is full, the thread is draining it
+
+
+_listener: Optional[BatchingQueueListener] = None
+
+
+def paths_from_env(log_path: str, worker_id: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Text log and journal paths for GAME_LOG_FORMAT (the journal goes next to the text log)
+
+    Pass worker_id when other workers log to the same directory: a file has
+    one writer, interleaved appends and rotation by several would corrupt it.
+    """
+    output = os.getenv("GAME_LOG_FORMAT", BOTH).lower()
+    base, ext = os.path.splitext(log_path)
+    if worker_id:
+        base = f"{base}.{re.sub(r'[^A-Za-z0-9_-]', '_', worker_id)}"
+        log_path = base + ext
+    journal_path = base + ".journal"
+    return (None if output == JOURNAL else log_path), (None if output == TEXT else journal_path)
+
+
+def setup(path: Optional[str], journal_path: Optional[str] = None) -> logging.Handler:
+    """
+    Send game_logger through the queue to a text log at path and/or a journal
+
+    The text log falls back to stderr if the file can't be opened; a journal
+    that can't be opened is skipped.
+    """
+    global _listener
+    shutdown()
+    writers: List[logging.Handler] = []
+    if path:
+        try:
+            writer: logging.Handler = BatchingFileHandler(path)
+        except (PermissionError, OSError):
+            writer = logging.StreamHandler()
+        writer.setFormatter(logging.Formatter(LOG_FORMAT))
+        writers.append(writer)
+    if journal_path:
+        try:
+            writers.append(JournalHandler(journal_path))
+        except (PermissionError, OSError):
+            pass
+
+    records: queue.Queue = queue.Queue(QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    game_logger.setLevel(logging.INFO)
+    game_logger.addHandler(handler)
+    game_logger.propagate = False  # Root handlers would format and write on the caller's thread
+    _listener = BatchingQueueListener(records, *writers)
+    _listener.start()
+    return handler
+
+
+def shutdown():
+    """Write out everything still queued and detach the queue handler"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    for handler in list(game_logger.handlers):
+        if isinstance(handler, NonBlockingQueueHandler) and handler.queue is listener.queue:
+            game_logger.removeHandler(handler)
+    listener.stop()  # Drains the queue
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,729 @@
+"""
+WebSocket message handlers for online multiplayer rooms
+
+websocket_room_endpoint decodes each frame and hands it to `dispatcher`,
+a table from message type to an async handler - one dict lookup instead of
+walking an if/elif chain. Handlers take the Connection (socket, player,
+current room) and the message dict, so they can be called directly with a
+fake connection in tests and benchmarks.
+
+A registration can carry a schema, {field: expected type(s)}, checked for
+the fields present before the handler runs; a wrongly typed field gets an
+error reply instead of an exception inside the handler.
+
+Middleware wraps every handler (latency histograms, rate limits, ...):
+
+    async def middleware(conn, message_type, data, handler):
+        ...
+        await handler(conn, data)
+"""
+
+import bisect
+import logging
+import secrets
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type, Union
+
+from fastapi import WebSocket
+
+import collection
+import game_log
+import serializer
+from quantize import FixedPoint
+from ratelimit import ConnectionLimits, RateLimitStats, disconnect_threshold_from_env, rate_limit_middleware
+from rooms import room_manager, GameRoom
+
+Schema = Dict[str, Union[Type, Tuple[Type, ...]]]
+Handler = Callable[["Connection", dict], Awaitable[None]]
+Middleware = Callable[["Connection", str, dict, Handler], Awaitable[None]]
+
+# Upper bounds (ms) of the latency histogram buckets, the last one catches everything slower
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, float("inf"))
+
+
+class Connection:
+    """Per-socket state shared by the handlers"""
+    __slots__ = ("websocket", "room_id", "player_id", "room", "limits")
+
+    def __init__(self, websocket: WebSocket, room_id: str):
+        self.websocket = websocket
+        self.room_id = room_id  # From the URL path
+        self.player_id: Optional[str] = None
+        self.room: Optional[GameRoom] = None
+        self.limits: Optional[ConnectionLimits] = None  # Token buckets, see ratelimit.py
+
+    def close(self):
+        """Drop per-connection state once the socket is gone"""
+        if self.limits is not None:
+            self.limits.close()
+
+    async def reply(self, message: dict):
+        """Send to this connection - through the room's send queue once registered, to keep ordering"""
+        if self.room and self.player_id in self.room.senders:
+            await self.room.send_to_player(self.player_id, message)
+        else:
+            await self.websocket.send_text(serializer.dumps_text(message))
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram for one message type"""
+
+    def __init__(self, bounds_ms: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.bounds_ms = bounds_ms
+        self.counts = [0] * len(bounds_ms)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds_ms, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 4) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 4),
+            "buckets": {("+inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in zip(self.bounds_ms, self.counts)}
+        }
+
+
+def latency_middleware(histograms: Dict[str, LatencyHistogram]) -> Middleware:
+    """Middleware recording handler latency per message type"""
+    async def middleware(conn: Connection, message_type: str, data: dict, handler: Handler):
+        start = time.perf_counter()
+        try:
+            await handler(conn, data)
+        finally:
+            histogram = histograms.get(message_type)
+            if histogram is None:
+                histogram = histograms[message_type] = LatencyHistogram()
+            histogram.record(time.perf_counter() - start)
+    return middleware
+
+
+def _type_names(expected) -> str:
+    types = expected if isinstance(expected, tuple) else (expected,)
+    return " or ".join("null" if t is type(None) else t.__name__ for t in types)
+
+
+def validate(schema: Schema, data: dict) -> Optional[str]:
+    """Check the fields present in data, returns the first offending field or None"""
+    for field, expected in schema.items():
+        if field not in data:
+            continue
+        value = data[field]
+        # bool is an int subclass - only accept it where bool is expected
+        if isinstance(value, bool) and not (expected is bool or (isinstance(expected, tuple) and bool in expected)):
+            return field
+        if not isinstance(value, expected):
+            return field
+    return None
+
+
+class MessageDispatcher:
+    """Registry of message handlers with per-type schemas and middleware"""
+
+    def __init__(self):
+        self.handlers: Dict[str, Handler] = {}
+        self.schemas: Dict[str, Schema] = {}
+        self.read_only: set = set()  # Types that never change room state (no checkpoint needed)
+        self.middleware: List[Middleware] = []
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._chains: Dict[str, Handler] = {}
+
+    def register(self, message_type: str, schema: Optional[Schema] = None, read_only: bool = False):
+        """Decorator registering the handler for a message type"""
+        def decorator(handler: Handler) -> Handler:
+            self.handlers[message_type] = handler
+            if schema:
+                self.schemas[message_type] = schema
+            if read_only:
+                self.read_only.add(message_type)
+            self._build_chain(message_type)
+            return handler
+        return decorator
+
+    def use(self, middleware: Middleware):
+        """Add a middleware (the first one added is the outermost)"""
+        self.middleware.append(middleware)
+        for message_type in self.handlers:
+            self._build_chain(message_type)
+
+    def _build_chain(self, message_type: str):
+        """Compose middleware around the handler once, not per message"""
+        chain = self.handlers[message_type]
+        for middleware in reversed(self.middleware):
+            chain = self._wrap(middleware, message_type, chain)
+        self._chains[message_type] = chain
+
+    @staticmethod
+    def _wrap(middleware: Middleware, message_type: str, inner: Handler) -> Handler:
+        async def wrapped(conn: Connection, data: dict):
+            await middleware(conn, message_type, data, inner)
+        return wrapped
+
+    async def dispatch(self, conn: Connection, data: dict) -> bool:
+        """Run the handler for data["type"], returns False for unknown types (ignored)"""
+        message_type = data.get("type")
+        chain = self._chains.get(message_type)
+        if chain is None:
+            return False
+
+        schema = self.schemas.get(message_type)
+        if schema:
+            field = validate(schema, data)
+            if field is not None:
+                await conn.reply({
+                    "type": "error",
+                    "message": f"Invalid {message_type}: '{field}' must be {_type_names(schema[field])}"
+                })
+                return True
+
+        await chain(conn, data)
+
+        # Anything else may have changed room state - picked up by the next checkpoint
+        if conn.room is not None and message_type not in self.read_only:
+            conn.room.dirty = True
+        return True
+
+
+dispatcher = MessageDispatcher()
+rate_limit_stats = RateLimitStats()
+# Rate limits outermost: held-back updates are timed when they are finally handled
+dispatcher.use(rate_limit_middleware(rate_limit_stats, disconnect_threshold=disconnect_threshold_from_env()))
+dispatcher.use(latency_middleware(dispatcher.histograms))
+
+OptionalStr = (str, type(None))
+
+
+# ============================================================================
+# Lobby
+# ============================================================================
+
+@dispatcher.register("create_room", {"room_name": str, "player_name": str, "player_id": OptionalStr})
+async def handle_create_room(conn: Connection, data: dict):
+    """Create a new room (room_id should be 'new', optional tick_rate in Hz, fixed_point storage and AOI window)"""
+    room_name = data.get("room_name", "Game Room")
+    player_name = data.get("player_name", "Player")
+    conn.player_id = player_id = data.get("player_id") or secrets.token_hex(8)
+    # Optional tick rate (Hz) - omit for immediate relay of state updates
+    tick_rate = data.get("tick_rate")
+    if not isinstance(tick_rate, int) or isinstance(tick_rate, bool) or tick_rate <= 0:
+        tick_rate = None
+    # Optional fixed-point entity storage, positions relative to an [x, y] origin
+    fixed_point = FixedPoint.from_origin(data.get("origin")) if data.get("fixed_point") else None
+    # Optional area of interest (pixels) - players only get the entities within it, see spatial.py
+    aoi_width, aoi_height = (
+        value if type(value) in (int, float) and value > 0 else None
+        for value in (data.get("aoi_width"), data.get("aoi_height"))
+    )
+
+    conn.room = room = await room_manager.create_room(
+        room_name=room_name,
+        host_id=player_id,
+        host_name=player_name,
+        websocket=conn.websocket,
+        tick_rate=tick_rate,
+        fixed_point=fixed_point,
+        aoi_width=aoi_width,
+        aoi_height=aoi_height
+    )
+    if data.get("delta_sync"):
+        room.enable_delta_sync(player_id)
+    room.set_encoding(player_id, data.get("encoding"))
+    room.set_positions(player_id, data.get("positions"))
+
+    await conn.reply({
+        "type": "room_created",
+        "room_id": room.room_id,
+        "player_id": player_id,
+        "player_number": 1,
+        "encoding": room.encodings.get(player_id, "json"),
+        **room.position_info(player_id),
+        "reconnect_token": room.issue_reconnect_token(player_id),
+        "room_info": room.get_room_info()
+    })
+
+
+@dispatcher.register("join_room", {"room_id": OptionalStr, "player_name": str, "player_id": OptionalStr})
+async def handle_join_room(conn: Connection, data: dict):
+    """Join an existing room"""
+    join_room_id = data.get("room_id", conn.room_id)
+    player_name = data.get("player_name", "Player")
+    conn.player_id = player_id = data.get("player_id") or secrets.token_hex(8)
+
+    conn.room = room = await room_manager.join_room(
+        room_id=join_room_id,
+        player_id=player_id,
+        player_name=player_name,
+        websocket=conn.websocket
+    )
+
+    if room:
+        if data.get("delta_sync"):
+            room.enable_delta_sync(player_id)
+        room.set_encoding(player_id, data.get("encoding"))
+        room.set_positions(player_id, data.get("positions"))
+        await conn.reply({
+            "type": "room_joined",
+            "room_id": room.room_id,
+            "player_id": player_id,
+            "player_number": room.get_player_number(player_id),
+            "encoding": room.encodings.get(player_id, "json"),
+            **room.position_info(player_id),
+            "reconnect_token": room.issue_reconnect_token(player_id),
+            "room_info": room.get_room_info()
+        })
+    else:
+        await conn.reply({
+            "type": "error",
+            "message": "Failed to join room. Room may be full or game already started."
+        })
+
+
+@dispatcher.register("player_ready", {"is_ready": bool})
+async def handle_player_ready(conn: Connection, data: dict):
+    """Toggle player ready status"""
+    room, player_id = conn.room, conn.player_id
+    if room and player_id:
+        player = room.players.get(player_id)
+        if player:
+            player.is_ready = data.get("is_ready", not player.is_ready)
+            await room.broadcast({
+                "type": "player_ready_changed",
+                "player_id": player_id,
+                "is_ready": player.is_ready,
+                "room_info": room.get_room_info()
+            })
+
+
+@dispatcher.register("start_game")
+async def handle_start_game(conn: Connection, data: dict):
+    """Host starts the game"""
+    room = conn.room
+    if room and conn.player_id == room.host_id:
+        # Check if all players are ready
+        all_ready = all(p.is_ready for p in room.players.values())
+
+        if all_ready and room.player_count >= 2:
+            room.game_started = True
+            # Schedule game to start 500ms in the future
+            # This gives all clients time to receive and prepare
+            room.game_start_timestamp = time.time() * 1000 + 500
+
+            room_manager.publish()  # No longer joinable
+
+            game_state = room.get_game_state()
+            # Broadcast to ALL clients in the same tick
+            await room.broadcast({
+                "type": "game_starting",
+                "game_state": game_state,
+                "sequence_id": room.get_next_sequence()
+            })
+        else:
+            await conn.reply({
+                "type": "error",
+                "message": "Cannot start game. All players must be ready and at least 2 players needed."
+            })
+
+
+@dispatcher.register("leave_room")
+async def handle_leave_room(conn: Connection, data: dict):
+    """Leave the room"""
+    if conn.room and conn.player_id:
+        await room_manager.leave_room(conn.room.room_id, conn.player_id)
+        await conn.reply({
+            "type": "room_left"
+        })
+        conn.room = None
+
+
+@dispatcher.register("reconnect", {"token": str, "room_id": str, "player_id": str})
+async def handle_reconnect(conn: Connection, data: dict):
+    """Rejoin with the reconnect_token from room_created/room_joined/reconnected"""
+    reconnect_token = data.get("token", "")
+    reconnect_room_id = data.get("room_id", "")
+    reconnect_player_id = data.get("player_id", "")
+
+    room = room_manager.get_room(reconnect_room_id)
+    if room and await room.reconnect_player(reconnect_player_id, conn.websocket, reconnect_token):
+        conn.room = room
+        conn.player_id = player_id = reconnect_player_id
+        if data.get("delta_sync"):
+            room.enable_delta_sync(player_id)
+        room.set_encoding(player_id, data.get("encoding"))
+        room.set_positions(player_id, data.get("positions"))
+
+        # Send full game state to reconnected player
+        await conn.reply({
+            "type": "reconnected",
+            "room_id": room.room_id,
+            "player_id": player_id,
+            "player_number": room.get_player_number(player_id),
+            **room.position_info(player_id),
+            "reconnect_token": room.issue_reconnect_token(player_id),  # The old one is used up
+            "game_state": room.get_game_state()
+        })
+    else:
+        await conn.reply({
+            "type": "error",
+            "message": "Reconnection failed. Token invalid or session expired."
+        })
+
+
+@dispatcher.register("chat", {"message": str})
+async def handle_chat(conn: Connection, data: dict):
+    """Chat message (works both in lobby and during game)"""
+    room, player_id = conn.room, conn.player_id
+    if room and player_id:
+        player = room.players.get(player_id)
+        chat_msg = {
+            "type": "chat",
+            "player_id": player_id,
+            "player_name": player.player_name if player else "Unknown",
+            "message": data.get("message", ""),
+            "timestamp": datetime.now().isoformat()
+        }
+        # Store in chat history if game is in progress
+        if room.game_started:
+            room.chat_history.append(chat_msg)
+        await room.broadcast(chat_msg)
+
+
+# ============================================================================
+# In-game state
+# ============================================================================
+
+@dispatcher.register("player_state", {"state": dict})
+async def handle_player_state(conn: Connection, data: dict):
+    """Update player position and state"""
+    room, player_id = conn.room, conn.player_id
+    if room and player_id:
+        state_update = data.get("state", {})
+
+        # Sampled, formatted and written off the event loop (game_log.py)
+        game_log.event("PLAYER_STATE", room.room_id, "Player:%s Pos:(%s, %s)", player_id, state_update.get('x'), state_update.get('y'))
+
+        # Quantized once here (as sent, the log above stays in pixels), the room stores and relays it as is
+        room.ingest_state(state_update, player_id)
+        room.update_player_state(player_id, state_update)
+
+        # Relay to other players (immediately, or coalesced into the next tick)
+        await room.relay_player_state(player_id, state_update)
+
+
+@dispatcher.register("game_action", {"action": OptionalStr, "data": dict})
+async def handle_game_action(conn: Connection, data: dict):
+    """Game actions (shooting, damage, etc.)"""
+    room, player_id = conn.room, conn.player_id
+    if room:
+        action = data.get("action")
+        action_data = data.get("data", {})
+        # Special-case: assist requests — allow host to adjust partner position
+        if action == 'assist' and player_id == room.host_id:
+            target_id = action_data.get('target_player_id')
+            new_x = action_data.get('x')
+            new_y = action_data.get('y')
+            if target_id and target_id in room.players:
+                # Update authoritative server-side player position
+                p = room.players[target_id]
+                position = {field: value for field, value in (("x", new_x), ("y", new_y))
+                            if isinstance(value, (int, float))}
+                for field, value in room.ingest_state(position, player_id).items():
+                    setattr(p, field, value)
+                # Broadcast updated player position to all clients
+                await room.broadcast({
+                    "type": "player_state_update",
+                    "player_id": target_id,
+                    "state": {"x": p.x, "y": p.y}
+                })
+        # Broadcast the game action to other clients for visual/UX feedback
+        await room.broadcast({
+            "type": "game_action",
+            "player_id": player_id,
+            "action": action,
+            "data": action_data
+        }, exclude=player_id)
+
+
+@dispatcher.register("collect_item", {"item_type": str, "item_id": str})
+async def handle_collect_item(conn: Connection, data: dict):
+    """Item collection (coins, powerups) - first collector in reach wins"""
+    room, player_id = conn.room, conn.player_id
+    if room and player_id:
+        item_type = data.get("item_type", "coin")
+        item_id = data.get("item_id", "")
+
+        # Formatted and written off the event loop (game_log.py). The collector's position goes
+        # with it, so analyze_sync's distance check doesn't depend on (sampled) PLAYER_STATE lines
+        position = room.player_position(player_id)
+        if position is None:
+            game_log.event("ITEM_COLLECT", room.room_id, "Player:%s Type:%s ID:%s", player_id, item_type, item_id)
+        else:
+            game_log.event("ITEM_COLLECT", room.room_id, "Player:%s Type:%s ID:%s Pos:(%s, %s)",
+                           player_id, item_type, item_id, *position)
+
+        # Proximity check against the collector's last known position (see collection.py)
+        if collection.mode != collection.OFF:
+            outcome, distance = room.check_collection(player_id, item_id)
+            if outcome == collection.TOO_FAR:
+                player_x, player_y = room.player_position(player_id)
+                game_log.event("SYNC_ERROR", room.room_id, "Player:%s Type:%s ID:%s Dist:%.2f Pos:(%s, %s) Nearby:%s",
+                               player_id, item_type, item_id, distance, player_x, player_y,
+                               room.items.near(player_x, player_y), level=logging.WARNING)
+                if collection.mode == collection.ENFORCE:
+                    collection.stats.record(collection.REJECTED)
+                    await conn.reply({
+                        "type": "item_collect_rejected",
+                        "item_id": item_id,
+                        "reason": collection.TOO_FAR
+                    })
+                    return
+
+        # Check if item was already collected
+        if room.mark_item_collected(item_type, item_id, player_id):
+            # First to collect - update server's player totals where applicable
+            player_state = room.players.get(player_id)
+            if player_state:
+                if item_type == 'coin':
+                    # Increment player's coins and award score
+                    player_state.coins = (player_state.coins or 0) + 1
+                    player_state.score = (player_state.score or 0) + 10
+                # For powerups we currently do not change coins but could adjust score/effects server-side
+            player_coins = player_state.coins if player_state else None
+            player_score = player_state.score if player_state else None
+            await room.broadcast({
+                "type": "item_collected",
+                "player_id": player_id,
+                "item_type": item_type,
+                "item_id": item_id,
+                "player_coins": player_coins,
+                "player_score": player_score
+            })
+        else:
+            # Item already collected by other player
+            await conn.reply({
+                "type": "item_already_collected",
+                "item_id": item_id
+            })
+
+
+@dispatcher.register("enemy_state", {"enemy_id": str, "state": dict})
+async def handle_enemy_state(conn: Connection, data: dict):
+    """Enemy state update (host sends, all receive)"""
+    room, player_id = conn.room, conn.player_id
+    if room and player_id:
+        enemy_id = data.get("enemy_id", "")
+        state_update = data.get("state", {})
+
+        # Sampled, formatted and written off the event loop (game_log.py)
+        game_log.event("ENEMY_STATE", room.room_id, "Enemy:%s Pos:(%s, %s)", enemy_id, state_update.get('x'), state_update.get('y'))
+        room.ingest_state(state_update, player_id)
+
+        # Update enemy state on server
+        room.update_enemy_state(enemy_id, state_update)
+
+        # Relay to other players (immediately, or coalesced into the next tick)
+        await room.relay_enemy_state(enemy_id, state_update, player_id)
+
+
+@dispatcher.register("enemy_spawn", {"enemy": dict})
+async def handle_enemy_spawn(conn: Connection, data: dict):
+    """Host spawns an enemy, register and broadcast"""
+    room = conn.room
+    if room and conn.player_id == room.host_id:
+        enemy_data = data.get("enemy", {})
+        # Formatted and written off the event loop (game_log.py)
+        game_log.event("ENEMY_SPAWN", room.room_id, "ID:%s Pos:(%s, %s) Type:%s",
+                       enemy_data.get('enemy_id'), enemy_data.get('x'), enemy_data.get('y'), enemy_data.get('enemy_type'))
+
+        enemy_id = room.spawn_enemy(room.ingest_state(enemy_data, conn.player_id))
+
+        # Broadcast spawn to all players (including host for confirmation)
+        await room.broadcast({
+            "type": "enemy_spawned",
+            "enemy": room.enemies.get_dict(enemy_id) or enemy_data
+        })
+
+
+@dispatcher.register("enemy_killed", {"enemy_id": str})
+async def handle_enemy_killed(conn: Connection, data: dict):
+    """Enemy death (first killer wins), the server drops the enemy's coins"""
+    room, player_id = conn.room, conn.player_id
+    if room and player_id:
+        enemy_id = data.get("enemy_id", "")
+        print(f"[ROOM {room.room_id}] enemy_killed reported by {player_id}: {enemy_id}")
+
+        # Check if enemy is still alive
+        if room.kill_enemy(enemy_id, player_id):
+            # First to kill - broadcast to all
+            await room.broadcast({
+                "type": "enemy_killed",
+                "enemy_id": enemy_id,
+                "killed_by": player_id
+            })
+
+            # Server (authoritative) will spawn coins for the killed enemy
+            enemy_info = room.pixel_state(room.enemies.get_dict(enemy_id) or {})
+            try:
+                x = float(enemy_info.get('x', 0))
+                y = float(enemy_info.get('y', 0))
+            except Exception:
+                x = 0.0
+                y = 0.0
+
+            # coin_reward may be provided by host or default
+            coin_count = int(enemy_info.get('coin_reward', 0) or 0)
+
+            # If there are coins to spawn, create deterministic spread and broadcast each coin
+            for i in range(coin_count):
+                # Deterministic offsets so all clients compute same motion later
+                offset_x = ((int(x) * 7 + i * 13) % 61) - 30
+                offset_y = ((int(y) * 11 + i * 17) % 21) - 20
+                coin_x = x + offset_x
+                coin_y = y + offset_y
+
+                # Deterministic velocities so clients animate drops similarly
+                vel_x = ((int(x) * 3 + i * 19) % 201) - 100
+                vel_y = -200 + ((int(y) * 5 + i * 23) % 101)
+
+                coin_data = {
+                    'x': coin_x,
+                    'y': coin_y,
+                    'value': 1,
+                    'velocity_x': vel_x,
+                    'velocity_y': vel_y
+                }
+                # Use deterministic coin_id so host-local coin IDs (coin_drop_...) match
+                # the server-assigned id. This prevents mismatch when host spawns
+                # coins locally and the server also registers them.
+                coin_data['coin_id'] = f"coin_drop_{int(x)}_{int(y)}_{i}"
+                coin_id = room.spawn_coin(room.ingest_state(coin_data))
+                # Broadcast spawn to all players
+                await room.broadcast({
+                    "type": "coin_spawned",
+                    "coin": room.coins.get_dict(coin_id) or coin_data
+                })
+        else:
+            # Enemy already dead
+            await conn.reply({
+                "type": "enemy_already_dead",
+                "enemy_id": enemy_id
+            })
+
+            # Force state update to ensure client removes the ghost enemy
+            await conn.reply({
+                "type": "enemy_state_update",
+                "enemy_id": enemy_id,
+                "state": {"is_alive": False, "state": "dead"}
+            })
+
+
+@dispatcher.register("coin_spawn", {"coin": dict})
+async def handle_coin_spawn(conn: Connection, data: dict):
+    """Host spawns a coin, register and broadcast"""
+    room = conn.room
+    if room and conn.player_id == room.host_id:
+        coin_data = data.get("coin", {})
+        # Formatted and written off the event loop (game_log.py)
+        game_log.event("COIN_SPAWN", room.room_id, "ID:%s Pos:(%s, %s)", coin_data.get('coin_id'), coin_data.get('x'), coin_data.get('y'))
+
+        coin_id = room.spawn_coin(room.ingest_state(coin_data, conn.player_id))
+
+        # Broadcast spawn to all players
+        await room.broadcast({
+            "type": "coin_spawned",
+            "coin": room.coins.get_dict(coin_id) or coin_data
+        })
+
+
+@dispatcher.register("powerup_spawn", {"powerup": dict})
+async def handle_powerup_spawn(conn: Connection, data: dict):
+    """Host spawns a powerup, register and broadcast"""
+    room = conn.room
+    if room and conn.player_id == room.host_id:
+        powerup_data = data.get("powerup", {})
+        # Formatted and written off the event loop (game_log.py)
+        game_log.event("POWERUP_SPAWN", room.room_id, "ID:%s Pos:(%s, %s) Type:%s",
+                       powerup_data.get('powerup_id'), powerup_data.get('x'), powerup_data.get('y'), powerup_data.get('type'))
+
+        powerup_id = room.spawn_powerup(room.ingest_state(powerup_data, conn.player_id))
+
+        # Broadcast spawn to all players
+        await room.broadcast({
+            "type": "powerup_spawned",
+            "powerup": room.powerups.get_dict(powerup_id) or powerup_data
+        })
+
+
+@dispatcher.register("sync_entities", {"enemies": list, "coins": list})
+async def handle_sync_entities(conn: Connection, data: dict):
+    """Host sends full entity state periodically for sync verification"""
+    room, player_id = conn.room, conn.player_id
+    if room and player_id == room.host_id:
+        # Bulk quantization of the full entity lists
+        enemies = room.ingest_entities(data.get("enemies", []), player_id)
+        coins = room.ingest_entities(data.get("coins", []), player_id)
+
+        print(f"[ROOM {room.room_id}] sync_entities from host (enemies: {len(enemies)}, coins: {len(coins)})")
+
+        # Update server state from host
+        room.apply_host_sync(enemies, coins)
+
+        # Broadcast to non-host players for sync (full or delta per player)
+        await room.broadcast_entities_sync(exclude=player_id)
+
+
+@dispatcher.register("entities_ack", {"sequence_id": int}, read_only=True)
+async def handle_entities_ack(conn: Connection, data: dict):
+    """Client confirms it applied an entity sync - becomes its delta baseline"""
+    if conn.room and conn.player_id:
+        sequence_id = data.get("sequence_id")
+        if isinstance(sequence_id, int):
+            conn.room.acknowledge_entities(conn.player_id, sequence_id)
+
+
+# ============================================================================
+# Connection upkeep
+# ============================================================================
+
+@dispatcher.register("ping", read_only=True)
+async def handle_ping(conn: Connection, data: dict):
+    """Keep-alive ping"""
+    await conn.reply({"type": "pong"})
+
+
+@dispatcher.register("time_sync", read_only=True)
+async def handle_time_sync(conn: Connection, data: dict):
+    """NTP-style time synchronization"""
+    # Client sends their timestamp, server responds with server time
+    client_time = data.get("client_time", 0)
+    server_time = time.time() * 1000  # Server time in ms
+    await conn.reply({
+        "type": "time_sync_response",
+        "client_time": client_time,  # Echo back for RTT calculation
+        "server_time": server_time,
+        # The latest sequence sent, not a new one - time_sync doesn't change room state
+        "sequence_id": conn.room.sequence_id if conn.room else 0
+    })
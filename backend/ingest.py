@@ -0,0 +1,214 @@
+"""
+Batched score ingestion
+
+submit_score no longer writes to SQLite itself. ScoreWriter assigns the id
+and created_at up front, hands the row back immediately (so it can go
+straight into the leaderboard index) and queues it; a background thread
+writes queued rows in one transaction per batch, every FLUSH_INTERVAL
+seconds or as soon as BATCH_SIZE rows are waiting.
+
+Ids come from blocks of ID_BLOCK reserved in the database: the scores row
+in sqlite_sequence is moved past the block in one IMMEDIATE transaction,
+so other processes on the same game.db (several workers) and plain
+AUTOINCREMENT inserts never get the same ids. Unused ids of a block are
+skipped, like ids of deleted rows.
+
+Rows that can't be written are counted in `failed` and handed to
+on_failure (submit_score takes them back out of the leaderboard index).
+
+close() (also registered with atexit) writes everything still queued.
+"""
+
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, List, Optional, Tuple
+
+from leaderboard import SCORE_COLUMNS
+
+BATCH_SIZE = 200  # Rows per transaction
+FLUSH_INTERVAL = 0.05  # Seconds a submission may wait before it is written
+ID_BLOCK = 100  # Ids reserved in the database at a time
+
+INSERT_SQL = f"INSERT INTO scores ({', '.join(SCORE_COLUMNS)}) VALUES ({', '.join('?' * len(SCORE_COLUMNS))})"
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_timestamp() -> str:
+    """Current UTC time in the format CURRENT_TIMESTAMP produces"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ScoreWriter:
+    """Queue of score rows written to SQLite in batches by a background thread"""
+
+    def __init__(self, pool, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 id_block: int = ID_BLOCK, on_failure: Optional[Callable[[List[Tuple]], None]] = None):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block = id_block
+        self.on_failure = on_failure  # Called on the writer thread with rows that were dropped
+        self.pending: Deque[Tuple] = deque()
+        self.written = 0  # Rows committed so far
+        self.failed = 0  # Rows that could not be written and were dropped
+        self._next_id = 0
+        self._id_limit = 0  # First id past the reserved block
+        self._writing: List[Tuple] = []  # Rows taken off the queue but not committed yet
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Reserve the first block of ids and start the writer thread"""
+        with self._lock:
+            self._reserve_ids_locked()
+
+        self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, player_name: str, score: int, coins: int, enemies_defeated: int, distance: int,
+               level: int, game_mode: str) -> Tuple:
+        """
+        Queue a score, returns the full row (id and created_at assigned) right away
+
+        Every id_block submissions this reserves new ids in the database, so
+        call it from a worker thread rather than the event loop.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Score writer is closed")
+            if self._next_id >= self._id_limit:
+                self._reserve_ids_locked()
+            row = (self._next_id, player_name, score, coins, enemies_defeated, distance, level,
+                   game_mode, sqlite_timestamp())
+            self._next_id += 1
+            self.pending.append(row)
+            # First row starts the flush timer, a full batch is written right away
+            if len(self.pending) == 1 or len(self.pending) >= self.batch_size:
+                self._wakeup.notify()
+        return row
+
+    def _reserve_ids_locked(self):
+        """Take the next id_block ids from the scores AUTOINCREMENT sequence"""
+        with self.pool.connection() as conn:
+            # IMMEDIATE takes the write lock up front, so two processes can't read the same counter
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM scores").fetchone()[0]
+                # AUTOINCREMENT never reuses ids of deleted rows, so respect its counter too
+                row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'scores'").fetchone()
+                first = max(max_id, row[0] if row else 0) + 1
+                last = first + self.id_block - 1
+                if row:
+                    conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'scores'", (last,))
+                else:
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('scores', ?)", (last,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self._next_id, self._id_limit = first, last + 1
+
+    def unsaved(self) -> List[Tuple]:
+        """Rows submitted but not committed yet (queued or being written)"""
+        with self._lock:
+            return self._writing + list(self.pending)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is written, returns False on timeout"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # No writer thread (not started or closed) - write on the caller's thread
+                self._write_pending_locked()
+                return True
+            self._wakeup.notify()
+            return self._flushed.wait_for(lambda: not self.pending and not self._writing, timeout)
+
+    def close(self):
+        """Stop the writer thread after writing everything still queued"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._write_pending_locked()
+
+    def _take_batch_locked(self) -> List[Tuple]:
+        count = min(len(self.pending), self.batch_size)
+        batch = [self.pending.popleft() for _ in range(count)]
+        self._writing.extend(batch)
+        return batch
+
+    def _write_pending_locked(self):
+        while self.pending:
+            batch = self._take_batch_locked()
+            self._write(batch)
+            del self._writing[:len(batch)]
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self.pending and not self._closed:
+                    self._wakeup.wait()
+                if self.pending and len(self.pending) < self.batch_size and not self._closed:
+                    # Give the batch a chance to fill up
+                    self._wakeup.wait(self.flush_interval)
+                if not self.pending:
+                    self._flushed.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                batch = self._take_batch_locked()
+
+            self._write(batch)
+
+            with self._lock:
+                del self._writing[:len(batch)]
+                if not self.pending and not self._writing:
+                    self._flushed.notify_all()
+
+    def _write(self, batch: List[Tuple]):
+        """Write one batch in a single transaction, isolating bad rows if it fails"""
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany(INSERT_SQL, batch)
+                conn.commit()
+            self.written += len(batch)
+            return
+        except Exception:
+            # A bad row (IntegrityError) or a transient error (database is locked):
+            # either way, give each row its own chance
+            logger.exception("Batch insert of %d scores failed, retrying row by row", len(batch))
+
+        dropped = []
+        for row in batch:
+            try:
+                with self.pool.connection() as conn:
+                    conn.execute(INSERT_SQL, row)
+                    conn.commit()
+                self.written += 1
+            except Exception:
+                logger.exception("Dropping score %s for %s", row[0], row[1])
+                dropped.append(row)
+        if dropped:
+            self.failed += len(dropped)
+            if self.on_failure is not None:
+                try:
+                    self.on_failure(dropped)
+                except Exception:
+                    logger.exception("Score failure callback failed")
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            pending = len(self.pending) + len(self._writing)
+        return {"written": self.written, "failed": self.failed, "pending": pending}
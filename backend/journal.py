@@ -0,0 +1,285 @@
+"""
+Binary event journal for game_state events
+
+The text log (game_state.log) has to be parsed back with regexes and
+strptime by analyze_sync.py. The journal stores the same events as
+length-prefixed binary records with a fixed schema, so reading them back
+is a struct unpack per record:
+
+    file:   MAGIC, then records
+    record: <H body length> <d ts> <B event type> <d x> <d y>
+            then room, entity_id, item_id, kind as UTF-8, NUL-separated
+
+- ts is a Unix timestamp, x/y are NaN when the event has no position
+  (ITEM_COLLECT: the collector's position, if known)
+- entity_id: the player or entity the event is about
+- item_id: the collected item (ITEM_COLLECT, SYNC_ERROR)
+- kind: enemy / powerup / collected item type
+
+JournalHandler sits next to the text writer on game_log's listener thread
+and turns game_log.event() records into journal records (FIELDS maps each
+event's arguments onto the schema). Files rotate by size like
+RotatingFileHandler: game_state.journal, .1, .2, ...; read_journals()
+reads a rotated set oldest first.
+
+A crash can leave a torn record at the end of the file. JournalWriter
+cuts the file back to its last complete record before appending, and
+decode_records stops at a malformed record instead of raising.
+"""
+
+import logging
+import math
+import os
+import struct
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+MAGIC = b"GSJ\x01"
+MAX_BYTES = 64 * 1024 * 1024  # Rotate after this many bytes
+BACKUP_COUNT = 5
+READ_CHUNK = 1024 * 1024
+
+_LENGTH = struct.Struct("<H")
+_FIXED = struct.Struct("<dBdd")  # ts, event type, x, y
+MAX_STRING = 255  # Characters kept per string field
+
+# Event type codes (index in this tuple); new types are appended, never reordered
+EVENT_TYPES: Tuple[str, ...] = (
+    "UNKNOWN", "PLAYER_STATE", "ENEMY_STATE", "ENEMY_SPAWN", "COIN_SPAWN", "POWERUP_SPAWN",
+    "ITEM_COLLECT", "SYNC_ERROR",
+)
+EVENT_CODES: Dict[str, int] = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+# game_log.event() arguments of each event type -> journal fields (None: not journaled)
+FIELDS: Dict[str, Tuple[Optional[str], ...]] = {
+    "PLAYER_STATE": ("entity_id", "x", "y"),
+    "ENEMY_STATE": ("entity_id", "x", "y"),
+    "ENEMY_SPAWN": ("entity_id", "x", "y", "kind"),
+    "COIN_SPAWN": ("entity_id", "x", "y"),
+    "POWERUP_SPAWN": ("entity_id", "x", "y", "kind"),
+    "ITEM_COLLECT": ("entity_id", "kind", "item_id", "x", "y"),
+    "SYNC_ERROR": ("entity_id", "kind", "item_id", None, "x", "y", None),
+}
+
+
+class JournalRecord(NamedTuple):
+    ts: float
+    type: str
+    room: str
+    entity_id: str = ""
+    item_id: str = ""
+    kind: str = ""
+    x: float = math.nan
+    y: float = math.nan
+
+
+def _clean_str(value) -> str:
+    return "" if value is None else str(value)[:MAX_STRING].replace("\0", "")
+
+
+def _as_float(value) -> float:
+    return float(value) if type(value) in (int, float) else math.nan
+
+
+def encode_record(record: JournalRecord) -> bytes:
+    strings = "\0".join((_clean_str(record.room), _clean_str(record.entity_id),
+                         _clean_str(record.item_id), _clean_str(record.kind)))
+    body = (_FIXED.pack(record.ts, EVENT_CODES.get(record.type, 0), _as_float(record.x), _as_float(record.y))
+            + strings.encode("utf-8"))
+    return _LENGTH.pack(len(body)) + body
+
+
+def decode_records(buffer: bytes, offset: int = 0) -> Tuple[List[JournalRecord], int]:
+    """
+    Decode the complete records in buffer from offset, returns them and the
+    offset after the last one (a partial or malformed record ends decoding)
+    """
+    records = []
+    append = records.append
+    end = len(buffer)
+    unpack_fixed, fixed_size = _FIXED.unpack_from, _FIXED.size
+    event_types, known_types = EVENT_TYPES, len(EVENT_TYPES)
+    # Hot loop for multi-GB journals: one unpack and one decode per record
+    while offset + 2 <= end:
+        start = offset + 2
+        stop = start + (buffer[offset] | buffer[offset + 1] << 8)
+        if stop > end:
+            break  # Partial record, the rest hasn't been written (or read) yet
+        if stop - start < fixed_size:
+            break  # Malformed (torn write) - nothing after it can be framed
+        ts, code, x, y = unpack_fixed(buffer, start)
+        strings = buffer[start + fixed_size:stop].decode("utf-8", "replace").split("\0")
+        if len(strings) != 4:
+            break
+        room, entity_id, item_id, kind = strings
+        append(JournalRecord(ts, event_types[code] if code < known_types else "UNKNOWN",
+                             room, entity_id, item_id, kind, x, y))
+        offset = stop
+    return records, offset
+
+
+class JournalWriter:
+    """Appends records to a journal file, rotating it by size"""
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.stream = None
+        self.size = 0
+        self._open()
+
+    def _open(self):
+        self._repair()
+        self.stream = open(self.path, "ab")
+        self.size = self.stream.tell()
+        if self.size == 0:
+            self.stream.write(MAGIC)
+            self.size = len(MAGIC)
+
+    def _repair(self):
+        """Cut a torn record off the end of an existing journal, so appended records stay framed"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if not data:
+            return
+        if not data.startswith(MAGIC):
+            if MAGIC.startswith(data):
+                end = 0  # Torn header
+            else:
+                # Not a journal - keep it, but don't append to it
+                os.replace(self.path, self.path + ".corrupt")
+                return
+        else:
+            _, end = decode_records(data, len(MAGIC))
+        if end < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+
+    def write(self, record: JournalRecord):
+        data = encode_record(record)
+        if self.max_bytes and self.size + len(data) > self.max_bytes and self.size > len(MAGIC):
+            self.rotate()
+        self.stream.write(data)
+        self.size += len(data)
+
+    def rotate(self):
+        """game_state.journal -> .1 -> .2 ... (the oldest beyond backup_count is deleted)"""
+        self.stream.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def flush(self):
+        if self.stream:
+            self.stream.flush()
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+
+class JournalHandler(logging.Handler):
+    """Logging handler writing game_log.event() records to a journal (runs on game_log's writer thread)"""
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT):
+        super().__init__()
+        self.writer = JournalWriter(path, max_bytes, backup_count)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            journal_record = record_from_event(record.created, record.args)
+            if journal_record is not None:
+                self.writer.write(journal_record)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+        super().close()
+
+
+def record_from_event(ts: float, args) -> Optional[JournalRecord]:
+    """Journal record for game_log.event() arguments (room_id, event_type, *details), None if not journaled"""
+    if not isinstance(args, tuple) or len(args) < 2:
+        return None
+    room_id, event_type, details = args[0], args[1], args[2:]
+    fields = FIELDS.get(event_type)
+    if fields is None:
+        return None
+    values = {field: value for field, value in zip(fields, details) if field is not None}
+    return JournalRecord(ts, event_type, str(room_id), **values)
+
+
+class JournalReader:
+    """
+    Reads records from one journal file
+
+    records() returns what has been written so far and can be called again
+    to continue from where it stopped (monitoring a live journal).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        magic = self.file.read(len(MAGIC))
+        if magic != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a game_state journal")
+        self.pending = b""
+
+    def records(self) -> Iterator[JournalRecord]:
+        while True:
+            chunk = self.file.read(READ_CHUNK)
+            if not chunk:
+                return
+            buffer = self.pending + chunk
+            records, offset = decode_records(buffer)
+            self.pending = buffer[offset:]
+            yield from records
+
+    def close(self):
+        self.file.close()
+
+
+def is_journal(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def journal_files(path: str) -> List[str]:
+    """A journal and its rotated backups, oldest first"""
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+    files = list(reversed(backups))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_journals(path: str) -> Iterator[JournalRecord]:
+    """Every record of a journal and its rotated backups, in write order"""
+    for file_path in journal_files(path):
+        reader = JournalReader(file_path)
+        try:
+            yield from reader.records()
+        finally:
+            reader.close()
@@ -0,0 +1,144 @@
+"""
+In-memory leaderboard index
+
+Scores are kept in sorted arrays (one per game_mode plus one across all
+modes) ordered by score descending, then id ascending. Top-N and rank
+queries are answered with bisect instead of ORDER BY / COUNT(*) scans.
+
+The index is loaded from SQLite at startup and submit_score adds every
+row it queues for the database. With several workers on one game.db the
+other workers' rows only show up when main.py reloads the index (it does
+when the database changed, see database.ChangeWatcher).
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Row layout shared with the scores table SELECTs in main.py
+SCORE_COLUMNS = ("id", "player_name", "score", "coins", "enemies_defeated", "distance", "level",
+                 "game_mode", "created_at")
+SCORE_INDEX = SCORE_COLUMNS.index("score")
+ID_INDEX = SCORE_COLUMNS.index("id")
+GAME_MODE_INDEX = SCORE_COLUMNS.index("game_mode")
+
+ScoreRow = Tuple
+
+
+class SortedScores:
+    """Score rows kept sorted by (-score, id)"""
+
+    def __init__(self):
+        self.keys: List[Tuple[int, int]] = []
+        self.rows: List[ScoreRow] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, row: ScoreRow):
+        key = (-row[SCORE_INDEX], row[ID_INDEX])
+        # Rows usually arrive in id order, so ties land at the end of their score run
+        position = bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.rows.insert(position, row)
+
+    def remove(self, row: ScoreRow) -> bool:
+        key = (-row[SCORE_INDEX], row[ID_INDEX])
+        position = bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return False
+        del self.keys[position]
+        del self.rows[position]
+        return True
+
+    def top(self, limit: int) -> List[ScoreRow]:
+        # Negative limit means "no limit", same as SQLite's LIMIT -1
+        if limit < 0:
+            return list(self.rows)
+        return self.rows[:limit]
+
+    def count_above(self, score: int) -> int:
+        """Number of rows with a strictly higher score"""
+        # (-score,) sorts before every (-score, id) key
+        return bisect_left(self.keys, (-score,))
+
+
+class LeaderboardIndex:
+    """Per game_mode ordered leaderboards, safe to use from threadpool workers"""
+
+    def __init__(self):
+        self._all = SortedScores()
+        self._modes: Dict[str, SortedScores] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, pool, unsaved: Iterable[ScoreRow] = ()):
+        """(Re)build the index from the scores table, plus rows not written to it yet"""
+        with pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {", ".join(SCORE_COLUMNS)}
+                FROM scores
+                ORDER BY score DESC, id ASC
+            """).fetchall()
+
+        all_scores = SortedScores()
+        modes: Dict[str, SortedScores] = {}
+        # Rows are already in index order, so build the arrays by appending
+        for row in rows:
+            key = (-row[SCORE_INDEX], row[ID_INDEX])
+            all_scores.keys.append(key)
+            all_scores.rows.append(row)
+            mode_scores = modes.get(row[GAME_MODE_INDEX])
+            if mode_scores is None:
+                mode_scores = modes[row[GAME_MODE_INDEX]] = SortedScores()
+            mode_scores.keys.append(key)
+            mode_scores.rows.append(row)
+
+        loaded_ids = {row[ID_INDEX] for row in rows}
+        for row in unsaved:
+            if row[ID_INDEX] in loaded_ids:
+                continue  # Written while the table was being read
+            all_scores.add(row)
+            mode_scores = modes.get(row[GAME_MODE_INDEX])
+            if mode_scores is None:
+                mode_scores = modes[row[GAME_MODE_INDEX]] = SortedScores()
+            mode_scores.add(row)
+
+        with self._lock:
+            self._all = all_scores
+            self._modes = modes
+            self.loaded = True
+
+    def add(self, row: ScoreRow):
+        """Add a committed score row"""
+        with self._lock:
+            self._all.add(row)
+            mode_scores = self._modes.get(row[GAME_MODE_INDEX])
+            if mode_scores is None:
+                mode_scores = self._modes[row[GAME_MODE_INDEX]] = SortedScores()
+            mode_scores.add(row)
+
+    def remove(self, row: ScoreRow):
+        """Take out a row that was added but never made it into the database"""
+        with self._lock:
+            self._all.remove(row)
+            mode_scores = self._modes.get(row[GAME_MODE_INDEX])
+            if mode_scores is not None:
+                mode_scores.remove(row)
+
+    def _scores(self, game_mode: Optional[str]) -> Optional[SortedScores]:
+        if game_mode:
+            return self._modes.get(game_mode)
+        return self._all
+
+    def top(self, limit: int, game_mode: Optional[str] = None) -> List[ScoreRow]:
+        """Best scores first, optionally for one game mode"""
+        with self._lock:
+            scores = self._scores(game_mode)
+            return scores.top(limit) if scores else []
+
+    def rank(self, score: int, game_mode: Optional[str] = None) -> int:
+        """1-based rank a score would have (1 + number of strictly higher scores)"""
+        with self._lock:
+            scores = self._scores(game_mode)
+            return (scores.count_above(score) if scores else 0) + 1
@@ -0,0 +1,323 @@
+"""
+Tail-follow for game_state logs and journals (analyze_sync.py --monitor)
+
+LogFollower reads what has been appended to a log since the last read,
+split into complete lines (split_lines) or journal records
+(journal.decode_records); a trailing partial line/record is kept until the
+rest of it has been written.
+
+- Waiting for new data is event-driven: inotify on the log's directory on
+  Linux (through ctypes, no dependency), checking the file every
+  POLL_INTERVAL elsewhere. Only events for the log's own name and its
+  first rotation (path.1) wake the follower, not the checkpoint or the
+  analysis log written next to it
+- Rotation (the log renamed away and a new one created, like
+  logrotate or JournalWriter) is noticed when the old file is read to its
+  end and the path now names another file, which is then read from the
+  start; truncation in place (copytruncate) starts over at the beginning
+- The caller calls save_checkpoint() once it has processed what read()
+  returned; that position is saved to a checkpoint file (at most every
+  CHECKPOINT_INTERVAL, and on close) when it has moved. Items read but not
+  processed yet are never checkpointed, so they're read again after a
+  crash or Ctrl-C. A new follower resumes from the checkpoint - if the log
+  was rotated in between it finishes the rotated file (path.1) first
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+READ_CHUNK = 1024 * 1024
+POLL_INTERVAL = 0.25  # Seconds between checks without inotify
+CHECKPOINT_INTERVAL = 1.0  # Seconds
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # struct inotify_event: wd, mask, cookie, len, then name[len]
+
+Split = Callable[[bytes], Tuple[list, int]]
+
+
+def split_lines(buffer: bytes, offset: int = 0) -> Tuple[List[str], int]:
+    """Complete lines in buffer from offset, and the offset after the last one"""
+    end = buffer.rfind(b"\n", offset) + 1
+    if end <= offset:
+        return [], offset
+    return buffer[offset:end].decode("utf-8", "replace").splitlines(), end
+
+
+def event_names(buffer: bytes) -> List[Optional[str]]:
+    """Names in a buffer of inotify events (None for an event without one, like IN_Q_OVERFLOW)"""
+    names: List[Optional[str]] = []
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(buffer):
+        _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+        offset += EVENT_HEADER.size
+        name = buffer[offset:offset + length].rstrip(b"\0")  # NUL padded
+        offset += length
+        names.append(os.fsdecode(name) if name and not mask & IN_Q_OVERFLOW else None)
+    return names
+
+
+class InotifyWatcher:
+    """Wakes up on changes to a log (or its rotation) in its directory (Linux)"""
+
+    name = "inotify"
+
+    def __init__(self, path: str):
+        base = os.path.basename(path)
+        self.names = {base, f"{base}.1"}
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout: float) -> bool:
+        """Block until the log changed (True) or timeout passed (False)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], max(deadline - time.monotonic(), 0))
+            if not ready:
+                return False
+            if self._drain():
+                return True
+
+    def _drain(self) -> bool:
+        """Read the queued events, True if one is about the log"""
+        relevant = False
+        try:
+            while True:
+                buffer = os.read(self.fd, 65536)
+                if not buffer:
+                    break
+                # No name: the queue overflowed (or the directory went away), assume the log changed
+                relevant = relevant or any(name is None or name in self.names for name in event_names(buffer))
+        except BlockingIOError:
+            pass
+        return relevant
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """Checks the log's size, mtime and inode every POLL_INTERVAL"""
+
+    name = "polling"
+
+    def __init__(self, path: str, interval: float = POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.last = self._signature()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def wait(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            signature = self._signature()
+            if signature != self.last:
+                self.last = signature
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+def make_watcher(path: str):
+    """inotify where available, polling otherwise"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError):
+            pass  # No inotify (or too many watches), poll instead
+    return PollingWatcher(path)
+
+
+def _identity(st: os.stat_result) -> Tuple[int, int]:
+    return st.st_dev, st.st_ino
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+class LogFollower:
+    """
+    Follows a log at path across rotation and truncation
+
+    split turns a buffer into (items, bytes used) - split_lines for text
+    logs, journal.decode_records for journals (with header=journal.MAGIC,
+    which is checked and skipped at the start of every file).
+    """
+
+    def __init__(self, path: str, split: Split = split_lines, header: bytes = b"",
+                 checkpoint: Optional[str] = None, resume: bool = True, watcher=None):
+        self.path = path
+        self.split = split
+        self.header = header
+        self.checkpoint = checkpoint
+        self.watcher = watcher or make_watcher(path)
+        self.file = None
+        self.identity: Optional[Tuple[int, int]] = None
+        self.offset = 0  # File position of the first byte not handed out yet
+        self.pending = b""
+        self.saved_at = 0.0
+        self.consumed: Optional[tuple] = None  # (identity, offset) the caller has processed up to
+        self.saved: Optional[tuple] = None  # (identity, offset) last written to the checkpoint
+        self.closed = False
+        self._resume(resume)
+
+    def _resume(self, resume: bool):
+        state = self._load_checkpoint() if resume else None
+        if state:
+            identity = (state["device"], state["inode"])
+            # The log itself, or the file it was rotated to while we weren't running
+            for candidate in (self.path, f"{self.path}.1"):
+                st = _stat(candidate)
+                if st and _identity(st) == identity and st.st_size >= state["offset"]:
+                    if self._open(candidate, state["offset"]):
+                        self.consumed = self.saved = (self.identity, self.offset)
+                        return
+        if self._open(self.path):
+            self.consumed = (self.identity, self.offset)
+
+    def _load_checkpoint(self) -> Optional[dict]:
+        if not self.checkpoint:
+            return None
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("path") != os.path.abspath(self.path):
+            return None
+        return state
+
+    def save_checkpoint(self, force: bool = False):
+        """
+        Everything read() returned so far has been processed: checkpoint the
+        current position (at most every CHECKPOINT_INTERVAL unless force)
+        """
+        if self.identity is not None:
+            self.consumed = (self.identity, self.offset)
+        if force or time.monotonic() - self.saved_at >= CHECKPOINT_INTERVAL:
+            self._write_checkpoint()
+
+    def _write_checkpoint(self):
+        """Write the consumed position to the checkpoint file (atomically) if it moved"""
+        self.saved_at = time.monotonic()
+        if not self.checkpoint or self.consumed is None or self.saved == self.consumed:
+            return
+        (device, inode), offset = self.consumed
+        state = {"path": os.path.abspath(self.path), "device": device, "inode": inode, "offset": offset}
+        temp_path = self.checkpoint + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.checkpoint)
+        self.saved = self.consumed
+
+    def _open(self, path: str, offset: Optional[int] = None) -> bool:
+        """Start reading path at offset (just after the header by default), False if it isn't readable yet"""
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return False
+        if self.header:
+            header = f.read(len(self.header))
+            if len(header) < len(self.header):
+                f.close()
+                return False  # Just created, the header isn't written yet
+            if header != self.header:
+                f.close()
+                raise ValueError(f"{path} doesn't start with the expected header")
+        if offset is None:
+            offset = len(self.header)
+        f.seek(offset)
+        if self.file:
+            self.file.close()
+        self.file = f
+        self.identity = _identity(os.fstat(f.fileno()))
+        self.offset = offset
+        self.pending = b""
+        return True
+
+    def read(self) -> list:
+        """Everything complete that was written since the last read"""
+        items: list = []
+        while True:
+            if self.file is None and not self._open(self.path):
+                break
+            chunk = self.file.read(READ_CHUNK)
+            if chunk:
+                buffer = self.pending + chunk
+                new, used = self.split(buffer)
+                items.extend(new)
+                self.pending = buffer[used:]
+                self.offset += used
+                continue
+
+            # At the end of the file: is the path still this file?
+            st = _stat(self.path)
+            if st is None:
+                break  # Rotated away, the new file isn't there yet
+            if _identity(st) != self.identity:
+                # Rotated - this file was read to its end, go on with the new one
+                if not self._open(self.path):
+                    break
+                continue
+            if st.st_size < self.file.tell():
+                # Truncated in place - start over
+                if not self._open(self.path):
+                    break
+                continue
+            break
+        return items
+
+    def wait(self, timeout: float = CHECKPOINT_INTERVAL) -> bool:
+        """Block until the log may have changed (or timeout passed)"""
+        return self.watcher.wait(timeout)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._write_checkpoint()  # Up to what was processed, not what was read
+        self.watcher.close()
+        if self.file:
+            self.file.close()
+            self.file = None
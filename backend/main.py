@@ -5,37 +5,31 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional
-import sqlite3
-from datetime import datetime
 import os
-import secrets
+import atexit
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from rooms import room_manager, GameRoom
-from utils import round_floats
+import collection
+from cache import ResponseCache
+from database import ChangeWatcher, ConnectionPool, migrate
+from ingest import ScoreWriter
+from handlers import Connection, dispatcher, rate_limit_stats
+from leaderboard import LeaderboardIndex
+from rooms import room_manager
+from roomstate import SQLiteRoomStateStore
+from routing import proxy_to_owner
+from ratelimit import RateLimitExceeded
+from serializer import decode_frame
+import game_log
 import logging
 
-# Setup game state logger
-game_logger = logging.getLogger("game_state")
-game_logger.setLevel(logging.INFO)
-
-# Create formatter
-formatter = logging.Formatter('%(asctime)s - %(message)s')
-
-# Try to create file handler, fall back to stream handler if permission denied
-try:
-    # Use /tmp for Railway deployments, local file otherwise
-    log_path = '/tmp/game_state.log' if os.getenv("RAILWAY_ENVIRONMENT") else 'game_state.log'
-    fh = logging.FileHandler(log_path)
-    fh.setLevel(logging.INFO)
-    fh.setFormatter(formatter)
-    game_logger.addHandler(fh)
-except (PermissionError, OSError):
-    # Fall back to console logging if file logging fails
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
-    ch.setFormatter(formatter)
-    game_logger.addHandler(ch)
+# Setup game state logger - written by a background thread, falls back to the
+# console if the file can't be opened (see game_log.py)
+# GAME_LOG_PATH if set, /tmp for Railway deployments, local file otherwise
+log_path = os.getenv("GAME_LOG_PATH") or ('/tmp/game_state.log' if os.getenv("RAILWAY_ENVIRONMENT") else 'game_state.log')
+# One set of files per worker when several share the machine (ROOM_DIRECTORY set)
+log_worker = room_manager.worker.worker_id if room_manager.directory.shared else None
+game_log.setup(*game_log.paths_from_env(log_path, log_worker))
 
 app = FastAPI(title="JumpJumpJump API")
 
@@ -106,10 +100,12 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         if path.startswith("/api/bosses/images/"):
             response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
         # API endpoints with dynamic/sensitive content should not be cached
+        # (endpoints served from the response cache set their own, revalidating Cache-Control)
         elif path.startswith("/api/"):
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
+            if "cache-control" not in response.headers:
+                response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+                response.headers["Pragma"] = "no-cache"
+                response.headers["Expires"] = "0"
         # WebSocket endpoints don't need cache headers (they're not cached)
         elif path.startswith("/ws/"):
             pass
@@ -181,101 +177,96 @@ app.add_middleware(
 DATA_DIR = os.getenv("DATA_DIR", os.path.dirname(__file__))
 DB_PATH = os.path.join(DATA_DIR, "game.db")
 
+# Shared connection pool (WAL, tuned pragmas, statement cache) used by all endpoints
+db_pool = ConnectionPool(DB_PATH)
+
 def init_db():
     """Initialize the database with required tables"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create scores table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS scores (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            player_name TEXT NOT NULL,
-            score INTEGER NOT NULL,
-            coins INTEGER NOT NULL,
-            enemies_defeated INTEGER NOT NULL,
-            distance INTEGER NOT NULL,
-            level INTEGER NOT NULL,
-            game_mode TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Create index for faster queries
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_score_desc ON scores(score DESC)
-    """)
-    
-    # Create bosses table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bosses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            boss_index INTEGER NOT NULL UNIQUE,
-            boss_name TEXT NOT NULL,
-            notorious_title TEXT NOT NULL,
-            frame_x INTEGER NOT NULL,
-            frame_y INTEGER NOT NULL
-        )
-    """)
-
-    # Create saved_games table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS saved_games (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            player_name TEXT NOT NULL UNIQUE,
-            level INTEGER NOT NULL,
-            score INTEGER NOT NULL,
-            lives INTEGER NOT NULL,
-            health INTEGER NOT NULL,
-            coins INTEGER NOT NULL,
-            weapon TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Insert boss data if not exists (22 bosses from individual images)
-    cursor.execute("SELECT COUNT(*) FROM bosses")
-    if cursor.fetchone()[0] == 0:
-        boss_names = [
-            ("Vortex Reaper", "The Dimensional Destroyer"),
-            ("Nebula Dragon", "Cosmic Annihilator"),
-            ("Quantum Mech", "Master of Reality"),
-            ("Steel Colossus", "The Iron Tyrant"),
-            ("Inferno Demon", "Harbinger of Flames"),
-            ("Wing Commander", "Sky Dominator"),
-            ("Titan Crusher", "Mountain Breaker"),
-            ("Void Sentinel", "Guardian of Darkness"),
-            ("Plasma King", "Emperor of Energy"),
-            ("Astral Behemoth", "Star Devourer"),
-            ("Eclipse Warlord", "Shadow Conqueror"),
-            ("Nova Juggernaut", "The Supernova Beast"),
-            ("Chrono Mech", "Time's End"),
-            ("Cyber Overlord", "Digital Destroyer"),
-            ("Omega Titan", "The Final Terror"),
-            ("Genesis Machine", "First of Many"),
-            ("Blade Knight", "Master of Combat"),
-            ("Fortress Prime", "The Unbreakable"),
-            ("Plasma Destroyer", "Energy Incarnate"),
-            ("Void Enforcer", "The Abyss Walker"),
-            ("Tentacle Horror", "Deep Space Terror"),
-            ("Ancient Evil", "Primordial Nightmare")
-        ]
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
         
-        for idx, (name, title) in enumerate(boss_names):
-            # Map to individual boss image files
-            frame_x = 0  # Not used for individual images
-            frame_y = 0  # Not used for individual images
-            cursor.execute("""
-                INSERT INTO bosses (boss_index, boss_name, notorious_title, frame_x, frame_y)
-                VALUES (?, ?, ?, ?, ?)
-            """, (idx, name, title, frame_x, frame_y))
-    
-    conn.commit()
-    conn.close()
+        # Create/upgrade tables and indexes
+        migrate(conn)
+        
+        # Insert boss data if not exists (22 bosses from individual images)
+        cursor.execute("SELECT COUNT(*) FROM bosses")
+        if cursor.fetchone()[0] == 0:
+            boss_names = [
+                ("Vortex Reaper", "The Dimensional Destroyer"),
+                ("Nebula Dragon", "Cosmic Annihilator"),
+                ("Quantum Mech", "Master of Reality"),
+                ("Steel Colossus", "The Iron Tyrant"),
+                ("Inferno Demon", "Harbinger of Flames"),
+                ("Wing Commander", "Sky Dominator"),
+                ("Titan Crusher", "Mountain Breaker"),
+                ("Void Sentinel", "Guardian of Darkness"),
+                ("Plasma King", "Emperor of Energy"),
+                ("Astral Behemoth", "Star Devourer"),
+                ("Eclipse Warlord", "Shadow Conqueror"),
+                ("Nova Juggernaut", "The Supernova Beast"),
+                ("Chrono Mech", "Time's End"),
+                ("Cyber Overlord", "Digital Destroyer"),
+                ("Omega Titan", "The Final Terror"),
+                ("Genesis Machine", "First of Many"),
+                ("Blade Knight", "Master of Combat"),
+                ("Fortress Prime", "The Unbreakable"),
+                ("Plasma Destroyer", "Energy Incarnate"),
+                ("Void Enforcer", "The Abyss Walker"),
+                ("Tentacle Horror", "Deep Space Terror"),
+                ("Ancient Evil", "Primordial Nightmare")
+            ]
+            
+            for idx, (name, title) in enumerate(boss_names):
+                # Map to individual boss image files
+                frame_x = 0  # Not used for individual images
+                frame_y = 0  # Not used for individual images
+                cursor.execute("""
+                    INSERT INTO bosses (boss_index, boss_name, notorious_title, frame_x, frame_y)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (idx, name, title, frame_x, frame_y))
+        
+        conn.commit()
 
 # Initialize database on startup
 init_db()
 
+# Ordered in-memory leaderboards, served without touching SQLite
+leaderboard_index = LeaderboardIndex()
+leaderboard_index.load(db_pool)
+
+def drop_failed_scores(rows):
+    """Scores the batch writer couldn't store must not stay on the leaderboard"""
+    for row in rows:
+        leaderboard_index.remove(row)
+    response_cache.invalidate("leaderboard")
+
+# Batched background writer for score submissions
+score_writer = ScoreWriter(db_pool, on_failure=drop_failed_scores)
+score_writer.start()
+
+# Restore checkpointed rooms so reconnect tokens survive a restart
+room_manager.attach_state_store(SQLiteRoomStateStore(db_pool))
+# Last checkpoint on shutdown (after uvicorn has disconnected everyone)
+atexit.register(room_manager.checkpoint_now)
+
+# Pre-serialized responses for read-heavy endpoints (invalidated on writes)
+response_cache = ResponseCache()
+LEADERBOARD_CACHE_TTL = 30.0  # Seconds, submit_score invalidates sooner
+BOSSES_CACHE_TTL = 3600.0  # Boss rows are static
+
+# Other workers on the same game.db (ROOM_DIRECTORY set) submit scores too: reload
+# the index when the database changed. A single process adds every score itself.
+LEADERBOARD_REFRESH_INTERVAL = 1.0  # Seconds between checks for other workers' writes
+scores_watcher = ChangeWatcher(DB_PATH, LEADERBOARD_REFRESH_INTERVAL) if room_manager.directory.shared else None
+
+def refresh_leaderboard():
+    """Pick up scores written by other workers, dropping cached leaderboards"""
+    if scores_watcher is None or not scores_watcher.changed():
+        return
+    # Unsaved rows are taken before the table is read, so none fall between the two
+    leaderboard_index.load(db_pool, score_writer.unsaved())
+    response_cache.invalidate("leaderboard")
+
 # Pydantic models
 class ScoreSubmit(BaseModel):
     player_name: str
@@ -323,15 +314,10 @@ def read_root():
 
 @app.post("/api/scores", response_model=ScoreResponse)
 def submit_score(score_data: ScoreSubmit, api_key: str = Security(verify_api_key)):
-    """Submit a new score to the leaderboard"""
+    """Submit a new score to the leaderboard (written to the database in the background)"""
+    # Plain def: submit() sometimes reserves a block of ids in SQLite, keep that off the event loop
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO scores (player_name, score, coins, enemies_defeated, distance, level, game_mode)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        row = score_writer.submit(
             score_data.player_name,
             score_data.score,
             score_data.coins,
@@ -339,19 +325,11 @@ def submit_score(score_data: ScoreSubmit, api_key: str = Security(verify_api_key
             score_data.distance,
             score_data.level,
             score_data.game_mode
-        ))
-        
-        score_id = cursor.lastrowid
-        conn.commit()
-        
-        # Get the inserted score
-        cursor.execute("""
-            SELECT id, player_name, score, coins, enemies_defeated, distance, level, game_mode, created_at
-            FROM scores WHERE id = ?
-        """, (score_id,))
+        )
         
-        row = cursor.fetchone()
-        conn.close()
+        # The row is queued for the batch writer - make it visible to leaderboard reads right away
+        leaderboard_index.add(row)
+        response_cache.invalidate("leaderboard")
         
         return ScoreResponse(
             id=row[0],
@@ -362,7 +340,8 @@ def submit_score(score_data: ScoreSubmit, api_key: str = Security(verify_api_key
             distance=row[5],
             level=row[6],
             game_mode=row[7],
-            created_at=row[8]
+            created_at=row[8],
+            rank=leaderboard_index.rank(row[2], row[7])  # Provisional, within the game mode
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -371,33 +350,32 @@ def submit_score(score_data: ScoreSubmit, api_key: str = Security(verify_api_key
 def save_game(save_data: SaveGame, api_key: str = Security(verify_api_key)):
     """Save game progress"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Upsert save game
-        cursor.execute("""
-            INSERT INTO saved_games (player_name, level, score, lives, health, coins, weapon, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(player_name) DO UPDATE SET
-                level=excluded.level,
-                score=excluded.score,
-                lives=excluded.lives,
-                health=excluded.health,
-                coins=excluded.coins,
-                weapon=excluded.weapon,
-                timestamp=CURRENT_TIMESTAMP
-        """, (
-            save_data.player_name,
-            save_data.level,
-            save_data.score,
-            save_data.lives,
-            save_data.health,
-            save_data.coins,
-            save_data.weapon
-        ))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Upsert save game
+            cursor.execute("""
+                INSERT INTO saved_games (player_name, level, score, lives, health, coins, weapon, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(player_name) DO UPDATE SET
+                    level=excluded.level,
+                    score=excluded.score,
+                    lives=excluded.lives,
+                    health=excluded.health,
+                    coins=excluded.coins,
+                    weapon=excluded.weapon,
+                    timestamp=CURRENT_TIMESTAMP
+            """, (
+                save_data.player_name,
+                save_data.level,
+                save_data.score,
+                save_data.lives,
+                save_data.health,
+                save_data.coins,
+                save_data.weapon
+            ))
+            
+            conn.commit()
         return {"message": "Game saved successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -406,17 +384,16 @@ def save_game(save_data: SaveGame, api_key: str = Security(verify_api_key)):
 def load_game(player_name: str, api_key: str = Security(verify_api_key)):
     """Load game progress"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT player_name, level, score, lives, health, coins, weapon
-            FROM saved_games
-            WHERE player_name = ?
-        """, (player_name,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT player_name, level, score, lives, health, coins, weapon
+                FROM saved_games
+                WHERE player_name = ?
+            """, (player_name,))
+            
+            row = cursor.fetchone()
         
         if not row:
             return None
@@ -439,42 +416,24 @@ def load_game(player_name: str, api_key: str = Security(verify_api_key)):
 def delete_save_game(player_name: str, api_key: str = Security(verify_api_key)):
     """Delete saved game progress"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM saved_games WHERE player_name = ?", (player_name,))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("DELETE FROM saved_games WHERE player_name = ?", (player_name,))
+            
+            conn.commit()
         return {"message": "Save game deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/scores/leaderboard", response_model=List[ScoreResponse])
-def get_leaderboard(limit: int = 10, game_mode: Optional[str] = None, api_key: str = Security(verify_api_key)):
-    """Get top scores from the leaderboard"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        if game_mode:
-            cursor.execute("""
-                SELECT id, player_name, score, coins, enemies_defeated, distance, level, game_mode, created_at
-                FROM scores
-                WHERE game_mode = ?
-                ORDER BY score DESC
-                LIMIT ?
-            """, (game_mode, limit))
-        else:
-            cursor.execute("""
-                SELECT id, player_name, score, coins, enemies_defeated, distance, level, game_mode, created_at
-                FROM scores
-                ORDER BY score DESC
-                LIMIT ?
-            """, (limit,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+def get_leaderboard(request: Request, limit: int = 10, game_mode: Optional[str] = None,
+                    api_key: str = Security(verify_api_key)):
+    """Get top scores from the leaderboard (cached, supports If-None-Match)"""
+    refresh_leaderboard()
+    
+    def build():
+        rows = leaderboard_index.top(limit, game_mode)
         
         results = []
         for idx, row in enumerate(rows):
@@ -489,9 +448,13 @@ def get_leaderboard(limit: int = 10, game_mode: Optional[str] = None, api_key: s
                 game_mode=row[7],
                 created_at=row[8],
                 rank=idx + 1
-            ))
+            ).model_dump())
         
         return results
+    
+    try:
+        return response_cache.respond(request, ("leaderboard", limit, game_mode), build,
+                                      ttl=LEADERBOARD_CACHE_TTL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -499,19 +462,21 @@ def get_leaderboard(limit: int = 10, game_mode: Optional[str] = None, api_key: s
 def get_player_high_score(player_name: str, api_key: str = Security(verify_api_key)):
     """Get a player's highest score"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        # Read-your-writes: make sure queued submissions are in the table
+        score_writer.flush()
         
-        cursor.execute("""
-            SELECT id, player_name, score, coins, enemies_defeated, distance, level, game_mode, created_at
-            FROM scores
-            WHERE player_name = ?
-            ORDER BY score DESC
-            LIMIT 1
-        """, (player_name,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT id, player_name, score, coins, enemies_defeated, distance, level, game_mode, created_at
+                FROM scores
+                WHERE player_name = ?
+                ORDER BY score DESC
+                LIMIT 1
+            """, (player_name,))
+            
+            row = cursor.fetchone()
         
         if not row:
             raise HTTPException(status_code=404, detail="Player not found")
@@ -536,44 +501,27 @@ def get_player_high_score(player_name: str, api_key: str = Security(verify_api_k
 def get_score_rank(score: int, game_mode: Optional[str] = None, api_key: str = Security(verify_api_key)):
     """Get the rank of a specific score"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        if game_mode:
-            cursor.execute("""
-                SELECT COUNT(*) + 1
-                FROM scores
-                WHERE score > ? AND game_mode = ?
-            """, (score, game_mode))
-        else:
-            cursor.execute("""
-                SELECT COUNT(*) + 1
-                FROM scores
-                WHERE score > ?
-            """, (score,))
-        
-        rank = cursor.fetchone()[0]
-        conn.close()
+        refresh_leaderboard()
+        rank = leaderboard_index.rank(score, game_mode)
         
         return {"score": score, "rank": rank}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/bosses", response_model=List[Boss])
-def get_all_bosses(api_key: str = Security(verify_api_key)):
-    """Get all boss data from the database with individual image URLs"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, boss_index, boss_name, notorious_title, frame_x, frame_y
-            FROM bosses
-            ORDER BY boss_index
-        """)
-        
-        rows = cursor.fetchall()
-        conn.close()
+def get_all_bosses(request: Request, api_key: str = Security(verify_api_key)):
+    """Get all boss data with individual image URLs (cached, supports If-None-Match)"""
+    def build():
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT id, boss_index, boss_name, notorious_title, frame_x, frame_y
+                FROM bosses
+                ORDER BY boss_index
+            """)
+            
+            rows = cursor.fetchall()
         
         # Map to individual boss images
         bosses = []
@@ -588,9 +536,12 @@ def get_all_bosses(api_key: str = Security(verify_api_key)):
                 frame_y=row[5],
                 image_url=f"/api/bosses/images/{boss_index:02d}"
             )
-            bosses.append(boss)
+            bosses.append(boss.model_dump())
         
         return bosses
+    
+    try:
+        return response_cache.respond(request, ("bosses",), build, ttl=BOSSES_CACHE_TTL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -626,462 +577,107 @@ def get_all_rooms():
     """Get list of all game rooms"""
     return room_manager.get_all_rooms()
 
+@app.get("/api/metrics/messages")
+def get_message_metrics(api_key: str = Security(verify_api_key)):
+    """Handler latency histograms per WebSocket message type"""
+    return {message_type: histogram.to_dict()
+            for message_type, histogram in sorted(dispatcher.histograms.items())}
+
+@app.get("/api/metrics/scores")
+def get_score_metrics(api_key: str = Security(verify_api_key)):
+    """Score rows written, dropped (failed) and still queued by the batch writer"""
+    return score_writer.to_dict()
+
+@app.get("/api/metrics/collections")
+def get_collection_metrics(api_key: str = Security(verify_api_key)):
+    """Outcomes of the collect_item proximity checks (see collection.py)"""
+    return collection.stats.to_dict()
+
+@app.get("/api/metrics/ratelimit")
+def get_rate_limit_metrics(api_key: str = Security(verify_api_key)):
+    """Inbound messages held back, merged or dropped by the per-connection rate limits"""
+    return rate_limit_stats.to_dict()
+
 @app.websocket("/ws/room/{room_id}")
 async def websocket_room_endpoint(websocket: WebSocket, room_id: str):
     """
     WebSocket endpoint for game room communication
     
     Message types:
-    - create_room: Create a new room (room_id should be 'new')
+    - create_room: Create a new room (room_id should be 'new', optional tick_rate in Hz)
     - join_room: Join an existing room
+      (create/join/reconnect accept delta_sync: true to receive entities_delta messages
+       and encoding: "binary" for packed state frames, see protocol.py;
+       create_room accepts fixed_point: true (+ optional origin: [x, y]) to store
+       positions as centipixel ints, clients opt in to receiving those with
+       positions: "fixed" - everyone else keeps getting pixel floats, see quantize.py;
+       and aoi_width (+ optional aoi_height) to only send each player the enemies
+       and coins within that window around it, see spatial.py)
     - player_ready: Mark player as ready
     - player_state: Update player position/state
     - game_action: Game actions (shoot, damage, etc.)
+    - entities_ack: Acknowledge an entity sync sequence_id (delta baseline)
     - chat: Chat messages
     - start_game: Host starts the game
     - leave_room: Leave the room
+    - reconnect: Rejoin with the reconnect_token from room_created/room_joined/reconnected
+      (also works after a server restart, rooms are checkpointed - see roomstate.py)
+    
+    Each type is handled by the function registered for it in handlers.py.
+    State updates and chat are rate limited per connection, see ratelimit.py.
+    
+    With several workers (ROOM_DIRECTORY set), join_room/reconnect for a room
+    owned by another worker are relayed to that worker, see routing.py.
     """
     await websocket.accept()
+    room_manager.ensure_checkpoint_loop()
     
-    player_id = None
-    current_room: Optional[GameRoom] = None
+    conn = Connection(websocket, room_id)
     
     try:
         while True:
-            data = await websocket.receive_json()
+            # Text frames carry JSON (serializer.py); binary frames use the packed layout from protocol.py
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = decode_frame(message)
             message_type = data.get("type")
             
-            if message_type == "create_room":
-                # Create a new room
-                room_name = data.get("room_name", "Game Room")
-                player_name = data.get("player_name", "Player")
-                player_id = data.get("player_id") or secrets.token_hex(8)
-                
-                current_room = await room_manager.create_room(
-                    room_name=room_name,
-                    host_id=player_id,
-                    host_name=player_name,
-                    websocket=websocket
-                )
-                
-                await websocket.send_json({
-                    "type": "room_created",
-                    "room_id": current_room.room_id,
-                    "player_id": player_id,
-                    "player_number": 1,
-                    "room_info": current_room.get_room_info()
-                })
-            
-            elif message_type == "join_room":
-                # Join an existing room
-                join_room_id = data.get("room_id", room_id)
-                player_name = data.get("player_name", "Player")
-                player_id = data.get("player_id") or secrets.token_hex(8)
-                
-                current_room = await room_manager.join_room(
-                    room_id=join_room_id,
-                    player_id=player_id,
-                    player_name=player_name,
-                    websocket=websocket
-                )
-                
-                if current_room:
-                    await websocket.send_json({
-                        "type": "room_joined",
-                        "room_id": current_room.room_id,
-                        "player_id": player_id,
-                        "player_number": current_room.get_player_number(player_id),
-                        "room_info": current_room.get_room_info()
-                    })
-                else:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Failed to join room. Room may be full or game already started."
-                    })
-            
-            elif message_type == "player_ready":
-                # Toggle player ready status
-                if current_room and player_id:
-                    player = current_room.players.get(player_id)
-                    if player:
-                        player.is_ready = data.get("is_ready", not player.is_ready)
-                        await current_room.broadcast({
-                            "type": "player_ready_changed",
-                            "player_id": player_id,
-                            "is_ready": player.is_ready,
-                            "room_info": current_room.get_room_info()
-                        })
-            
-            elif message_type == "player_state":
-                # Update player position and state
-                if current_room and player_id:
-                    state_update = data.get("state", {})
-                    
-                    # Optimization: Round floats before processing
-                    state_update = round_floats(state_update) # type: ignore
-                    
-                    # Optimization: Removed high-frequency logging
-                    game_logger.info(f"[ROOM:{current_room.room_id}] [PLAYER_STATE] Player:{player_id} Pos:({state_update.get('x')}, {state_update.get('y')})")
-                    
-                    current_room.update_player_state(player_id, state_update)
-                    
-                    # Broadcast to other players
-                    await current_room.broadcast({
-                        "type": "player_state_update",
-                        "player_id": player_id,
-                        "state": state_update
-                    }, exclude=player_id)
-            
-            elif message_type == "game_action":
-                # Handle game actions (shooting, damage, etc.)
-                if current_room:
-                    action = data.get("action")
-                    action_data = data.get("data", {})
-                    # Special-case: assist requests — allow host to adjust partner position
-                    if action == 'assist' and player_id == current_room.host_id:
-                        target_id = action_data.get('target_player_id')
-                        new_x = action_data.get('x')
-                        new_y = action_data.get('y')
-                        if target_id and target_id in current_room.players:
-                            # Update authoritative server-side player position
-                            p = current_room.players[target_id]
-                            if isinstance(new_x, (int, float)):
-                                p.x = float(new_x)
-                            if isinstance(new_y, (int, float)):
-                                p.y = float(new_y)
-                            # Broadcast updated player position to all clients
-                            await current_room.broadcast({
-                                "type": "player_state_update",
-                                "player_id": target_id,
-                                "state": {"x": p.x, "y": p.y}
-                            })
-                    # Broadcast the game action to other clients for visual/UX feedback
-                    await current_room.broadcast({
-                        "type": "game_action",
-                        "player_id": player_id,
-                        "action": action,
-                        "data": action_data
-                    }, exclude=player_id)
-            
-            elif message_type == "collect_item":
-                # Handle item collection (coins, powerups)
-                if current_room and player_id:
-                    item_type = data.get("item_type", "coin")
-                    item_id = data.get("item_id", "")
-                    
-                    # Optimization: Removed logging
-                    game_logger.info(f"[ROOM:{current_room.room_id}] [ITEM_COLLECT] Player:{player_id} Type:{item_type} ID:{item_id}")
-                    
-                    # Check if item was already collected
-                    if current_room.mark_item_collected(item_type, item_id, player_id):
-                        # First to collect - update server's player totals where applicable
-                        player_state = current_room.players.get(player_id)
-                        if player_state:
-                            if item_type == 'coin':
-                                # Increment player's coins and award score
-                                player_state.coins = (player_state.coins or 0) + 1
-                                player_state.score = (player_state.score or 0) + 10
-                            # For powerups we currently do not change coins but could adjust score/effects server-side
-                        player_coins = player_state.coins if player_state else None
-                        player_score = player_state.score if player_state else None
-                        await current_room.broadcast({
-                            "type": "item_collected",
-                            "player_id": player_id,
-                            "item_type": item_type,
-                            "item_id": item_id,
-                            "player_coins": player_coins,
-                            "player_score": player_score
-                        })
-                    else:
-                        # Item already collected by other player
-                        await websocket.send_json({
-                            "type": "item_already_collected",
-                            "item_id": item_id
-                        })
-            
-            elif message_type == "enemy_state":
-                # Handle enemy state update (host sends, all receive)
-                if current_room and player_id:
-                    enemy_id = data.get("enemy_id", "")
-                    state_update = data.get("state", {})
-                    
-                    # Optimization: Round floats before processing
-                    state_update = round_floats(state_update) # type: ignore
-                    
-                    # Optimization: Removed high-frequency logging
-                    game_logger.info(f"[ROOM:{current_room.room_id}] [ENEMY_STATE] Enemy:{enemy_id} Pos:({state_update.get('x')}, {state_update.get('y')})")
-
-                    # Update enemy state on server
-                    current_room.update_enemy_state(enemy_id, state_update)
-                    
-                    # Broadcast to other players
-                    await current_room.broadcast({
-                        "type": "enemy_state_update",
-                        "enemy_id": enemy_id,
-                        "state": state_update
-                    }, exclude=player_id)
-            
-            elif message_type == "enemy_spawn":
-                # Host spawns an enemy, register and broadcast
-                if current_room and player_id == current_room.host_id:
-                    enemy_data = data.get("enemy", {})
-                    # Optimization: Removed logging
-                    game_logger.info(f"[ROOM:{current_room.room_id}] [ENEMY_SPAWN] ID:{enemy_data.get('enemy_id')} Pos:({enemy_data.get('x')}, {enemy_data.get('y')}) Type:{enemy_data.get('enemy_type')}")
-                    
-                    enemy_id = current_room.spawn_enemy(enemy_data)
-                    
-                    # Broadcast spawn to all players (including host for confirmation)
-                    await current_room.broadcast({
-                        "type": "enemy_spawned",
-                        "enemy": current_room.enemies.get(enemy_id, enemy_data)
-                    })
-            
-            elif message_type == "enemy_killed":
-                # Handle enemy death (first killer wins)
-                if current_room and player_id:
-                    enemy_id = data.get("enemy_id", "")
-                    print(f"[ROOM {current_room.room_id}] enemy_killed reported by {player_id}: {enemy_id}")
-                    
-                    # Check if enemy is still alive
-                    if current_room.kill_enemy(enemy_id, player_id):
-                        # First to kill - broadcast to all
-                        await current_room.broadcast({
-                            "type": "enemy_killed",
-                            "enemy_id": enemy_id,
-                            "killed_by": player_id
-                        })
-
-                        # Server (authoritative) will spawn coins for the killed enemy
-                        enemy_info = current_room.enemies.get(enemy_id, {})
-                        try:
-                            x = float(enemy_info.get('x', 0))
-                            y = float(enemy_info.get('y', 0))
-                        except Exception:
-                            x = 0.0
-                            y = 0.0
-
-                        # coin_reward may be provided by host or default
-                        coin_count = int(enemy_info.get('coin_reward', 0) or 0)
-
-                        # If there are coins to spawn, create deterministic spread and broadcast each coin
-                        for i in range(coin_count):
-                            # Deterministic offsets so all clients compute same motion later
-                            offset_x = ((int(x) * 7 + i * 13) % 61) - 30
-                            offset_y = ((int(y) * 11 + i * 17) % 21) - 20
-                            coin_x = x + offset_x
-                            coin_y = y + offset_y
-
-                            # Deterministic velocities so clients animate drops similarly
-                            vel_x = ((int(x) * 3 + i * 19) % 201) - 100
-                            vel_y = -200 + ((int(y) * 5 + i * 23) % 101)
-
-                            coin_data = {
-                                'x': coin_x,
-                                'y': coin_y,
-                                'value': 1,
-                                'velocity_x': vel_x,
-                                'velocity_y': vel_y
-                            }
-                            # Use deterministic coin_id so host-local coin IDs (coin_drop_...) match
-                            # the server-assigned id. This prevents mismatch when host spawns
-                            # coins locally and the server also registers them.
-                            coin_data['coin_id'] = f"coin_drop_{int(x)}_{int(y)}_{i}"
-                            coin_id = current_room.spawn_coin(coin_data)
-                            # Broadcast spawn to all players
-                            await current_room.broadcast({
-                                "type": "coin_spawned",
-                                "coin": current_room.coins.get(coin_id, coin_data)
-                            })
-                    else:
-                        # Enemy already dead
-                        await websocket.send_json({
-                            "type": "enemy_already_dead",
-                            "enemy_id": enemy_id
-                        })
-                        
-                        # Force state update to ensure client removes the ghost enemy
-                        await websocket.send_json({
-                            "type": "enemy_state_update",
-                            "enemy_id": enemy_id,
-                            "state": {"is_alive": False, "state": "dead"}
-                        })
-            
-            elif message_type == "coin_spawn":
-                # Host spawns a coin, register and broadcast
-                if current_room and player_id == current_room.host_id:
-                    coin_data = data.get("coin", {})
-                    # Optimization: Removed logging
-                    game_logger.info(f"[ROOM:{current_room.room_id}] [COIN_SPAWN] ID:{coin_data.get('coin_id')} Pos:({coin_data.get('x')}, {coin_data.get('y')})")
-                    
-                    coin_id = current_room.spawn_coin(coin_data)
-                    
-                    # Broadcast spawn to all players
-                    await current_room.broadcast({
-                        "type": "coin_spawned",
-                        "coin": current_room.coins.get(coin_id, coin_data)
-                    })
-
-            elif message_type == "powerup_spawn":
-                # Host spawns a powerup, register and broadcast
-                if current_room and player_id == current_room.host_id:
-                    powerup_data = data.get("powerup", {})
-                    # Optimization: Removed logging
-                    game_logger.info(f"[ROOM:{current_room.room_id}] [POWERUP_SPAWN] ID:{powerup_data.get('powerup_id')} Pos:({powerup_data.get('x')}, {powerup_data.get('y')}) Type:{powerup_data.get('type')}")
-                    
-                    powerup_id = current_room.spawn_powerup(powerup_data)
-                    
-                    # Broadcast spawn to all players
-                    await current_room.broadcast({
-                        "type": "powerup_spawned",
-                        "powerup": current_room.powerups.get(powerup_id, powerup_data)
-                    })
-            
-            elif message_type == "sync_entities":
-                # Host sends full entity state periodically for sync verification
-                if current_room and player_id == current_room.host_id:
-                    enemies = data.get("enemies", [])
-                    coins = data.get("coins", [])
-                    
-                    # Optimization: Round floats in sync data
-                    enemies = round_floats(enemies) # type: ignore
-                    coins = round_floats(coins) # type: ignore
-                    
-                    print(f"[ROOM {current_room.room_id}] sync_entities from host (enemies: {len(enemies)}, coins: {len(coins)})")
-                    
-                    # Update server state from host
-                    for enemy in enemies:
-                        eid = enemy.get("enemy_id")
-                        if eid:
-                            # Fix: Prevent resurrection of dead enemies due to race conditions
-                            # If server has already marked enemy as dead (via enemy_killed event),
-                            # ignore stale sync data from host that might still show it as alive.
-                            if eid in current_room.enemies and not current_room.enemies[eid].get('is_alive', True):
-                                continue
-                                
-                            current_room.enemies[eid] = enemy
-                    
-                    for coin in coins:
-                        cid = coin.get("coin_id")
-                        if cid and cid not in current_room.collected_coins:
-                            current_room.coins[cid] = coin
-                    
-                    # Broadcast to non-host players for sync
-                    await current_room.broadcast({
-                        "type": "entities_sync",
-                        "enemies": current_room.get_sync_enemies(),
-                        "coins": current_room.get_uncollected_coins(),
-                        "sequence_id": current_room.get_next_sequence()
-                    }, exclude=player_id)
+            # Room owned by another worker process: relay this whole connection to it
+            if conn.room is None and message_type in ("join_room", "reconnect"):
+                target_room_id = data.get("room_id") or room_id
+                owner = await room_manager.locate(target_room_id)
+                if owner and await proxy_to_owner(websocket, owner, target_room_id, message):
+                    return
             
-            elif message_type == "reconnect":
-                # Handle reconnection attempt
-                reconnect_token = data.get("token", "")
-                reconnect_room_id = data.get("room_id", "")
-                reconnect_player_id = data.get("player_id", "")
-                
-                room = room_manager.get_room(reconnect_room_id)
-                if room and await room.reconnect_player(reconnect_player_id, websocket, reconnect_token):
-                    current_room = room
-                    player_id = reconnect_player_id
-                    
-                    # Send full game state to reconnected player
-                    await websocket.send_json({
-                        "type": "reconnected",
-                        "room_id": room.room_id,
-                        "player_id": player_id,
-                        "player_number": room.get_player_number(player_id),
-                        "game_state": room.get_game_state()
-                    })
-                else:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Reconnection failed. Token invalid or session expired."
-                    })
-            
-            elif message_type == "start_game":
-                # Host starts the game
-                if current_room and player_id == current_room.host_id:
-                    # Check if all players are ready
-                    all_ready = all(p.is_ready for p in current_room.players.values())
-                    
-                    if all_ready and current_room.player_count >= 2:
-                        import time
-                        current_room.game_started = True
-                        # Schedule game to start 500ms in the future
-                        # This gives all clients time to receive and prepare
-                        current_room.game_start_timestamp = time.time() * 1000 + 500
-                        
-                        game_state = current_room.get_game_state()
-                        # Broadcast to ALL clients in the same tick
-                        await current_room.broadcast({
-                            "type": "game_starting",
-                            "game_state": game_state,
-                            "sequence_id": current_room.get_next_sequence()
-                        })
-                    else:
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Cannot start game. All players must be ready and at least 2 players needed."
-                        })
-            
-            elif message_type == "chat":
-                # Chat message (works both in lobby and during game)
-                if current_room and player_id:
-                    player = current_room.players.get(player_id)
-                    chat_msg = {
-                        "type": "chat",
-                        "player_id": player_id,
-                        "player_name": player.player_name if player else "Unknown",
-                        "message": data.get("message", ""),
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    # Store in chat history if game is in progress
-                    if current_room.game_started:
-                        current_room.chat_history.append(chat_msg)
-                    await current_room.broadcast(chat_msg)
-            
-            elif message_type == "leave_room":
-                # Leave the room
-                if current_room and player_id:
-                    await room_manager.leave_room(current_room.room_id, player_id)
-                    await websocket.send_json({
-                        "type": "room_left"
-                    })
-                    current_room = None
-            
-            elif message_type == "ping":
-                # Keep-alive ping
-                await websocket.send_json({"type": "pong"})
-            
-            elif message_type == "time_sync":
-                # NTP-style time synchronization
-                # Client sends their timestamp, server responds with server time
-                import time
-                client_time = data.get("client_time", 0)
-                server_time = time.time() * 1000  # Server time in ms
-                await websocket.send_json({
-                    "type": "time_sync_response",
-                    "client_time": client_time,  # Echo back for RTT calculation
-                    "server_time": server_time,
-                    "sequence_id": current_room.get_next_sequence() if current_room else 0
-                })
+            await dispatcher.dispatch(conn, data)
     
     except WebSocketDisconnect:
         # Clean up on disconnect - allow reconnection if game is in progress
-        if current_room and player_id:
-            allow_reconnect = current_room.game_started
-            await current_room.remove_player(player_id, allow_reconnect=allow_reconnect)
+        if conn.room and conn.player_id:
+            allow_reconnect = conn.room.game_started
+            await conn.room.remove_player(conn.player_id, allow_reconnect=allow_reconnect)
             
             # Send reconnection token if allowed
-            if allow_reconnect and player_id in current_room.reconnect_tokens:
+            if allow_reconnect and conn.player_id in conn.room.reconnect_tokens:
                 # Note: Can't send to disconnected player, but token is stored for when they reconnect
                 pass
     
+    except RateLimitExceeded as e:
+        print(f"WebSocket closed, rate limit exceeded: {e}")
+        await websocket.close(code=1008)  # Policy violation
+        if conn.room and conn.player_id:
+            allow_reconnect = conn.room.game_started
+            await conn.room.remove_player(conn.player_id, allow_reconnect=allow_reconnect)
+    
     except Exception as e:
         print(f"WebSocket error: {e}")
-        if current_room and player_id:
-            allow_reconnect = current_room.game_started
-            await current_room.remove_player(player_id, allow_reconnect=allow_reconnect)
+        if conn.room and conn.player_id:
+            allow_reconnect = conn.room.game_started
+            await conn.room.remove_player(conn.player_id, allow_reconnect=allow_reconnect)
+    
+    finally:
+        conn.close()
 
 
 if __name__ == "__main__":
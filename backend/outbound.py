@@ -0,0 +1,124 @@
+"""
+Per-connection outbound queues for room broadcasts
+
+Each connected player gets a ConnectionSender: a bounded queue drained by its
+own writer task, so a slow client only delays its own messages and a
+broadcast never waits on a socket.
+
+Overflow policies (per message type):
+- drop_oldest: state updates - when the queue is full the oldest droppable
+  frame is discarded, a newer one will follow anyway
+- never_drop: events (enemy_killed, item_collected, ...) - always queued;
+  a client that falls HARD_LIMIT_FACTOR times past the bound is disconnected
+"""
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+DROP_OLDEST = "drop_oldest"
+NEVER_DROP = "never_drop"
+
+DEFAULT_SEND_QUEUE_SIZE = 256
+HARD_LIMIT_FACTOR = 4
+
+# Message types that may be discarded when a client falls behind - everything else is never dropped
+DEFAULT_OVERFLOW_POLICIES: Dict[str, str] = {
+    "player_state_update": DROP_OLDEST,
+    "enemy_state_update": DROP_OLDEST,
+    "state_snapshot": DROP_OLDEST,
+    "entities_sync": DROP_OLDEST,
+    "entities_delta": DROP_OLDEST,
+}
+
+Payload = Union[str, bytes]
+
+
+class ConnectionSender:
+    """Bounded outbound queue and writer task for one WebSocket"""
+
+    def __init__(self, websocket: WebSocket, on_error: Callable[[], Awaitable[None]],
+                 max_queue: int = DEFAULT_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.on_error = on_error
+        self.max_queue = max_queue
+        self.hard_limit = max_queue * HARD_LIMIT_FACTOR
+        self.queue: Deque[Tuple[Payload, bool]] = deque()  # (payload, droppable)
+        self.dropped = 0  # Frames discarded by the drop_oldest policy
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self._error_task: Optional[asyncio.Task] = None  # on_error() after the hard limit was hit
+
+    def start(self):
+        """Start the writer task (must be called from the event loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def send(self, payload: Payload, droppable: bool = False) -> bool:
+        """Queue a payload without waiting, returns False if the connection is closed"""
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue and not self._evict_droppable():
+            if droppable:
+                # Queue is full of events - this state update is the one to go
+                self.dropped += 1
+                return True
+            if len(self.queue) >= self.hard_limit:
+                # Client is hopelessly behind on events it must not miss
+                self.closed = True
+                self._error_task = asyncio.create_task(self.on_error())
+                return False
+
+        self.queue.append((payload, droppable))
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def _evict_droppable(self) -> bool:
+        """Discard the oldest droppable frame, returns False if there is none"""
+        for index, (_, droppable) in enumerate(self.queue):
+            if droppable:
+                del self.queue[index]
+                self.dropped += 1
+                return True
+        return False
+
+    async def drain(self):
+        """Wait until every queued payload has been written"""
+        if not self.closed:
+            await self._idle.wait()
+
+    def close(self):
+        """Stop the writer task and discard anything still queued"""
+        self.closed = True
+        self.queue.clear()
+        self._idle.set()
+        if self._task and self._task is not asyncio.current_task() and not self._task.done():
+            self._task.cancel()
+
+    async def _run(self):
+        """Write queued payloads in order until closed"""
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._idle.set()
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                payload, _ = self.queue.popleft()
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if not self.closed:
+                self.close()
+                await self.on_error()
@@ -0,0 +1,244 @@
+"""
+Binary Wire Protocol for Online Multiplayer
+
+Clients can negotiate encoding: "binary" at create_room/join_room/reconnect.
+High-frequency state messages are then sent as packed structs instead of JSON
+text; every other message type stays JSON (sent as a text frame).
+
+Frame layout (little-endian):
+- u8 message code
+- body depending on the code:
+  - single state (player_state, enemy_state, *_update): one state record
+  - state_snapshot: u32 sequence_id, f64 server_timestamp,
+    u16 player count + records, u16 enemy count + records
+
+State record:
+- u8 id length + UTF-8 id (empty for player_state sent by the client itself)
+- u16 numeric field mask, u8 bool field mask, u8 bool values
+- one value per numeric field present in the mask, in NUMERIC_FIELDS order
+
+A state containing anything the fixed layout can't carry (strings, unknown
+keys, out-of-range numbers) is not encoded and falls back to JSON.
+"""
+
+import math
+import struct
+from typing import Dict, Optional, Tuple
+
+# Message codes
+MESSAGE_CODES = {
+    "player_state": 1,           # client -> server
+    "enemy_state": 2,            # client -> server
+    "player_state_update": 3,    # server -> client
+    "enemy_state_update": 4,     # server -> client
+    "state_snapshot": 5,         # server -> client (tick mode)
+}
+MESSAGE_TYPES = {code: name for name, code in MESSAGE_CODES.items()}
+
+# Which key holds the entity ID for single-state messages
+ID_FIELDS = {
+    "player_state": None,
+    "enemy_state": "enemy_id",
+    "player_state_update": "player_id",
+    "enemy_state_update": "enemy_id",
+}
+
+# Numeric fields in wire order: (name, struct format)
+# 'f' = float32, 'i' = int32, 'B' = index into ENEMY_STATES
+NUMERIC_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("x", "f"),
+    ("y", "f"),
+    ("velocity_x", "f"),
+    ("velocity_y", "f"),
+    ("health", "i"),
+    ("max_health", "i"),
+    ("lives", "i"),
+    ("score", "i"),
+    ("coins", "i"),
+    ("checkpoint", "i"),
+    ("state", "B"),
+)
+BOOL_FIELDS: Tuple[str, ...] = ("facing_right", "is_alive", "is_jumping", "is_shooting", "is_ready")
+ENEMY_STATES: Tuple[str, ...] = ("idle", "moving", "attacking", "dead")
+
+NUMERIC_INDEX = {name: i for i, (name, _) in enumerate(NUMERIC_FIELDS)}
+BOOL_INDEX = {name: i for i, name in enumerate(BOOL_FIELDS)}
+
+INT32_MIN, INT32_MAX = -(2 ** 31), 2 ** 31 - 1
+FLOAT_DECIMALS = 2  # Matches quantize.FLOAT_DECIMALS
+
+_HEADER = struct.Struct("<B")
+_MASKS = struct.Struct("<HBB")
+_COUNT = struct.Struct("<H")
+_SNAPSHOT = struct.Struct("<Id")
+
+
+class ProtocolError(ValueError):
+    """Raised when a binary frame can't be decoded"""
+
+
+def _pack_value(fmt: str, value) -> Optional[bytes]:
+    """Pack a single numeric value, or None if it doesn't fit the field"""
+    if isinstance(value, bool):
+        return None
+    if fmt == "f":
+        if not isinstance(value, (int, float)):
+            return None
+        try:
+            if not math.isfinite(value):
+                return None
+            return struct.pack("<f", value)
+        except OverflowError:
+            return None  # Beyond float32 range
+    if fmt == "i":
+        if not isinstance(value, int) or not INT32_MIN <= value <= INT32_MAX:
+            return None
+        return struct.pack("<i", value)
+    if fmt == "B":
+        if value not in ENEMY_STATES:
+            return None
+        return struct.pack("<B", ENEMY_STATES.index(value))
+    return None
+
+
+def pack_record(entity_id: str, state: dict) -> Optional[bytes]:
+    """Pack one (id, state) record, or None if the state can't use the fixed layout"""
+    raw_id = entity_id.encode("utf-8")
+    if len(raw_id) > 255:
+        return None
+
+    numeric_mask = bool_mask = bool_values = 0
+    values: Dict[int, bytes] = {}
+    for key, value in state.items():
+        if key in NUMERIC_INDEX:
+            index = NUMERIC_INDEX[key]
+            packed = _pack_value(NUMERIC_FIELDS[index][1], value)
+            if packed is None:
+                return None
+            numeric_mask |= 1 << index
+            values[index] = packed
+        elif key in BOOL_INDEX and isinstance(value, bool):
+            bit = 1 << BOOL_INDEX[key]
+            bool_mask |= bit
+            if value:
+                bool_values |= bit
+        else:
+            return None
+
+    parts = [bytes((len(raw_id),)), raw_id, _MASKS.pack(numeric_mask, bool_mask, bool_values)]
+    parts.extend(values[i] for i in sorted(values))
+    return b"".join(parts)
+
+
+def unpack_record(payload: bytes, offset: int) -> Tuple[str, dict, int]:
+    """Unpack one record starting at offset, returns (id, state, new offset)"""
+    id_len = payload[offset]
+    offset += 1
+    entity_id = payload[offset:offset + id_len].decode("utf-8")
+    offset += id_len
+    numeric_mask, bool_mask, bool_values = _MASKS.unpack_from(payload, offset)
+    offset += _MASKS.size
+
+    state: dict = {}
+    for index, (name, fmt) in enumerate(NUMERIC_FIELDS):
+        if numeric_mask & (1 << index):
+            (value,) = struct.unpack_from("<" + fmt, payload, offset)
+            offset += struct.calcsize("<" + fmt)
+            if fmt == "f":
+                value = round(value, FLOAT_DECIMALS)
+            elif fmt == "B":
+                if value >= len(ENEMY_STATES):
+                    raise ProtocolError(f"Unknown enemy state index {value}")
+                value = ENEMY_STATES[value]
+            state[name] = value
+    for index, name in enumerate(BOOL_FIELDS):
+        bit = 1 << index
+        if bool_mask & bit:
+            state[name] = bool(bool_values & bit)
+    return entity_id, state, offset
+
+
+def _pack_records(records: Dict[str, dict]) -> Optional[bytes]:
+    if len(records) > 0xFFFF:
+        return None
+    parts = [_COUNT.pack(len(records))]
+    for entity_id, state in records.items():
+        packed = pack_record(entity_id, state)
+        if packed is None:
+            return None
+        parts.append(packed)
+    return b"".join(parts)
+
+
+def _unpack_records(payload: bytes, offset: int) -> Tuple[Dict[str, dict], int]:
+    (count,) = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+    records: Dict[str, dict] = {}
+    for _ in range(count):
+        entity_id, state, offset = unpack_record(payload, offset)
+        records[entity_id] = state
+    return records, offset
+
+
+def encode_message(message: dict) -> Optional[bytes]:
+    """
+    Encode a message in the binary layout
+
+    Returns None for message types (or contents) without a binary layout;
+    the caller should send those as JSON instead.
+    """
+    message_type = message.get("type")
+    code = MESSAGE_CODES.get(message_type)
+    if code is None:
+        return None
+
+    if message_type == "state_snapshot":
+        sequence_id = message.get("sequence_id", 0)
+        if not isinstance(sequence_id, int) or not 0 <= sequence_id <= 0xFFFFFFFF:
+            return None
+        players = _pack_records(message.get("players", {}))
+        enemies = _pack_records(message.get("enemies", {}))
+        if players is None or enemies is None:
+            return None
+        header = _SNAPSHOT.pack(sequence_id, float(message.get("server_timestamp", 0)))
+        return _HEADER.pack(code) + header + players + enemies
+
+    id_field = ID_FIELDS[message_type]
+    entity_id = message.get(id_field, "") if id_field else ""
+    state = message.get("state", {})
+    if not isinstance(entity_id, str) or not isinstance(state, dict):
+        return None
+    record = pack_record(entity_id, state)
+    if record is None:
+        return None
+    return _HEADER.pack(code) + record
+
+
+def decode_message(payload: bytes) -> dict:
+    """Decode a binary frame back into the equivalent JSON message dict"""
+    try:
+        (code,) = _HEADER.unpack_from(payload, 0)
+        message_type = MESSAGE_TYPES.get(code)
+        if message_type is None:
+            raise ProtocolError(f"Unknown message code {code}")
+
+        if message_type == "state_snapshot":
+            sequence_id, server_timestamp = _SNAPSHOT.unpack_from(payload, _HEADER.size)
+            players, offset = _unpack_records(payload, _HEADER.size + _SNAPSHOT.size)
+            enemies, offset = _unpack_records(payload, offset)
+            return {
+                "type": message_type,
+                "sequence_id": sequence_id,
+                "server_timestamp": server_timestamp,
+                "players": players,
+                "enemies": enemies
+            }
+
+        entity_id, state, _ = unpack_record(payload, _HEADER.size)
+        message = {"type": message_type, "state": state}
+        id_field = ID_FIELDS[message_type]
+        if id_field:
+            message[id_field] = entity_id
+        return message
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ProtocolError(f"Malformed binary frame: {e}") from e
@@ -0,0 +1,134 @@
+"""
+Float quantization for inbound entity state
+
+Positions and velocities are rounded to FLOAT_DECIMALS places as soon as a
+message arrives, so the room stores and relays the same short numbers it
+would have sent anyway. Only the fields in FLOAT_FIELDS are touched (every
+other value is passed through as sent), the dicts are updated in place and
+each inbound message is quantized exactly once, in its handler.
+
+Entity lists (sync_entities) are quantized column by column; with NumPy
+installed, lists of at least NUMPY_MIN_BATCH entities are rounded as arrays.
+
+Rooms created with fixed_point store the same fields as integers instead:
+centipixels (FIXED_POINT_SCALE per pixel), positions relative to a room
+origin. FixedPoint converts at the boundary - pixel floats coming in from
+clients, back to pixel floats going out to clients that didn't ask for
+fixed-point positions.
+"""
+
+from typing import List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency
+    np = None
+
+FLOAT_DECIMALS = 2
+
+# Fields that carry floats in player/enemy/coin/powerup state
+FLOAT_FIELDS: Sequence[str] = ("x", "y", "velocity_x", "velocity_y")
+
+FIXED_POINT_SCALE = 100  # Fixed-point units per pixel (centipixels)
+
+# Below this many entities the per-call NumPy overhead outweighs the vector speedup
+NUMPY_MIN_BATCH = 64
+
+
+def quantize_state(state: dict, decimals: int = FLOAT_DECIMALS) -> dict:
+    """Round the float fields of one state dict in place, returns it"""
+    for field in FLOAT_FIELDS:
+        value = state.get(field)
+        # type() check: ints (and bools) are left untouched
+        if type(value) is float:
+            state[field] = round(value, decimals)
+    return state
+
+
+def quantize_entities(entities: List[dict], decimals: int = FLOAT_DECIMALS) -> List[dict]:
+    """Round the float fields of every entity dict in place, returns the list"""
+    if np is not None and len(entities) >= NUMPY_MIN_BATCH:
+        return _quantize_entities_numpy(entities, decimals)
+    for entity in entities:
+        if isinstance(entity, dict):
+            quantize_state(entity, decimals)
+    return entities
+
+
+def _quantize_entities_numpy(entities: List[dict], decimals: int) -> List[dict]:
+    for field in FLOAT_FIELDS:
+        # Gather the float values of this column, round them as one array, scatter back
+        rows = [entity for entity in entities
+                if isinstance(entity, dict) and type(entity.get(field)) is float]
+        if not rows:
+            continue
+        rounded = np.round(np.fromiter((entity[field] for entity in rows), dtype=np.float64, count=len(rows)),
+                           decimals).tolist()
+        for entity, value in zip(rows, rounded):
+            entity[field] = value
+    return entities
+
+
+class FixedPoint:
+    """Conversion between pixel floats and fixed-point ints for one room"""
+    __slots__ = ("origin_x", "origin_y", "scale", "_offsets")
+
+    def __init__(self, origin_x: float = 0.0, origin_y: float = 0.0, scale: int = FIXED_POINT_SCALE):
+        self.origin_x = float(origin_x)
+        self.origin_y = float(origin_y)
+        self.scale = scale
+        # Subtracted before scaling - velocities have no origin
+        self._offsets = {"x": self.origin_x, "y": self.origin_y, "velocity_x": 0.0, "velocity_y": 0.0}
+
+    def encode_state(self, state: dict) -> dict:
+        """Convert the pixel fields of a state dict to fixed point in place, returns it"""
+        for field, offset in self._offsets.items():
+            value = state.get(field)
+            if type(value) is float or type(value) is int:
+                state[field] = round((value - offset) * self.scale)
+        return state
+
+    def encode_entities(self, entities: List[dict]) -> List[dict]:
+        """encode_state for every entity dict in a list (in place)"""
+        for entity in entities:
+            if isinstance(entity, dict):
+                self.encode_state(entity)
+        return entities
+
+    def coerce_state(self, state: dict) -> dict:
+        """In place: make sure values sent in fixed point by a client are ints"""
+        for field in FLOAT_FIELDS:
+            if type(state.get(field)) is float:
+                state[field] = round(state[field])
+        return state
+
+    def decode_value(self, field: str, value) -> float:
+        return round(self._offsets[field] + value / self.scale, FLOAT_DECIMALS)
+
+    def to_pixels(self, value):
+        """Copy of a message with every fixed-point field converted back to pixel floats"""
+        if isinstance(value, dict):
+            decoded = {}
+            for key, item in value.items():
+                if key in self._offsets and (type(item) is int or type(item) is float):
+                    decoded[key] = self.decode_value(key, item)
+                elif isinstance(item, (dict, list)):
+                    decoded[key] = self.to_pixels(item)
+                else:
+                    decoded[key] = item
+            return decoded
+        if isinstance(value, list):
+            return [self.to_pixels(item) for item in value]
+        return value
+
+    def describe(self) -> dict:
+        """What a fixed-point client needs to convert positions itself"""
+        return {"origin": [self.origin_x, self.origin_y], "scale": self.scale}
+
+    @classmethod
+    def from_origin(cls, origin) -> "FixedPoint":
+        """FixedPoint for an optional client-supplied [x, y] origin (anything else means 0, 0)"""
+        if (isinstance(origin, (list, tuple)) and len(origin) == 2
+                and all(type(v) in (int, float) for v in origin)):
+            return cls(origin[0], origin[1])
+        return cls()
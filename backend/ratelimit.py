@@ -0,0 +1,214 @@
+"""
+Per-connection rate limiting for inbound WebSocket messages
+
+Each connection gets a token bucket (rate per second, burst) per message
+type listed in RATE_LIMITS. A message within budget is handled right away.
+Over budget:
+
+- state updates (COALESCE) are held back and merged, newest values win,
+  then handled as soon as the bucket has a token again - a flooding client
+  costs the room one relay per token instead of one per frame, and the
+  last state it sent is never lost
+- everything else that is limited (DROP) is discarded
+
+Messages merged away or dropped count as shed in `stats` (exported at
+/api/metrics/ratelimit). With a disconnect threshold (RATE_LIMIT_DISCONNECT),
+a connection shedding more than that many messages within SHED_WINDOW
+seconds raises RateLimitExceeded and is closed by the endpoint.
+
+The limits leave plenty of room over what the game client sends (player
+state at 60 Hz, enemy state at 20 Hz per enemy), only misbehaving clients
+hit them. Message types without an entry are never limited.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+# Over-budget policies
+COALESCE = "coalesce"
+DROP = "drop"
+
+# Outcomes counted per message type
+COALESCED = "coalesced"  # Merged into a newer update, never handled on its own
+DROPPED = "dropped"
+DEFERRED = "deferred"  # Held back, handled once a token was available
+
+SHED_WINDOW = 10.0  # Seconds over which shed messages count towards a disconnect
+
+
+class Limit(NamedTuple):
+    rate: float  # Messages per second
+    burst: float  # Bucket size
+    policy: str = COALESCE
+    key: Optional[str] = None  # Field telling coalesced updates for different entities apart
+
+
+RATE_LIMITS: Dict[str, Limit] = {
+    "player_state": Limit(90, 30),
+    "enemy_state": Limit(1200, 400, key="enemy_id"),
+    "sync_entities": Limit(5, 5),
+    "chat": Limit(2, 5, DROP),
+}
+
+
+class RateLimitExceeded(Exception):
+    """A connection shed more messages than the disconnect threshold allows"""
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until the next token"""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RateLimitStats:
+    """Shed/deferred counts per message type across all connections"""
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.disconnects = 0
+
+    def record(self, message_type: str, outcome: str):
+        counts = self.counts.get(message_type)
+        if counts is None:
+            counts = self.counts[message_type] = {COALESCED: 0, DROPPED: 0, DEFERRED: 0}
+        counts[outcome] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "types": {message_type: dict(counts) for message_type, counts in sorted(self.counts.items())},
+            "disconnects": self.disconnects
+        }
+
+
+def coalesce(previous: dict, latest: dict) -> dict:
+    """Merge two updates for the same entity, newest values win (partial state dicts are merged)"""
+    merged = {**previous, **latest}
+    if isinstance(previous.get("state"), dict) and isinstance(latest.get("state"), dict):
+        merged["state"] = {**previous["state"], **latest["state"]}
+    return merged
+
+
+Handler = Callable[[Any, dict], Awaitable[None]]
+
+
+class ConnectionLimits:
+    """Token buckets and held-back updates of one connection"""
+
+    def __init__(self, limits: Dict[str, Limit], stats: RateLimitStats,
+                 disconnect_threshold: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.limits = limits
+        self.stats = stats
+        self.disconnect_threshold = disconnect_threshold
+        self.clock = clock
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.pending: Dict[str, Dict[Any, dict]] = {}  # message type -> coalesce key -> merged message
+        self.tasks: Dict[str, asyncio.Task] = {}  # message type -> flush task
+        self.window_start = clock()
+        self.shed_in_window = 0
+
+    async def admit(self, conn, message_type: str, data: dict, handler: Handler):
+        """Handle a message now, hold it back or drop it"""
+        limit = self.limits.get(message_type)
+        if limit is None:
+            await handler(conn, data)
+            return
+
+        now = self.clock()
+        bucket = self.buckets.get(message_type)
+        if bucket is None:
+            bucket = self.buckets[message_type] = TokenBucket(limit.rate, limit.burst, now)
+        # Anything held back goes first, so a newer update never overtakes it
+        if not self.pending.get(message_type) and bucket.take(now):
+            await handler(conn, data)
+            return
+
+        if limit.policy == DROP:
+            self.stats.record(message_type, DROPPED)
+            self._shed(now)
+            return
+
+        pending = self.pending.setdefault(message_type, {})
+        key = data.get(limit.key) if limit.key else None
+        previous = pending.get(key)
+        pending[key] = data if previous is None else coalesce(previous, data)
+        if message_type not in self.tasks:
+            self.tasks[message_type] = asyncio.create_task(self._flush(conn, message_type, handler))
+        if previous is not None:
+            self.stats.record(message_type, COALESCED)
+            self._shed(now)
+
+    async def _flush(self, conn, message_type: str, handler: Handler):
+        """Handle the held-back updates of one type as tokens come in"""
+        bucket = self.buckets[message_type]
+        pending = self.pending[message_type]
+        try:
+            while pending:
+                await asyncio.sleep(bucket.wait_time(self.clock()))
+                if not bucket.take(self.clock()):
+                    continue
+                data = pending.pop(next(iter(pending)))
+                self.stats.record(message_type, DEFERRED)
+                try:
+                    await handler(conn, data)
+                except Exception as e:
+                    # Inline, the websocket endpoint reports handler errors; nothing awaits this task
+                    print(f"Deferred {message_type} handler error: {e}")
+                    continue
+                if conn.room is not None:
+                    conn.room.dirty = True
+        finally:
+            self.tasks.pop(message_type, None)
+
+    def _shed(self, now: float):
+        if now - self.window_start >= SHED_WINDOW:
+            self.window_start, self.shed_in_window = now, 0
+        self.shed_in_window += 1
+        if self.disconnect_threshold and self.shed_in_window > self.disconnect_threshold:
+            self.stats.disconnects += 1
+            raise RateLimitExceeded(f"{self.shed_in_window} messages shed within {SHED_WINDOW:.0f}s")
+
+    def close(self):
+        """Cancel pending flushes (the connection is gone)"""
+        for task in list(self.tasks.values()):
+            task.cancel()
+        self.tasks.clear()
+        self.pending.clear()
+
+
+def rate_limit_middleware(stats: RateLimitStats, limits: Dict[str, Limit] = RATE_LIMITS,
+                          disconnect_threshold: Optional[int] = None):
+    """Dispatcher middleware applying the limits per connection (state kept in conn.limits)"""
+    async def middleware(conn, message_type: str, data: dict, handler: Handler):
+        if conn.limits is None:
+            conn.limits = ConnectionLimits(limits, stats, disconnect_threshold)
+        await conn.limits.admit(conn, message_type, data, handler)
+    return middleware
+
+
+def disconnect_threshold_from_env() -> Optional[int]:
+    """RATE_LIMIT_DISCONNECT: shed messages per SHED_WINDOW before a client is disconnected (unset: never)"""
+    value = os.getenv("RATE_LIMIT_DISCONNECT")
+    return int(value) if value and value.isdigit() and int(value) > 0 else None
@@ -9,13 +9,120 @@ Handles:
 """
 
 from fastapi import WebSocket
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
+from collections import OrderedDict, deque
 from pydantic import BaseModel
 from datetime import datetime
-import json
 import asyncio
 import secrets
-from utils import round_floats
+import time
+import serializer
+from protocol import encode_message
+from quantize import FixedPoint, quantize_entities, quantize_state
+from spatial import AreaOfInterest, Window
+import collection
+from collection import ItemHash, UNKNOWN
+from entities import EntityStore, EnemyRecord, CoinRecord, PowerUpRecord
+from directory import RoomDirectory, WorkerInfo, LocalRoomDirectory, directory_from_env, worker_from_env
+from roomstate import CHECKPOINT_INTERVAL, RoomSnapshot, RoomStateStore
+from outbound import ConnectionSender, DEFAULT_OVERFLOW_POLICIES, DEFAULT_SEND_QUEUE_SIZE, DROP_OLDEST
+
+
+# Allowed range for the optional per-room state tick rate (Hz)
+MIN_TICK_RATE = 1
+MAX_TICK_RATE = 60
+
+# Seconds between room list publishes to a shared room directory
+HEARTBEAT_INTERVAL = 2.0
+
+# Wire encodings a client can negotiate
+JSON_ENCODING = "json"
+BINARY_ENCODING = "binary"
+ENCODINGS = (JSON_ENCODING, BINARY_ENCODING)
+
+# Position formats a client can negotiate - "fixed" only in rooms created with fixed_point
+PIXEL_POSITIONS = "pixels"
+FIXED_POSITIONS = "fixed"
+
+# Messages carrying stored entity state; in fixed-point rooms they are converted
+# back to pixels for clients that didn't negotiate fixed positions
+POSITION_MESSAGE_TYPES = frozenset({
+    "player_state_update", "enemy_state_update", "state_snapshot", "entities_sync", "entities_delta",
+    "enemy_spawned", "coin_spawned", "powerup_spawned", "game_starting", "reconnected",
+})
+
+# Dead enemies stay in entity syncs this long (seconds) so clients that missed
+# the enemy_killed event still receive the 'dead' state
+DEAD_ENEMY_SYNC_WINDOW = 10
+
+# Compaction - dead enemies and collected items are evicted once they fall out of
+# the sync window; only their IDs are kept (as tombstones) for TOMBSTONE_TTL seconds
+# so stale host syncs or late collect messages can't bring them back
+COMPACTION_INTERVAL = 5
+TOMBSTONE_TTL = 1800
+
+# Number of entity snapshots kept per client as possible delta baselines
+MAX_DELTA_HISTORY = 32
+
+
+def diff_entities(baseline: Dict[str, dict], current: Dict[str, dict]) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    Compare two entity maps (entity_id -> state)
+
+    Returns the changed fields per entity (new entities are included in full)
+    and the IDs that no longer exist in the current map.
+    """
+    changed: Dict[str, dict] = {}
+    for entity_id, state in current.items():
+        old = baseline.get(entity_id)
+        if old is None:
+            changed[entity_id] = state
+            continue
+        fields = {k: v for k, v in state.items() if k not in old or old[k] != v}
+        if fields:
+            changed[entity_id] = fields
+    removed = [entity_id for entity_id in baseline if entity_id not in current]
+    return changed, removed
+
+
+class EntityDeltaTracker:
+    """Remembers the entity snapshots sent to one client, keyed by sequence_id"""
+    
+    def __init__(self, max_history: int = MAX_DELTA_HISTORY):
+        self.max_history = max_history
+        self.history: "OrderedDict[int, dict]" = OrderedDict()  # sequence_id -> snapshot
+        self.acked_sequence: Optional[int] = None
+    
+    def record(self, sequence_id: int, snapshot: dict):
+        """Store a snapshot that was just sent to the client"""
+        self.history[sequence_id] = snapshot
+        while len(self.history) > self.max_history:
+            self.history.popitem(last=False)
+    
+    def acknowledge(self, sequence_id: int) -> bool:
+        """Mark a snapshot as received by the client, returns True if it can be used as baseline"""
+        if sequence_id not in self.history:
+            return False
+        if self.acked_sequence is not None and sequence_id <= self.acked_sequence:
+            return False
+        self.acked_sequence = sequence_id
+        # Older snapshots can never become the baseline again
+        for seq in list(self.history):
+            if seq >= sequence_id:
+                break
+            del self.history[seq]
+        return True
+    
+    def baseline(self) -> Optional[dict]:
+        """Get the last acknowledged snapshot, if it is still in history"""
+        if self.acked_sequence is None:
+            return None
+        return self.history.get(self.acked_sequence)
+    
+    def reset(self):
+        """Forget all baselines (the next sync will be sent in full)"""
+        self.history.clear()
+        self.acked_sequence = None
 
 
 class PlayerState(BaseModel):
@@ -80,7 +187,10 @@ class PowerUpState(BaseModel):
 class GameRoom:
     """Represents an online multiplayer game room"""
     
-    def __init__(self, room_id: str, room_name: str, host_id: str, max_players: int = 2):
+    def __init__(self, room_id: str, room_name: str, host_id: str, max_players: int = 2,
+                 tick_rate: Optional[int] = None, send_queue_size: int = DEFAULT_SEND_QUEUE_SIZE,
+                 overflow_policies: Optional[Dict[str, str]] = None, fixed_point: Optional[FixedPoint] = None,
+                 aoi_width: Optional[float] = None, aoi_height: Optional[float] = None):
         self.room_id = room_id
         self.room_name = room_name
         self.host_id = host_id
@@ -94,6 +204,12 @@ class GameRoom:
         # Player management
         self.players: Dict[str, PlayerState] = {}
         self.connections: Dict[str, WebSocket] = {}
+        self.encodings: Dict[str, str] = {}  # player_id -> negotiated wire encoding (default json)
+        
+        # Outbound queues - broadcasts enqueue, one writer task per connection sends
+        self.senders: Dict[str, ConnectionSender] = {}
+        self.send_queue_size = send_queue_size
+        self.overflow_policies: Dict[str, str] = overflow_policies or DEFAULT_OVERFLOW_POLICIES
         self.player_order: List[str] = []  # Track join order for player 1/2 assignment
         
         # Reconnection support - store disconnected players temporarily
@@ -104,10 +220,12 @@ class GameRoom:
         
         # Game state
         self.seed: int = secrets.randbelow(999999) + 1  # Random seed 1-999999 (never 0)
-        self.enemies: Dict[str, dict] = {}  # enemy_id -> enemy state
-        self.coins: Dict[str, dict] = {}  # coin_id -> coin state
-        self.powerups: Dict[str, dict] = {}  # powerup_id -> powerup state
+        self.enemies = EntityStore(EnemyRecord, 'is_alive', True, 'death_timestamp')  # alive index
+        self.coins = EntityStore(CoinRecord, 'is_collected', False, 'collected_timestamp')  # uncollected index
+        self.powerups = EntityStore(PowerUpRecord, 'is_collected', False, 'collected_timestamp')
         self.projectiles: List[dict] = []
+        # Spawn positions (pixels) of uncollected coins/powerups, for collect_item checks
+        self.items = ItemHash()
         
         # Host is authoritative for enemy/coin spawning
         self.entity_spawn_counter: int = 0
@@ -121,9 +239,40 @@ class GameRoom:
         self.collected_coins: Set[str] = set()  # Set of coin IDs that have been collected
         self.collected_powerups: Set[str] = set()  # Set of powerup IDs that have been collected
         
+        # Compaction - tombstones for evicted entities, expired after TOMBSTONE_TTL
+        self.enemy_tombstones: Dict[str, float] = {}  # enemy_id -> death timestamp (oldest first)
+        self.collected_expiry: deque = deque()  # (collected timestamp, item_type, item_id), oldest first
+        self.last_compaction: float = 0
+        
         # Chat messages during game
         self.chat_history: List[dict] = []
         
+        # Tick scheduling - None relays every state update immediately, otherwise
+        # dirty player/enemy states are coalesced and sent once per tick
+        self.tick_rate: Optional[int] = tick_rate
+        self.pending_player_states: Dict[str, dict] = {}  # player_id -> merged state since last tick
+        self.pending_enemy_states: Dict[str, dict] = {}  # enemy_id -> merged state since last tick
+        self.pending_enemy_sources: Dict[str, str] = {}  # enemy_id -> player_id that reported it
+        self._tick_task: Optional[asyncio.Task] = None
+        
+        # Delta sync - players that negotiated delta_sync get entity changes relative
+        # to the last snapshot they acknowledged instead of the full entity lists
+        self.delta_trackers: Dict[str, EntityDeltaTracker] = {}
+        
+        # Checkpointing - set on any state change, cleared when RoomManager snapshots the room
+        self.dirty: bool = True
+        
+        # Fixed point - entity positions/velocities stored as centipixel ints (see quantize.py),
+        # converted back to pixels on the way out except for players in fixed_point_players
+        self.fixed_point: Optional[FixedPoint] = fixed_point
+        self.fixed_point_players: Set[str] = set()
+        
+        # Area of interest - each player only gets the enemies/coins near it (see spatial.py)
+        self.aoi: Optional[AreaOfInterest] = None
+        self.aoi_size: Optional[Tuple[float, Optional[float]]] = None  # (width, height) in pixels
+        if aoi_width:
+            self.enable_aoi(aoi_width, aoi_height)
+        
     @property
     def player_count(self) -> int:
         return len(self.players)
@@ -150,15 +299,19 @@ class GameRoom:
         player_number = len(self.player_order) + 1
         skin = "alienGreen" if player_number == 1 else "alienPink"
         
+        start = self.ingest_state({"x": 400.0 if player_number == 1 else 500.0, "y": 550.0})
         self.players[player_id] = PlayerState(
             player_id=player_id,
             player_name=player_name,
-            x=400 if player_number == 1 else 500,
-            y=550,
+            x=start["x"],
+            y=start["y"],
             skin=skin
         )
         self.connections[player_id] = websocket
+        self.open_sender(player_id, websocket)
         self.player_order.append(player_id)
+        self.ensure_tick_loop()
+        self.dirty = True
         
         # Notify all players about the new player
         await self.broadcast({
@@ -182,13 +335,24 @@ class GameRoom:
             if self.game_started and allow_reconnect:
                 self.disconnected_players[player_id] = self.players[player_id]
                 self.disconnect_time[player_id] = datetime.now()
-                # Generate reconnection token
-                self.reconnect_tokens[player_id] = secrets.token_urlsafe(16)
+                # Keep the token handed out at join (see issue_reconnect_token), or generate one
+                self.reconnect_tokens.setdefault(player_id, secrets.token_urlsafe(16))
+            else:
+                self.reconnect_tokens.pop(player_id, None)
             
             del self.players[player_id]
+            self.dirty = True
             
         if player_id in self.connections:
             del self.connections[player_id]
+        sender = self.senders.pop(player_id, None)
+        if sender:
+            sender.close()
+        self.delta_trackers.pop(player_id, None)
+        self.encodings.pop(player_id, None)
+        self.fixed_point_players.discard(player_id)
+        if self.aoi is not None:
+            self.aoi.forget(player_id)
             
         # Don't remove from player_order if allowing reconnect
         if not allow_reconnect and player_id in self.player_order:
@@ -232,9 +396,12 @@ class GameRoom:
         if player_id in self.disconnected_players:
             self.players[player_id] = self.disconnected_players[player_id]
             self.connections[player_id] = websocket
+            self.open_sender(player_id, websocket)
+            self.ensure_tick_loop()
+            self.dirty = True
             
-            # Clean up reconnect data
-            self.cleanup_reconnect_data(player_id)
+            # Clean up reconnect data (the player keeps its place/number)
+            self.cleanup_reconnect_data(player_id, keep_order=True)
             
             # Notify all players
             await self.broadcast({
@@ -248,7 +415,27 @@ class GameRoom:
         
         return False
     
-    def cleanup_reconnect_data(self, player_id: str):
+    def is_abandoned(self, now: datetime) -> bool:
+        """Nobody connected and the reconnect window of every disconnected player has passed"""
+        if not self.is_empty or not self.disconnected_players:
+            return False
+        return all((now - self.disconnect_time.get(pid, now)).total_seconds() > self.reconnect_timeout
+                   for pid in self.disconnected_players)
+    
+    def issue_reconnect_token(self, player_id: str) -> str:
+        """
+        Reconnect token for a connected player (sent with room_created/room_joined/reconnected)
+        
+        Handing it out up front lets the client reconnect after losing the
+        connection - including across a server restart, see roomstate.py.
+        """
+        token = self.reconnect_tokens.get(player_id)
+        if token is None:
+            token = self.reconnect_tokens[player_id] = secrets.token_urlsafe(16)
+            self.dirty = True
+        return token
+    
+    def cleanup_reconnect_data(self, player_id: str, keep_order: bool = False):
         """Clean up reconnection data for a player"""
         if player_id in self.disconnected_players:
             del self.disconnected_players[player_id]
@@ -256,7 +443,7 @@ class GameRoom:
             del self.reconnect_tokens[player_id]
         if player_id in self.disconnect_time:
             del self.disconnect_time[player_id]
-        if player_id in self.player_order:
+        if not keep_order and player_id in self.player_order:
             self.player_order.remove(player_id)
     
     def is_item_collected(self, item_type: str, item_id: str) -> bool:
@@ -271,40 +458,69 @@ class GameRoom:
         """Mark an item as collected, returns True if this was the first collection"""
         if item_type == "coin":
             if item_id not in self.collected_coins:
+                now = datetime.now().timestamp()
                 self.collected_coins.add(item_id)
+                self.collected_expiry.append((now, item_type, item_id))
+                self.items.remove(item_id)
                 # Update coin state if tracked
-                if item_id in self.coins:
-                    self.coins[item_id]['is_collected'] = True
-                    self.coins[item_id]['collected_by'] = player_id
+                self.coins.update(item_id, {
+                    'is_collected': True,
+                    'collected_by': player_id,
+                    'collected_timestamp': now
+                })
                 return True
         elif item_type == "powerup":
             if item_id not in self.collected_powerups:
+                now = datetime.now().timestamp()
                 self.collected_powerups.add(item_id)
+                self.collected_expiry.append((now, item_type, item_id))
+                self.items.remove(item_id)
                 # Update powerup state if tracked
-                if item_id in self.powerups:
-                    self.powerups[item_id]['is_collected'] = True
-                    self.powerups[item_id]['collected_by'] = player_id
+                self.powerups.update(item_id, {
+                    'is_collected': True,
+                    'collected_by': player_id,
+                    'collected_timestamp': now
+                })
                 return True
         return False
     
+    def index_item(self, item_id: str, state: dict):
+        """Record an item's spawn position for collection checks"""
+        position = self.pixel_state({'x': state.get('x'), 'y': state.get('y')})
+        self.items.add(item_id, position['x'], position['y'])
+    
+    def player_position(self, player_id: str) -> Optional[Tuple[float, float]]:
+        """A player's last known position in pixels"""
+        player = self.players.get(player_id)
+        if player is None:
+            return None
+        position = self.pixel_state({'x': player.x, 'y': player.y})
+        return position['x'], position['y']
+    
+    def check_collection(self, player_id: str, item_id: str) -> Tuple[str, float]:
+        """Check a collect_item claim against the collector's last known position (see collection.py)"""
+        position = self.player_position(player_id)
+        if position is None:
+            outcome, distance = UNKNOWN, 0.0
+        else:
+            outcome, distance = self.items.check(item_id, *position)
+        collection.stats.record(outcome, distance)
+        return outcome, distance
+    
     def update_enemy_state(self, enemy_id: str, state_update: dict) -> bool:
         """Update an enemy's state, returns True if enemy exists"""
         if enemy_id in self.enemies:
-            # Optimize: Round floats before storing
-            # Note: Type checking ignored for dynamic dict update
-            optimized_state = round_floats(state_update) # type: ignore
-            self.enemies[enemy_id].update(optimized_state)
+            self.enemies.update(enemy_id, state_update)
             return True
         return False
     
     def spawn_enemy(self, enemy_data: dict) -> str:
         """Register a new enemy, returns the enemy ID"""
-        # Optimize: Round floats in initial data
-        enemy_data = round_floats(enemy_data) # type: ignore
-        
         enemy_id = enemy_data.get('enemy_id') or f"enemy_{self.entity_spawn_counter}"
         self.entity_spawn_counter += 1
-        self.enemies[enemy_id] = {
+        # An explicit spawn from the host is authoritative, even for a reused ID
+        self.enemy_tombstones.pop(enemy_id, None)
+        self.enemies.put(enemy_id, {
             'enemy_id': enemy_id,
             'enemy_type': enemy_data.get('enemy_type', 'fly'),
             'x': enemy_data.get('x', 0),
@@ -320,28 +536,27 @@ class GameRoom:
             'is_alive': True,
             'facing_right': enemy_data.get('facing_right', True),
             'state': enemy_data.get('state', 'idle')
-        }
+        })
         return enemy_id
     
     def kill_enemy(self, enemy_id: str, killed_by: str) -> bool:
         """Mark an enemy as dead, returns True if enemy was alive"""
-        if enemy_id in self.enemies and self.enemies[enemy_id].get('is_alive', True):
-            self.enemies[enemy_id]['is_alive'] = False
-            self.enemies[enemy_id]['killed_by'] = killed_by
-            self.enemies[enemy_id]['state'] = 'dead'
-            # Record death time for sync cleanup
-            self.enemies[enemy_id]['death_timestamp'] = datetime.now().timestamp()
+        if self.enemies.is_active(enemy_id):
+            self.enemies.update(enemy_id, {
+                'is_alive': False,
+                'killed_by': killed_by,
+                'state': 'dead',
+                # Record death time for sync cleanup
+                'death_timestamp': datetime.now().timestamp()
+            })
             return True
         return False
     
     def spawn_coin(self, coin_data: dict) -> str:
         """Register a new coin, returns the coin ID"""
-        # Optimize: Round floats
-        coin_data = round_floats(coin_data) # type: ignore
-        
         coin_id = coin_data.get('coin_id') or f"coin_{self.entity_spawn_counter}"
         self.entity_spawn_counter += 1
-        self.coins[coin_id] = {
+        self.coins.put(coin_id, {
             'coin_id': coin_id,
             'x': coin_data.get('x', 0),
             'y': coin_data.get('y', 0),
@@ -350,84 +565,600 @@ class GameRoom:
             'value': coin_data.get('value', 1),
             'velocity_x': coin_data.get('velocity_x', 0),
             'velocity_y': coin_data.get('velocity_y', 0)
-        }
+        })
+        self.index_item(coin_id, coin_data)
         return coin_id
 
     def spawn_powerup(self, powerup_data: dict) -> str:
         """Register a new powerup, returns the powerup ID"""
-        # Optimize: Round floats
-        powerup_data = round_floats(powerup_data) # type: ignore
-        
         powerup_id = powerup_data.get('powerup_id') or f"powerup_{self.entity_spawn_counter}"
         self.entity_spawn_counter += 1
-        self.powerups[powerup_id] = {
+        self.powerups.put(powerup_id, {
             'powerup_id': powerup_id,
             'type': powerup_data.get('type', 'unknown'),
             'x': powerup_data.get('x', 0),
             'y': powerup_data.get('y', 0),
             'is_collected': powerup_data.get('is_collected', False),
             'collected_by': powerup_data.get('collected_by')
-        }
+        })
+        self.index_item(powerup_id, powerup_data)
         return powerup_id
     
+    def apply_host_sync(self, enemies: List[dict], coins: List[dict]):
+        """Replace server entity state with the host's periodic sync data"""
+        for enemy in enemies:
+            eid = enemy.get("enemy_id")
+            if eid:
+                # Fix: Prevent resurrection of dead enemies due to race conditions
+                # If server has already marked enemy as dead (via enemy_killed event),
+                # ignore stale sync data from host that might still show it as alive.
+                if eid in self.enemy_tombstones or (eid in self.enemies and not self.enemies.is_active(eid)):
+                    continue
+                    
+                self.enemies.put(eid, enemy)
+        
+        for coin in coins:
+            cid = coin.get("coin_id")
+            if cid and cid not in self.collected_coins:
+                self.coins.put(cid, coin)
+                if cid not in self.items:
+                    self.index_item(cid, coin)
+        
+        self.maybe_compact()
+    
+    def compact(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Evict dead enemies and collected items older than the sync window
+        
+        Evicted enemies leave a tombstone (collected items already have one in
+        collected_coins/collected_powerups); tombstones older than TOMBSTONE_TTL
+        are expired so memory stays bounded in long sessions.
+        """
+        now = datetime.now().timestamp() if now is None else now
+        self.last_compaction = now
+        cutoff = now - DEAD_ENEMY_SYNC_WINDOW
+        
+        evicted_enemies = self.enemies.evict_deactivated(cutoff)
+        for enemy_id, death_timestamp in evicted_enemies:
+            self.enemy_tombstones[enemy_id] = death_timestamp
+        evicted_coins = self.coins.evict_deactivated(cutoff)
+        evicted_powerups = self.powerups.evict_deactivated(cutoff)
+        
+        tombstone_cutoff = now - TOMBSTONE_TTL
+        expired = 0
+        while self.enemy_tombstones:
+            enemy_id, death_timestamp = next(iter(self.enemy_tombstones.items()))
+            if death_timestamp >= tombstone_cutoff:
+                break
+            del self.enemy_tombstones[enemy_id]
+            expired += 1
+        while self.collected_expiry and self.collected_expiry[0][0] < tombstone_cutoff:
+            _, item_type, item_id = self.collected_expiry.popleft()
+            collected = self.collected_coins if item_type == "coin" else self.collected_powerups
+            collected.discard(item_id)
+            expired += 1
+        
+        return {
+            "evicted_enemies": len(evicted_enemies),
+            "evicted_coins": len(evicted_coins),
+            "evicted_powerups": len(evicted_powerups),
+            "expired_tombstones": expired
+        }
+    
+    def maybe_compact(self):
+        """Run compaction if COMPACTION_INTERVAL has passed since the last run"""
+        now = datetime.now().timestamp()
+        if now - self.last_compaction >= COMPACTION_INTERVAL:
+            self.compact(now)
+    
     def get_active_enemies(self) -> List[dict]:
         """Get list of all alive enemies"""
-        return [e for e in self.enemies.values() if e.get('is_alive', True)]
+        return self.enemies.active_dicts()
     
     def get_sync_enemies(self) -> List[dict]:
         """Get list of enemies for sync (active + recently dead)"""
+        self.maybe_compact()
         now = datetime.now().timestamp()
         # Include active enemies AND enemies that died in the last 10 seconds
         # This ensures clients receive the 'dead' state update even if they missed the event
-        return [
-            e for e in self.enemies.values() 
-            if e.get('is_alive', True) or (now - e.get('death_timestamp', 0) < 10)
-        ]
+        recently_dead = self.enemies.recently_deactivated(now, DEAD_ENEMY_SYNC_WINDOW)
+        return self.enemies.active_dicts() + [self.enemies.get_dict(eid) for eid in recently_dead]
     
     def get_uncollected_coins(self) -> List[dict]:
         """Get list of all uncollected coins"""
-        return [c for c in self.coins.values() if not c.get('is_collected', False)]
+        return self.coins.active_dicts()
 
     def get_uncollected_powerups(self) -> List[dict]:
         """Get list of all uncollected powerups"""
-        return [p for p in self.powerups.values() if not p.get('is_collected', False)]
+        return self.powerups.active_dicts()
     
-    async def broadcast(self, message: dict, exclude: Optional[str] = None):
-        """Send a message to all connected players"""
-        disconnected = []
+    def set_encoding(self, player_id: str, encoding: Optional[str]):
+        """Set the wire encoding negotiated by a player (unknown values mean JSON)"""
+        if encoding == BINARY_ENCODING:
+            self.encodings[player_id] = BINARY_ENCODING
+        else:
+            self.encodings.pop(player_id, None)
+    
+    def set_positions(self, player_id: str, positions: Optional[str]):
+        """Set the position format negotiated by a player (pixels unless the room is fixed point)"""
+        if self.fixed_point is not None and positions == FIXED_POSITIONS:
+            self.fixed_point_players.add(player_id)
+        else:
+            self.fixed_point_players.discard(player_id)
+    
+    def position_info(self, player_id: str) -> dict:
+        """Reply fields telling a player how positions are sent to it"""
+        if player_id in self.fixed_point_players:
+            return {"positions": FIXED_POSITIONS, **self.fixed_point.describe()}
+        return {"positions": PIXEL_POSITIONS}
+    
+    def ingest_state(self, state: dict, player_id: Optional[str] = None) -> dict:
+        """
+        Quantize an inbound state dict in place into the room's storage format
         
-        # Optimize: Serialize once
-        json_message = json.dumps(message)
+        player_id is the sender (its negotiated position format applies),
+        None for values computed by the server in pixels.
+        """
+        if self.fixed_point is None:
+            return quantize_state(state)
+        if player_id in self.fixed_point_players:
+            return self.fixed_point.coerce_state(state)
+        return self.fixed_point.encode_state(state)
+    
+    def ingest_entities(self, entities: List[dict], player_id: Optional[str] = None) -> List[dict]:
+        """ingest_state for a list of entity dicts (bulk quantization in pixel rooms)"""
+        if self.fixed_point is None:
+            return quantize_entities(entities)
+        for entity in entities:
+            if isinstance(entity, dict):
+                self.ingest_state(entity, player_id)
+        return entities
+    
+    def pixel_state(self, state: dict) -> dict:
+        """A stored state dict in pixels, for server-side game logic"""
+        if self.fixed_point is None:
+            return state
+        return self.fixed_point.to_pixels(state)
+    
+    def enable_aoi(self, width: float, height: Optional[float] = None):
+        """Only send each player the entities inside a width x height pixel window around it"""
+        scale = self.fixed_point.scale if self.fixed_point is not None else 1
+        self.aoi_size = (width, height)
+        self.aoi = AreaOfInterest(width * scale, height * scale if height else None)
+        self.enemies.enable_grid(self.aoi.cell_size)
+        self.coins.enable_grid(self.aoi.cell_size)
+    
+    def view_window(self, player_id: str) -> Optional[Window]:
+        player = self.players.get(player_id)
+        return self.aoi.window(player.x, player.y) if player else None
+    
+    def enemy_view_change(self, player_id: str, enemy_id: str) -> Optional[bool]:
+        """
+        Check an enemy against a player's view and track it
         
-        for player_id, websocket in self.connections.items():
-            if player_id != exclude:
-                try:
-                    await websocket.send_text(json_message)
-                except Exception:
-                    disconnected.append(player_id)
+        Returns None if the enemy is out of view (nothing to send), True if it
+        just came into view (send it in full) and False if it already was.
+        """
+        window = self.view_window(player_id)
+        record = self.enemies.get(enemy_id)
+        if window is None or record is None:
+            return False
+        view = self.aoi.view(player_id)
+        if not window.contains(record.get('x'), record.get('y')):
+            view.discard(enemy_id)
+            return None
+        if enemy_id in view:
+            return False
+        view.add(enemy_id)
+        # Dead enemies coming into view just get the update, there is nothing to spawn
+        return self.enemies.is_active(enemy_id)
+    
+    def send_enemies_in_full(self, player_id: str, enemy_ids: List[str]):
+        """Send enemies that came into a player's view as enemy_spawned (clients create or resync them)"""
+        for enemy_id in enemy_ids:
+            enemy = self.enemies.get_dict(enemy_id)
+            if enemy is not None:
+                message = {"type": "enemy_spawned", "enemy": enemy}
+                self.enqueue(player_id, self.encode_for(player_id, message, {}), "enemy_spawned")
+    
+    def refresh_view(self, player_id: str):
+        """After a player moved, send it the active enemies that came into its view"""
+        window = self.view_window(player_id)
+        if window is None:
+            return
+        in_window = self.enemies.grid.query(window)
+        view = self.aoi.view(player_id)
+        entered = [eid for eid in in_window if eid not in view and self.enemies.is_active(eid)]
+        self.aoi.set_view(player_id, in_window)
+        self.send_enemies_in_full(player_id, entered)
+    
+    def view_snapshot(self, player_id: str, snapshot: dict) -> dict:
+        """The part of an entity snapshot inside a player's view, which also becomes its enemy view"""
+        window = self.view_window(player_id)
+        if window is None:
+            return snapshot
+        enemies, coins = snapshot["enemies"], snapshot["coins"]
+        view = {
+            "enemies": {eid: enemies[eid] for eid in self.enemies.grid.query(window) if eid in enemies},
+            "coins": {cid: coins[cid] for cid in self.coins.grid.query(window) if cid in coins}
+        }
+        self.aoi.set_view(player_id, view["enemies"])
+        return view
+    
+    def encode_for(self, player_id: str, message: dict, cache: dict):
+        """
+        Serialize a message in the player's encoding
         
-        # Clean up disconnected players
-        for player_id in disconnected:
-            await self.remove_player(player_id)
+        cache holds the encodings already produced for this message so each
+        format is serialized at most once per broadcast. Binary players get
+        JSON text for messages without a binary layout. In fixed-point rooms
+        pixel players share one converted copy of the message (and its own
+        encodings, kept in a nested cache).
+        """
+        if (self.fixed_point is not None and player_id not in self.fixed_point_players
+                and message.get("type") in POSITION_MESSAGE_TYPES):
+            if PIXEL_POSITIONS not in cache:
+                cache[PIXEL_POSITIONS] = {"message": self.fixed_point.to_pixels(message)}
+            cache = cache[PIXEL_POSITIONS]
+            message = cache["message"]
+        if self.encodings.get(player_id) == BINARY_ENCODING:
+            if BINARY_ENCODING not in cache:
+                cache[BINARY_ENCODING] = encode_message(message)
+            if cache[BINARY_ENCODING] is not None:
+                return cache[BINARY_ENCODING]
+        if JSON_ENCODING not in cache:
+            cache[JSON_ENCODING] = serializer.dumps_text(message)
+        return cache[JSON_ENCODING]
     
-    async def send_to_player(self, player_id: str, message: dict):
-        """Send a message to a specific player"""
-        if player_id in self.connections:
-            try:
-                await self.connections[player_id].send_json(message)
-            except Exception:
+    def open_sender(self, player_id: str, websocket: WebSocket):
+        """Create and start the outbound queue for a player's connection"""
+        old_sender = self.senders.pop(player_id, None)
+        if old_sender:
+            old_sender.close()
+        
+        async def on_error():
+            # Sending failed or the client fell too far behind - drop the player
+            if self.senders.get(player_id) is sender:
                 await self.remove_player(player_id)
+        
+        sender = ConnectionSender(websocket, on_error, max_queue=self.send_queue_size)
+        self.senders[player_id] = sender
+        sender.start()
+    
+    def enqueue(self, player_id: str, payload, message_type: Optional[str]):
+        """Queue an encoded payload for a player using the message type's overflow policy"""
+        sender = self.senders.get(player_id)
+        if sender:
+            sender.send(payload, droppable=self.overflow_policies.get(message_type) == DROP_OLDEST)
+    
+    async def drain(self):
+        """Wait until all queued messages have been written (used by tests and shutdown)"""
+        for sender in list(self.senders.values()):
+            await sender.drain()
+    
+    async def broadcast(self, message: dict, exclude: Optional[str] = None):
+        """Queue a message for all connected players (never waits on a socket)"""
+        # Optimize: Serialize once per encoding
+        encoded: dict = {}
+        message_type = message.get("type")
+        
+        for player_id in list(self.senders):
+            if player_id != exclude:
+                self.enqueue(player_id, self.encode_for(player_id, message, encoded), message_type)
+    
+    async def send_to_player(self, player_id: str, message: dict):
+        """Queue a message for a specific player"""
+        if player_id in self.senders:
+            self.enqueue(player_id, self.encode_for(player_id, message, {}), message.get("type"))
     
     def update_player_state(self, player_id: str, state_update: dict):
-        """Update a player's state"""
+        """Update a player's state (already quantized by its handler, see quantize.py)"""
         if player_id in self.players:
             player = self.players[player_id]
-            # Optimize: Round floats
-            state_update = round_floats(state_update) # type: ignore
             for key, value in state_update.items():
                 if hasattr(player, key):
                     setattr(player, key, value)
     
+    async def relay_player_state(self, player_id: str, state_update: dict):
+        """Forward a player's state to the other players, immediately or on the next tick"""
+        if self.aoi is not None:
+            self.refresh_view(player_id)
+        if self.tick_rate:
+            pending = self.pending_player_states.setdefault(player_id, {})
+            pending.update(state_update)
+            return
+        
+        await self.broadcast({
+            "type": "player_state_update",
+            "player_id": player_id,
+            "state": state_update
+        }, exclude=player_id)
+    
+    async def relay_enemy_state(self, enemy_id: str, state_update: dict, source_id: str):
+        """Forward an enemy's state to the other players, immediately or on the next tick"""
+        if self.tick_rate:
+            pending = self.pending_enemy_states.setdefault(enemy_id, {})
+            pending.update(state_update)
+            self.pending_enemy_sources[enemy_id] = source_id
+            return
+        
+        message = {
+            "type": "enemy_state_update",
+            "enemy_id": enemy_id,
+            "state": state_update
+        }
+        if self.aoi is None:
+            await self.broadcast(message, exclude=source_id)
+            return
+        
+        encoded: dict = {}
+        for player_id in list(self.senders):
+            if player_id == source_id:
+                continue
+            change = self.enemy_view_change(player_id, enemy_id)
+            if change:
+                self.send_enemies_in_full(player_id, [enemy_id])
+            elif change is not None:
+                self.enqueue(player_id, self.encode_for(player_id, message, encoded), "enemy_state_update")
+    
+    def build_snapshot(self, recipient_id: str, players: Dict[str, dict], enemies: Dict[str, dict],
+                       enemy_sources: Dict[str, str]) -> dict:
+        """
+        Build the tick snapshot for one player, leaving out updates that player sent itself
+        
+        With an area of interest, enemies out of the player's view are left out
+        too and those that just came into view are sent in full right away.
+        """
+        enemies = {eid: s for eid, s in enemies.items() if enemy_sources.get(eid) != recipient_id}
+        if self.aoi is not None:
+            entered, visible = [], {}
+            for eid, state in enemies.items():
+                change = self.enemy_view_change(recipient_id, eid)
+                if change:
+                    entered.append(eid)
+                elif change is not None:
+                    visible[eid] = state
+            self.send_enemies_in_full(recipient_id, entered)
+            enemies = visible
+        return {
+            "players": {pid: s for pid, s in players.items() if pid != recipient_id},
+            "enemies": enemies
+        }
+    
+    async def flush_tick(self):
+        """Send one combined snapshot of all dirty player/enemy states to each player"""
+        if not self.pending_player_states and not self.pending_enemy_states:
+            return
+        
+        players, self.pending_player_states = self.pending_player_states, {}
+        enemies, self.pending_enemy_states = self.pending_enemy_states, {}
+        enemy_sources, self.pending_enemy_sources = self.pending_enemy_sources, {}
+        
+        header = {
+            "type": "state_snapshot",
+            "sequence_id": self.get_next_sequence(),
+            "server_timestamp": time.time() * 1000
+        }
+        contributors = set(players) | set(enemy_sources.values())
+        # Players who sent nothing this tick all receive the same frame - serialize it once per encoding
+        shared_message = {**header, "players": players, "enemies": enemies}
+        shared_encoded: dict = {}
+        
+        for player_id in list(self.senders):
+            if player_id in contributors or self.aoi is not None:
+                snapshot = self.build_snapshot(player_id, players, enemies, enemy_sources)
+                if not snapshot["players"] and not snapshot["enemies"]:
+                    continue
+                payload = self.encode_for(player_id, {**header, **snapshot}, {})
+            else:
+                payload = self.encode_for(player_id, shared_message, shared_encoded)
+            self.enqueue(player_id, payload, "state_snapshot")
+    
+    def ensure_tick_loop(self):
+        """Start the tick loop for rooms with a tick rate if it is not already running"""
+        if self.tick_rate and (self._tick_task is None or self._tick_task.done()):
+            self._tick_task = asyncio.create_task(self._run_tick_loop())
+    
+    def stop_tick_loop(self):
+        """Cancel the tick loop (e.g. when the room is closed)"""
+        if self._tick_task and not self._tick_task.done():
+            self._tick_task.cancel()
+        self._tick_task = None
+    
+    async def _run_tick_loop(self):
+        """Flush dirty state at a fixed rate until the room is empty"""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while not self.is_empty:
+            # Schedule against absolute deadlines so slow flushes don't drift the rate
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_tick = loop.time()
+            try:
+                await self.flush_tick()
+                self.maybe_compact()
+            except Exception as e:
+                print(f"[ROOM {self.room_id}] tick error: {e}")
+    
+    def enable_delta_sync(self, player_id: str):
+        """Send entity syncs to this player as deltas (starting from a full snapshot)"""
+        tracker = self.delta_trackers.get(player_id)
+        if tracker:
+            tracker.reset()
+        else:
+            self.delta_trackers[player_id] = EntityDeltaTracker()
+    
+    def acknowledge_entities(self, player_id: str, sequence_id: int) -> bool:
+        """Record that a player received the entity snapshot with the given sequence_id"""
+        tracker = self.delta_trackers.get(player_id)
+        if not tracker:
+            return False
+        return tracker.acknowledge(sequence_id)
+    
+    def get_entity_snapshot(self) -> dict:
+        """Current sync entities keyed by ID (fresh dicts, so later updates can't alter the snapshot)"""
+        return {
+            "enemies": {e['enemy_id']: e for e in self.get_sync_enemies() if 'enemy_id' in e},
+            "coins": {c['coin_id']: c for c in self.get_uncollected_coins() if 'coin_id' in c}
+        }
+    
+    def build_entities_delta(self, player_id: str, snapshot: dict, sequence_id: int) -> dict:
+        """Build an entities_delta message against the player's acknowledged baseline"""
+        baseline = self.delta_trackers[player_id].baseline()
+        enemies, removed_enemies = diff_entities(baseline["enemies"], snapshot["enemies"])
+        coins, removed_coins = diff_entities(baseline["coins"], snapshot["coins"])
+        return {
+            "type": "entities_delta",
+            "baseline_id": self.delta_trackers[player_id].acked_sequence,
+            "sequence_id": sequence_id,
+            "enemies": enemies,
+            "coins": coins,
+            "removed_enemies": removed_enemies,
+            "removed_coins": removed_coins
+        }
+    
+    async def broadcast_entities_sync(self, exclude: Optional[str] = None):
+        """
+        Send the current enemies and coins to all players
+        
+        Players without delta sync (or without an acknowledged baseline) get the
+        full entities_sync message; the others get only what changed since the
+        sequence_id they last acknowledged. With an area of interest both are
+        cut down to the entities in each player's view.
+        """
+        sequence_id = self.get_next_sequence()
+        # Snapshots are only needed as baselines for delta players and to cut views from
+        snapshot = self.get_entity_snapshot() if self.delta_trackers or self.aoi is not None else None
+        full_message: Optional[dict] = None
+        full_encoded: dict = {}
+        deltas: Dict[int, Tuple[dict, dict]] = {}  # baseline sequence_id -> (delta message, its encodings)
+        views: Dict[tuple, Tuple[dict, dict]] = {}  # (enemy IDs, coin IDs) in view -> (sync message, its encodings)
+        
+        for player_id in list(self.senders):
+            if player_id == exclude:
+                continue
+            view = self.view_snapshot(player_id, snapshot) if self.aoi is not None else snapshot
+            tracker = self.delta_trackers.get(player_id)
+            if tracker and tracker.baseline() is not None:
+                baseline_id = tracker.acked_sequence
+                if self.aoi is not None:
+                    # Views differ per player, so do the deltas
+                    message, encoded = self.build_entities_delta(player_id, view, sequence_id), {}
+                else:
+                    if baseline_id not in deltas:
+                        deltas[baseline_id] = (self.build_entities_delta(player_id, snapshot, sequence_id), {})
+                    message, encoded = deltas[baseline_id]
+            elif self.aoi is not None:
+                key = (tuple(view["enemies"]), tuple(view["coins"]))
+                if key not in views:
+                    views[key] = ({
+                        "type": "entities_sync",
+                        "enemies": list(view["enemies"].values()),
+                        "coins": list(view["coins"].values()),
+                        "sequence_id": sequence_id
+                    }, {})
+                message, encoded = views[key]
+            else:
+                if full_message is None:
+                    full_message = {
+                        "type": "entities_sync",
+                        "enemies": self.get_sync_enemies(),
+                        "coins": self.get_uncollected_coins(),
+                        "sequence_id": sequence_id
+                    }
+                message, encoded = full_message, full_encoded
+            if tracker:
+                tracker.record(sequence_id, view)
+            self.enqueue(player_id, self.encode_for(player_id, message, encoded), message["type"])
+    
+    def to_snapshot(self) -> dict:
+        """Checkpoint of everything needed to resume the room after a restart"""
+        return {
+            "room_id": self.room_id,
+            "room_name": self.room_name,
+            "host_id": self.host_id,
+            "max_players": self.max_players,
+            "created_at": self.created_at.timestamp(),
+            "game_started": self.game_started,
+            "game_paused": self.game_paused,
+            "level": self.level,
+            "game_mode": self.game_mode,
+            "tick_rate": self.tick_rate,
+            "fixed_point": [self.fixed_point.origin_x, self.fixed_point.origin_y] if self.fixed_point else None,
+            "aoi": list(self.aoi_size) if self.aoi_size else None,
+            "seed": self.seed,
+            "player_order": list(self.player_order),
+            "players": {pid: p.model_dump() for pid, p in self.players.items()},
+            "disconnected_players": {pid: p.model_dump() for pid, p in self.disconnected_players.items()},
+            "disconnect_time": {pid: t.timestamp() for pid, t in self.disconnect_time.items()},
+            "reconnect_tokens": dict(self.reconnect_tokens),
+            "entity_spawn_counter": self.entity_spawn_counter,
+            "game_start_timestamp": self.game_start_timestamp,
+            "sequence_id": self.sequence_id,
+            "enemies": self.enemies.snapshot(),
+            "coins": self.coins.snapshot(),
+            "powerups": self.powerups.snapshot(),
+            "projectiles": list(self.projectiles),
+            "collected_coins": list(self.collected_coins),
+            "collected_powerups": list(self.collected_powerups),
+            "collected_expiry": [list(entry) for entry in self.collected_expiry],
+            "enemy_tombstones": dict(self.enemy_tombstones),
+            "chat_history": self.chat_history[-20:]
+        }
+    
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "GameRoom":
+        """
+        Rebuild a room from to_snapshot() output
+        
+        Nobody is connected after a restart, so every player is restored as
+        disconnected and has to come back with its reconnect token.
+        """
+        fixed_point = data.get("fixed_point")
+        aoi_width, aoi_height = data.get("aoi") or (None, None)
+        room = cls(data["room_id"], data["room_name"], data["host_id"], max_players=data["max_players"],
+                   tick_rate=data.get("tick_rate"),
+                   fixed_point=FixedPoint(*fixed_point) if fixed_point is not None else None,
+                   aoi_width=aoi_width, aoi_height=aoi_height)
+        room.created_at = datetime.fromtimestamp(data["created_at"])
+        room.game_started = data["game_started"]
+        room.game_paused = data["game_paused"]
+        room.level = data["level"]
+        room.game_mode = data["game_mode"]
+        room.seed = data["seed"]
+        room.player_order = list(data["player_order"])
+        
+        now = datetime.now()
+        disconnect_time = {pid: datetime.fromtimestamp(t) for pid, t in data["disconnect_time"].items()}
+        for pid, player in {**data["players"], **data["disconnected_players"]}.items():
+            room.disconnected_players[pid] = PlayerState(**player)
+            # Players that were still connected get a full reconnect window from now
+            room.disconnect_time[pid] = disconnect_time.get(pid, now)
+        room.reconnect_tokens = dict(data["reconnect_tokens"])
+        
+        room.entity_spawn_counter = data["entity_spawn_counter"]
+        room.game_start_timestamp = data["game_start_timestamp"]
+        room.sequence_id = data["sequence_id"]
+        room.enemies.restore(data["enemies"])
+        room.coins.restore(data["coins"])
+        room.powerups.restore(data["powerups"])
+        for store in (room.coins, room.powerups):
+            for item_id in store:
+                if store.is_active(item_id):
+                    room.index_item(item_id, store.get_dict(item_id))
+        room.projectiles = list(data["projectiles"])
+        room.collected_coins = set(data["collected_coins"])
+        room.collected_powerups = set(data["collected_powerups"])
+        room.collected_expiry = deque(tuple(entry) for entry in data["collected_expiry"])
+        room.enemy_tombstones = dict(data["enemy_tombstones"])
+        room.chat_history = list(data["chat_history"])
+        room.dirty = False
+        return room
+    
     def get_room_info(self) -> dict:
         """Get room information for lobby display"""
         return {
@@ -437,6 +1168,9 @@ class GameRoom:
             "player_count": self.player_count,
             "max_players": self.max_players,
             "game_started": self.game_started,
+            "tick_rate": self.tick_rate,
+            "fixed_point": self.fixed_point is not None,
+            "aoi": list(self.aoi_size) if self.aoi_size else None,
             "players": [
                 {
                     "player_id": p.player_id,
@@ -499,33 +1233,68 @@ class GameRoom:
 
 
 class RoomManager:
-    """Manages all active game rooms"""
+    """
+    Manages the game rooms owned by this worker process
+
+    Room ownership and listings are mirrored into a RoomDirectory so other
+    workers can route joins here and show these rooms in /api/rooms. A shared
+    directory is file I/O under a lock: claims and lookups run on a worker
+    thread, releases and the room list are written by a background publisher
+    task.
+    With a RoomStateStore attached, dirty rooms are checkpointed periodically
+    and restored on startup.
+    """
     
-    def __init__(self):
+    def __init__(self, directory: Optional[RoomDirectory] = None, worker: Optional[WorkerInfo] = None):
         self.rooms: Dict[str, GameRoom] = {}
         self._lock = asyncio.Lock()
+        self.directory = directory or LocalRoomDirectory()
+        self.worker = worker or WorkerInfo("local")
+        self._publisher_task: Optional[asyncio.Task] = None
+        self._publish_wakeup: Optional[asyncio.Event] = None
+        self._directory_lock = asyncio.Lock()  # One directory write at a time, newest room list last
+        self._pending_releases: List[str] = []  # Room IDs to give back with the next publish
+        self.state_store: Optional[RoomStateStore] = None
+        self.removed_rooms: Set[str] = set()  # Deleted since the last checkpoint
+        self._checkpoint_task: Optional[asyncio.Task] = None
     
-    def generate_room_id(self) -> str:
-        """Generate a unique 6-character room code"""
+    async def _directory_call(self, method, *args):
+        """Call a directory method, on a worker thread if the directory does file I/O"""
+        if self.directory.shared:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+    
+    async def generate_room_id(self) -> str:
+        """Generate a unique 6-character room code (claimed in the directory)"""
         while True:
             code = ''.join(secrets.choice('ABCDEFGHJKLMNPQRSTUVWXYZ23456789') for _ in range(6))
-            if code not in self.rooms:
+            # A code still waiting to be released would be released again after the claim
+            if code in self.rooms or code in self._pending_releases:
+                continue
+            if await self._directory_call(self.directory.claim, code, self.worker):
                 return code
     
-    async def create_room(self, room_name: str, host_id: str, host_name: str, websocket: WebSocket) -> GameRoom:
-        """Create a new game room"""
+    async def create_room(self, room_name: str, host_id: str, host_name: str, websocket: WebSocket,
+                          tick_rate: Optional[int] = None, fixed_point: Optional[FixedPoint] = None,
+                          aoi_width: Optional[float] = None, aoi_height: Optional[float] = None) -> GameRoom:
+        """Create a new game room (tick_rate enables coalesced state snapshots)"""
+        if tick_rate is not None:
+            tick_rate = max(MIN_TICK_RATE, min(MAX_TICK_RATE, int(tick_rate)))
         async with self._lock:
-            room_id = self.generate_room_id()
-            room = GameRoom(room_id, room_name, host_id)
+            room_id = await self.generate_room_id()
+            room = GameRoom(room_id, room_name, host_id, tick_rate=tick_rate, fixed_point=fixed_point,
+                            aoi_width=aoi_width, aoi_height=aoi_height)
             self.rooms[room_id] = room
             await room.add_player(host_id, host_name, websocket)
-            return room
+        self.publish()
+        return room
     
     async def join_room(self, room_id: str, player_id: str, player_name: str, websocket: WebSocket) -> Optional[GameRoom]:
         """Join an existing room"""
         room = self.rooms.get(room_id)
         if room and not room.is_full and not room.game_started:
             await room.add_player(player_id, player_name, websocket)
+            self.publish()
             return room
         return None
     
@@ -537,26 +1306,202 @@ class RoomManager:
             
             # Remove room if empty
             if room.is_empty:
+                room.stop_tick_loop()
                 async with self._lock:
                     if room_id in self.rooms:
                         del self.rooms[room_id]
+                        self._release(room_id)
+                        self.removed_rooms.add(room_id)
+            self.publish()
     
     def get_room(self, room_id: str) -> Optional[GameRoom]:
         """Get a room by ID"""
         return self.rooms.get(room_id)
     
+    async def locate(self, room_id: str) -> Optional[WorkerInfo]:
+        """Worker owning a room this process doesn't have (None if local or unknown)"""
+        if room_id in self.rooms or not self.directory.shared:
+            return None
+        owner = await asyncio.to_thread(self.directory.lookup, room_id)
+        if owner is None or owner.worker_id == self.worker.worker_id:
+            return None
+        return owner
+    
+    def _release(self, room_id: str):
+        """Give a room_id back to the directory (with the next publish if it is shared)"""
+        if self.directory.shared:
+            self._pending_releases.append(room_id)
+        else:
+            self.directory.release(room_id, self.worker)
+    
+    def publish(self):
+        """Push this worker's room list to a shared directory (also its heartbeat), from the publisher task"""
+        if not self.directory.shared:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No running loop (startup) - write it right away
+            self._write_directory(*self._take_directory_update())
+            return
+        task = self._publisher_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._publish_wakeup = asyncio.Event()
+            self._publisher_task = loop.create_task(self._run_publisher(self._publish_wakeup))
+        else:
+            self._publish_wakeup.set()
+    
+    def _take_directory_update(self) -> Tuple[List[str], List[dict]]:
+        """Queued releases and the current room list (taken on the event loop, where rooms change)"""
+        releases, self._pending_releases = self._pending_releases, []
+        return releases, [room.get_room_info() for room in self.rooms.values()]
+    
+    def _write_directory(self, releases: List[str], rooms: List[dict]):
+        """Blocking directory update, runs on a worker thread"""
+        for room_id in releases:
+            self.directory.release(room_id, self.worker)
+        self.directory.publish(self.worker, rooms)
+    
+    async def flush_directory(self):
+        """Write queued releases and the current room list to a shared directory now"""
+        if not self.directory.shared:
+            return
+        async with self._directory_lock:
+            releases, rooms = self._take_directory_update()
+            try:
+                await asyncio.to_thread(self._write_directory, releases, rooms)
+            except Exception:
+                self._pending_releases[:0] = releases
+                raise
+    
+    async def _run_publisher(self, wakeup: asyncio.Event):
+        """Publish on every change, and every HEARTBEAT_INTERVAL while rooms exist (the heartbeat)"""
+        while True:
+            wakeup.clear()
+            try:
+                await self.flush_directory()
+            except Exception as e:
+                print(f"[ROOMS] Directory update failed: {e}")
+            if not self.rooms and not self._pending_releases and not wakeup.is_set():
+                return  # The empty list is published, nothing to keep alive
+            try:
+                await asyncio.wait_for(wakeup.wait(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    def attach_state_store(self, store: RoomStateStore) -> int:
+        """
+        Restore this worker's checkpointed rooms and keep checkpointing into store
+        
+        Returns the number of rooms restored. Call before serving connections.
+        """
+        self.state_store = store
+        restored = 0
+        for snapshot in store.load(self.worker.worker_id):
+            room_id = snapshot["room_id"]
+            if not snapshot["game_started"]:
+                # Lobby players can't reconnect (remove_player), so nobody would come back to it
+                self.removed_rooms.add(room_id)
+                continue
+            if room_id in self.rooms or not self.directory.claim(room_id, self.worker):
+                continue
+            self.rooms[room_id] = GameRoom.from_snapshot(snapshot)
+            restored += 1
+        self.publish()
+        return restored
+    
+    def expire_abandoned_rooms(self, now: Optional[datetime] = None) -> int:
+        """
+        Remove games nobody reconnected to within the reconnect window
+        
+        Covers rooms restored after a restart as well as games everyone
+        disconnected from. Returns the number of rooms removed.
+        """
+        now = now or datetime.now()
+        expired = [room_id for room_id, room in self.rooms.items() if room.is_abandoned(now)]
+        for room_id in expired:
+            self.rooms.pop(room_id).stop_tick_loop()
+            self._release(room_id)
+            self.removed_rooms.add(room_id)
+        if expired:
+            self.publish()
+        return len(expired)
+    
+    def ensure_checkpoint_loop(self):
+        """Start the background checkpoint task if a store is attached (needs a running loop)"""
+        if self.state_store is None:
+            return
+        if self._checkpoint_task is None or self._checkpoint_task.done():
+            self._checkpoint_task = asyncio.get_running_loop().create_task(self._run_checkpoint_loop())
+    
+    def _collect_checkpoint(self) -> Tuple[List[RoomSnapshot], List[str]]:
+        """Snapshot dirty rooms and clear their flags (runs on the event loop, no awaits)"""
+        now = time.time()
+        snapshots = []
+        for room in self.rooms.values():
+            if room.dirty:
+                room.dirty = False
+                snapshots.append((room.room_id, now, room.to_snapshot()))
+        removed = list(self.removed_rooms)
+        self.removed_rooms.clear()
+        return snapshots, removed
+    
+    def _checkpoint_failed(self, snapshots: List[RoomSnapshot], removed: List[str]):
+        for room_id, _, _ in snapshots:
+            room = self.rooms.get(room_id)
+            if room:
+                room.dirty = True
+        self.removed_rooms.update(removed)
+    
+    async def checkpoint(self):
+        """Write dirty rooms and drop deleted ones; the I/O runs on a worker thread"""
+        snapshots, removed = self._collect_checkpoint()
+        try:
+            if snapshots:
+                await asyncio.to_thread(self.state_store.save, self.worker.worker_id, snapshots)
+            if removed:
+                await asyncio.to_thread(self.state_store.delete, removed)
+        except Exception as e:
+            print(f"[ROOMS] Checkpoint failed: {e}")
+            self._checkpoint_failed(snapshots, removed)
+    
+    def checkpoint_now(self):
+        """Synchronous checkpoint (shutdown, or when no event loop is running)"""
+        if self.state_store is None:
+            return
+        snapshots, removed = self._collect_checkpoint()
+        try:
+            if snapshots:
+                self.state_store.save(self.worker.worker_id, snapshots)
+            if removed:
+                self.state_store.delete(removed)
+        except Exception as e:
+            print(f"[ROOMS] Checkpoint failed: {e}")
+            self._checkpoint_failed(snapshots, removed)
+    
+    async def _run_checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(CHECKPOINT_INTERVAL)
+            self.expire_abandoned_rooms()
+            await self.checkpoint()
+    
+    def _all_room_infos(self) -> List[dict]:
+        # The REST endpoints call this from the threadpool: leave removing abandoned rooms to the event loop
+        now = datetime.now()
+        return [room.get_room_info() for room in list(self.rooms.values()) if not room.is_abandoned(now)] + \
+            self.directory.list_rooms(exclude_worker=self.worker.worker_id)
+    
     def get_available_rooms(self) -> List[dict]:
-        """Get list of available (joinable) rooms"""
+        """Get list of available (joinable) rooms across all workers"""
         return [
-            room.get_room_info()
-            for room in self.rooms.values()
-            if not room.is_full and not room.game_started
+            info for info in self._all_room_infos()
+            if info["player_count"] < info["max_players"] and not info["game_started"]
         ]
     
     def get_all_rooms(self) -> List[dict]:
-        """Get list of all rooms"""
-        return [room.get_room_info() for room in self.rooms.values()]
+        """Get list of all rooms across all workers"""
+        return self._all_room_infos()
 
 
-# Global room manager instance
-room_manager = RoomManager()
+# Global room manager instance (ROOM_DIRECTORY / WORKER_ID / WORKER_URL configure sharding)
+room_manager = RoomManager(directory_from_env(), worker_from_env())
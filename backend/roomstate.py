@@ -0,0 +1,68 @@
+"""
+Room state persistence for restarts
+
+RoomManager checkpoints rooms that changed since the last checkpoint into a
+RoomStateStore every CHECKPOINT_INTERVAL seconds (and once more at exit).
+Snapshots are built on the event loop but serialized and written on a
+worker thread, so message handling only ever sets a dirty flag.
+
+On startup the rooms of this worker are restored with every player marked
+disconnected, so clients can send "reconnect" with the token they were
+given and pick up the game where it was.
+"""
+
+import json
+import time
+from typing import List, Sequence, Tuple
+
+CHECKPOINT_INTERVAL = 2.0  # Seconds between checkpoints of dirty rooms
+MAX_SNAPSHOT_AGE = 300.0  # Snapshots older than this at startup are discarded
+
+# (room_id, saved_at, snapshot dict)
+RoomSnapshot = Tuple[str, float, dict]
+
+
+class RoomStateStore:
+    """Interface for room snapshot storage"""
+
+    def save(self, worker_id: str, snapshots: Sequence[RoomSnapshot]):
+        """Insert or replace snapshots owned by a worker"""
+        raise NotImplementedError
+
+    def delete(self, room_ids: Sequence[str]):
+        """Forget rooms that no longer exist"""
+        raise NotImplementedError
+
+    def load(self, worker_id: str, max_age: float = MAX_SNAPSHOT_AGE) -> List[dict]:
+        """Snapshots owned by a worker that are recent enough to restore (stale ones are deleted)"""
+        raise NotImplementedError
+
+
+class SQLiteRoomStateStore(RoomStateStore):
+    """Snapshots as JSON rows in the room_snapshots table (see SCHEMA_MIGRATIONS)"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def save(self, worker_id: str, snapshots: Sequence[RoomSnapshot]):
+        rows = [(room_id, worker_id, saved_at, json.dumps(state, separators=(",", ":")))
+                for room_id, saved_at, state in snapshots]
+        with self.pool.connection() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO room_snapshots (room_id, worker_id, saved_at, state)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+
+    def delete(self, room_ids: Sequence[str]):
+        with self.pool.connection() as conn:
+            conn.executemany("DELETE FROM room_snapshots WHERE room_id = ?", [(room_id,) for room_id in room_ids])
+            conn.commit()
+
+    def load(self, worker_id: str, max_age: float = MAX_SNAPSHOT_AGE) -> List[dict]:
+        cutoff = time.time() - max_age
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM room_snapshots WHERE worker_id = ? AND saved_at < ?", (worker_id, cutoff))
+            conn.commit()
+            rows = conn.execute("SELECT state FROM room_snapshots WHERE worker_id = ?", (worker_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
@@ -0,0 +1,78 @@
+"""
+Room-affinity routing between worker processes
+
+When a join_room / reconnect arrives for a room owned by another worker,
+the receiving worker opens a WebSocket to the owner and relays frames in
+both directions for the rest of the connection. The owner handles the
+proxied socket like any other client.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from directory import WorkerInfo
+
+logger = logging.getLogger(__name__)
+
+
+def upstream_url(owner: WorkerInfo, room_id: str) -> Optional[str]:
+    if not owner.url:
+        return None
+    return f"{owner.url.rstrip('/')}/ws/room/{room_id}"
+
+
+async def proxy_to_owner(websocket: WebSocket, owner: WorkerInfo, room_id: str, first_frame: dict) -> bool:
+    """
+    Relay an accepted client socket to the worker owning room_id
+
+    first_frame is the raw ASGI receive message that triggered routing; it is
+    forwarded before anything else. Returns False (without touching the
+    client socket) if the owner can't be reached.
+    """
+    url = upstream_url(owner, room_id)
+    if url is None:
+        return False
+
+    import websockets  # Only needed when running sharded
+
+    try:
+        upstream = await websockets.connect(url, max_size=None)
+    except (OSError, websockets.WebSocketException) as e:
+        logger.warning(f"Could not reach worker {owner.worker_id} for room {room_id}: {e}")
+        return False
+
+    async def client_to_upstream():
+        frame = first_frame
+        while True:
+            if frame["type"] == "websocket.disconnect":
+                return
+            if frame.get("bytes") is not None:
+                await upstream.send(frame["bytes"])
+            else:
+                await upstream.send(frame["text"])
+            frame = await websocket.receive()
+
+    async def upstream_to_client():
+        async for payload in upstream:
+            if isinstance(payload, bytes):
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+
+    tasks = [asyncio.create_task(client_to_upstream()), asyncio.create_task(upstream_to_client())]
+    try:
+        # Whichever side closes first ends the relay
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await upstream.close()
+        try:
+            await websocket.close()
+        except (RuntimeError, WebSocketDisconnect):
+            pass  # Client already gone
+    return True
@@ -0,0 +1,81 @@
+"""
+JSON serialization for the WebSocket hot path
+
+Every JSON frame in and out of a room goes through this module, so the
+backend can be swapped in one place:
+
+- "orjson": used when the orjson package is installed (several times faster
+  on state frames, encodes straight to UTF-8 bytes)
+- "json": the stdlib fallback, compact separators
+
+Outgoing JSON still goes out as a text frame - browsers hand binary frames to
+the packed protocol (protocol.py) - so the bytes are decoded once per
+broadcast, not once per recipient.
+
+Callers use the module attributes (serializer.loads, serializer.dumps_text)
+rather than importing the functions, so use_backend() applies everywhere.
+"""
+
+import json
+from typing import Callable, Dict, NamedTuple, Union
+
+from protocol import decode_message
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+
+class Backend(NamedTuple):
+    name: str
+    loads: Callable[[Union[str, bytes]], object]
+    dumps: Callable[[object], bytes]
+
+
+_json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return _json_encoder.encode(obj).encode("utf-8")
+
+
+BACKENDS: Dict[str, Backend] = {
+    "json": Backend("json", json.loads, _stdlib_dumps),
+}
+if orjson is not None:
+    # Non-str keys are allowed by the stdlib encoder too
+    BACKENDS["orjson"] = Backend("orjson", orjson.loads,
+                                 lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+
+# Both backends raise a subclass of this for malformed input
+DecodeError = json.JSONDecodeError
+
+backend: Backend
+loads: Callable[[Union[str, bytes]], object]
+dumps: Callable[[object], bytes]
+
+
+def dumps_text(obj) -> str:
+    """Serialize to the str a text frame carries"""
+    return dumps(obj).decode("utf-8")
+
+
+def use_backend(name: str):
+    """Switch the process-wide backend ("orjson" or "json")"""
+    global backend, loads, dumps
+    if name not in BACKENDS:
+        raise ValueError(f"JSON backend {name!r} is not available (have: {', '.join(BACKENDS)})")
+    backend = BACKENDS[name]
+    loads = backend.loads
+    dumps = backend.dumps
+
+
+def decode_frame(frame: dict) -> dict:
+    """Decode a raw ASGI websocket.receive message: packed binary or JSON text"""
+    if frame.get("bytes") is not None:
+        return decode_message(frame["bytes"])
+    return loads(frame["text"])
+
+
+use_backend("orjson" if "orjson" in BACKENDS else "json")
@@ -0,0 +1,126 @@
+"""
+Spatial index and area-of-interest filtering for rooms
+
+Levels are long and scroll horizontally, so entities are indexed in a
+uniform grid of columns keyed on x. A room created with an AOI window
+(aoi_width, optionally aoi_height, in pixels) only sends each client the
+enemies and coins inside the window centred on that client's player:
+
+- entity syncs carry just the entities in view
+- enemy state updates outside the window are skipped
+- an enemy that comes into view (because it or the player moved) is sent
+  in full as enemy_spawned, which clients already treat as "create or
+  resync this enemy"
+
+Positions are in the room's storage units (pixels, or centipixels in
+fixed-point rooms - GameRoom scales the window accordingly).
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+MIN_CELL_SIZE = 64.0
+
+
+class Window(NamedTuple):
+    x_min: float
+    x_max: float
+    y_min: Optional[float]  # None: no vertical limit
+    y_max: Optional[float]
+
+    def contains(self, x, y) -> bool:
+        if type(x) not in (int, float):
+            return True  # Entities without a position are never filtered out
+        if not self.x_min <= x <= self.x_max:
+            return False
+        if self.y_min is None or type(y) not in (int, float):
+            return True
+        return self.y_min <= y <= self.y_max
+
+
+class XGrid:
+    """Uniform grid of x columns: column -> IDs of the entities in it"""
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: Dict[int, Dict[str, None]] = {}  # Insertion-ordered sets
+        self.positions: Dict[str, tuple] = {}  # entity_id -> (column, x, y)
+        self.unplaced: Dict[str, None] = {}  # Entities without a numeric x, returned by every query
+
+    def __len__(self) -> int:
+        return len(self.positions) + len(self.unplaced)
+
+    def move(self, entity_id: str, x, y=None):
+        """Insert or move an entity"""
+        if type(x) not in (int, float):
+            self.remove(entity_id)
+            self.unplaced[entity_id] = None
+            return
+        self.unplaced.pop(entity_id, None)
+        column = int(x // self.cell_size)
+        previous = self.positions.get(entity_id)
+        if previous is not None and previous[0] != column:
+            self._leave(previous[0], entity_id)
+        if previous is None or previous[0] != column:
+            self.cells.setdefault(column, {})[entity_id] = None
+        self.positions[entity_id] = (column, x, y)
+
+    def remove(self, entity_id: str):
+        self.unplaced.pop(entity_id, None)
+        previous = self.positions.pop(entity_id, None)
+        if previous is not None:
+            self._leave(previous[0], entity_id)
+
+    def _leave(self, column: int, entity_id: str):
+        cell = self.cells[column]
+        del cell[entity_id]
+        if not cell:
+            del self.cells[column]
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+        self.unplaced.clear()
+
+    def query(self, window: Window) -> List[str]:
+        """IDs of the entities inside a window (only the overlapping columns are visited)"""
+        result = list(self.unplaced)
+        positions = self.positions
+        cells = self.cells
+        first = int(window.x_min // self.cell_size)
+        last = int(window.x_max // self.cell_size)
+        if last - first >= len(cells):
+            # Window wider than the occupied columns - walk those instead
+            columns = [column for column in cells if first <= column <= last]
+        else:
+            columns = [column for column in range(first, last + 1) if column in cells]
+        for column in columns:
+            for entity_id in cells[column]:
+                _, x, y = positions[entity_id]
+                if window.contains(x, y):
+                    result.append(entity_id)
+        return result
+
+
+class AreaOfInterest:
+    """View window size and the enemies each player currently has in view"""
+
+    def __init__(self, width: float, height: Optional[float] = None):
+        self.half_width = width / 2
+        self.half_height = height / 2 if height else None
+        # Columns about half a window wide: a query touches 2-3 of them
+        self.cell_size = max(MIN_CELL_SIZE, self.half_width)
+        self.in_view: Dict[str, Set[str]] = {}  # player_id -> enemy IDs sent while in view
+
+    def window(self, x: float, y: float) -> Window:
+        if self.half_height is None:
+            return Window(x - self.half_width, x + self.half_width, None, None)
+        return Window(x - self.half_width, x + self.half_width, y - self.half_height, y + self.half_height)
+
+    def view(self, player_id: str) -> Set[str]:
+        return self.in_view.setdefault(player_id, set())
+
+    def set_view(self, player_id: str, enemy_ids: Iterable[str]):
+        self.in_view[player_id] = set(enemy_ids)
+
+    def forget(self, player_id: str):
+        self.in_view.pop(player_id, None)
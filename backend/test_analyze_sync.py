@@ -0,0 +1,236 @@
+"""
+Tests for batch mode in analyze_sync.py
+Run with: pytest test_analyze_sync.py -v
+"""
+
+import gzip
+from datetime import datetime, timedelta
+
+import pytest
+
+import analyze_sync
+
+START = datetime(2025, 12, 3, 10, 15, 30)
+
+
+def line(seconds, room_id, event_type, details):
+    """A game_state.log line, seconds after START"""
+    ts = START.timestamp() + seconds
+    asctime = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") + f",{round(ts % 1 * 1000):03d}"
+    return f"{asctime} - [ROOM:{room_id}] [{event_type}] {details}\n"
+
+
+# Rotated set, oldest first. The anomalies all need state from an earlier file.
+FILES = [
+    ("game_state.log.2.gz", [
+        line(0.0, "R1", "COIN_SPAWN", "ID:coin_1 Pos:(100.0, 100.0)"),
+        line(0.1, "R1", "COIN_SPAWN", "ID:coin_2 Pos:(1000.0, 100.0)"),
+        line(0.3, "R2", "PLAYER_STATE", "Player:p2 Pos:(0.0, 0.0)"),
+        line(0.9, "R1", "PLAYER_STATE", "Player:p1 Pos:(100.0, 100.0)"),
+    ]),
+    ("game_state.log.1", [
+        # Teleport relative to the previous file's position
+        line(1.0, "R1", "PLAYER_STATE", "Player:p1 Pos:(900.0, 100.0)"),
+        # Item from the previous file, far from the player's current position
+        line(1.1, "R1", "ITEM_COLLECT", "Player:p1 Type:coin ID:coin_1"),
+        line(1.2, "R2", "COIN_SPAWN", "ID:coin_3 Pos:(500.0, 500.0)"),
+        # Player position only known from the previous file
+        line(1.3, "R2", "ITEM_COLLECT", "Player:p2 Type:coin ID:coin_3"),
+    ]),
+    ("game_state.log", [
+        line(2.0, "R1", "ITEM_COLLECT", "Player:p1 Type:coin ID:coin_2"),
+        line(2.1, "R1", "PLAYER_STATE", "Player:p1 Pos:(905.0, 100.0)"),
+        line(2.2, "R2", "PLAYER_STATE", "Player:p2 Pos:(0.0, 10.0)"),
+    ]),
+]
+
+
+@pytest.fixture
+def rotated_logs(tmp_path, monkeypatch):
+    """FILES written to tmp_path, the .gz one compressed"""
+    monkeypatch.setattr(analyze_sync, "ANALYSIS_LOG_FILE", str(tmp_path / "sync_analysis.log"))
+    for name, lines in FILES:
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(tmp_path / name, "wt") as f:
+            f.writelines(lines)
+    return tmp_path
+
+
+@pytest.fixture
+def quiet(tmp_path, monkeypatch):
+    monkeypatch.setattr(analyze_sync, "ANALYSIS_LOG_FILE", str(tmp_path / "sync_analysis.log"))
+
+
+def move(room, pid, moves):
+    """PLAYER_STATE events for (seconds after START, x, y)"""
+    for seconds, x, y in moves:
+        analyze_sync.apply_event(room, START + timedelta(seconds=seconds), "PLAYER_STATE", pid, x, y)
+
+
+def walk(start, steps, x=0.0, step=10.0, dt=0.1):
+    """Steady movement along x: step pixels every dt seconds"""
+    return [(start + i * dt, x + i * step, 0.0) for i in range(steps)]
+
+
+def jitter(start, steps, x=0.0):
+    """Position flipping back and forth by 5px"""
+    return [(start + i * 0.1, x + 5.0 * (i % 2), 0.0) for i in range(steps)]
+
+
+def report(rooms):
+    return {room_id: [(a["timestamp"], a["severity"], a["message"]) for a in room.anomalies]
+            for room_id, room in rooms.items()}
+
+
+class TestParsing:
+    """Timestamps, file order and gzip"""
+
+    def test_parse_timestamp_matches_strptime(self):
+        """Test that the cached parse gives the same datetime as a full strptime"""
+        for ts_str in ("2025-12-03 10:15:30,123", "2025-12-03 10:15:30,007", "2025-12-31 23:59:59,999"):
+            assert analyze_sync.parse_timestamp(ts_str) == datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S,%f")
+
+    def test_rotation_order(self):
+        """Test that higher rotation numbers sort first and the live file last"""
+        files = ["game_state.log", "game_state.log.1", "game_state.log.10.gz", "game_state.log.2.gz"]
+        assert sorted(files, key=analyze_sync.rotation_order) == [
+            "game_state.log.10.gz", "game_state.log.2.gz", "game_state.log.1", "game_state.log"]
+
+    def test_open_log_reads_gzip(self, rotated_logs):
+        """Test that gzip'd logs are read as text"""
+        with analyze_sync.open_log(str(rotated_logs / "game_state.log.2.gz")) as f:
+            assert f.readlines() == FILES[0][1]
+
+
+class TestBatch:
+    """Parallel per-file analysis merged per room"""
+
+    def test_same_report_as_sequential(self, rotated_logs):
+        """Test that the merged result equals reading the files one after the other"""
+        sequential = {}
+        for name, _ in FILES:
+            analyze_sync.read_text_log(str(rotated_logs / name), sequential)
+
+        files, rooms = analyze_sync.analyze_batch(str(rotated_logs / "game_state.log*"), workers=2)
+
+        assert [f.rsplit("/", 1)[-1] for f in files] == [name for name, _ in FILES]
+        assert report(rooms) == report(sequential)
+        assert [severity for _, severity, _ in report(rooms)["R1"]] == ["SUSPICIOUS", "CRITICAL"]
+        assert [severity for _, severity, _ in report(rooms)["R2"]] == ["CRITICAL"]
+        assert {pid: (p.x, p.y) for pid, p in rooms["R1"].players.items()} == {"p1": (905.0, 100.0)}
+
+    def test_partial_rooms_stay_quiet(self, rotated_logs):
+        """Test that a worker records unresolved events instead of guessing"""
+        rooms = analyze_sync.analyze_file(str(rotated_logs / "game_state.log.1"))
+        assert rooms["R1"].anomalies == []
+        assert [event[1] for event in rooms["R1"].unresolved] == ["PLAYER_STATE", "ITEM_COLLECT"]
+
+
+class TestCollect:
+    """Collection distance check"""
+
+    def test_logged_position_used(self, tmp_path, quiet):
+        """Test that the position logged with ITEM_COLLECT is checked, not the last (sampled) PLAYER_STATE"""
+        path = tmp_path / "game_state.log"
+        path.write_text("".join([
+            line(0.0, "R1", "COIN_SPAWN", "ID:coin_1 Pos:(100.0, 100.0)"),
+            line(0.1, "R1", "COIN_SPAWN", "ID:coin_2 Pos:(900.0, 100.0)"),
+            line(0.2, "R1", "PLAYER_STATE", "Player:p1 Pos:(900.0, 100.0)"),
+            # The PLAYER_STATE lines on the way to coin_1 were sampled out
+            line(0.5, "R1", "ITEM_COLLECT", "Player:p1 Type:coin ID:coin_1 Pos:(100.0, 100.0)"),
+            line(0.6, "R1", "ITEM_COLLECT", "Player:p1 Type:coin ID:coin_2 Pos:(100.0, 100.0)"),
+        ]))
+        rooms = {}
+        analyze_sync.read_text_log(str(path), rooms)
+        assert [a["message"].split(" but")[0] for a in rooms["R1"].anomalies] == [
+            "SYNC ERROR: Player p1 collected coin coin_2"]
+
+    def test_logged_position_resolved_within_file(self, tmp_path, quiet):
+        """Test that a batch worker checks a collection with a logged position without the player's earlier state"""
+        path = tmp_path / "game_state.log"
+        path.write_text("".join([
+            line(0.0, "R1", "COIN_SPAWN", "ID:coin_1 Pos:(100.0, 100.0)"),
+            line(0.5, "R1", "ITEM_COLLECT", "Player:p1 Type:coin ID:coin_1 Pos:(800.0, 100.0)"),
+        ]))
+        rooms = analyze_sync.analyze_file(str(path))
+        assert rooms["R1"].unresolved == []
+        assert [a["severity"] for a in rooms["R1"].anomalies] == ["CRITICAL"]
+
+
+class TestPositionHistory:
+    """Ring buffer and rolling figures"""
+
+    def test_bounded(self):
+        """Test that only the last size updates are kept, oldest first"""
+        history = analyze_sync.PositionHistory(4)
+        for i in range(1000):
+            history.append(float(i), float(i), 0.0)
+        assert len(history) == 4 and history.full()
+        assert [t for t, _, _ in history] == [996.0, 997.0, 998.0, 999.0]
+
+    def test_rolling_figures_only_depend_on_the_ring(self):
+        """Test that a long-running history agrees with one holding just the same updates"""
+        updates = [(i * 0.1, (i * 37) % 50 + (i % 3) * 4.0, (i * 11) % 7) for i in range(500)]
+        long, short = analyze_sync.PositionHistory(16), analyze_sync.PositionHistory(16)
+        for update in updates:
+            long.append(*update)
+        for update in updates[-16:]:
+            short.append(*update)
+        assert long.mean_speed() == short.mean_speed()
+        assert long.max_acceleration() == short.max_acceleration()
+        assert long.reversal_count() == short.reversal_count()
+
+    def test_mean_speed(self):
+        """Test that the rolling speed is measured between updates in the window"""
+        history = analyze_sync.PositionHistory(8)
+        for t, x, y in walk(0.0, 20):
+            history.append(t, x, y)
+        assert history.mean_speed() == pytest.approx(100.0)
+        assert history.max_acceleration() == pytest.approx(0.0, abs=1e-6)
+
+
+class TestHeuristics:
+    """Teleport and jitter checks on the rolling window"""
+
+    def test_teleport_under_speed_threshold(self, quiet):
+        """Test that a jump far beyond the recent speed is reported even below MAX_SPEED_THRESHOLD"""
+        room = analyze_sync.GameRoom("R1")
+        move(room, "p1", walk(0.0, 12) + [(1.6, 610.0, 0.0)])  # 500px in 0.5s after walking at 100px/s
+        assert [(a["severity"], a["message"].split(":")[0]) for a in room.anomalies] == [
+            ("SUSPICIOUS", "Player p1 teleported")]
+
+    def test_steady_movement_not_reported(self, quiet):
+        """Test that fast but steady movement isn't a teleport"""
+        room = analyze_sync.GameRoom("R1")
+        move(room, "p1", walk(0.0, 50, step=150.0))  # 1500px/s throughout
+        assert room.anomalies == []
+
+    def test_jitter_reported_once(self, quiet):
+        """Test that back-and-forth movement is reported when it starts, not on every update"""
+        room = analyze_sync.GameRoom("R1")
+        move(room, "p1", walk(0.0, 10) + jitter(1.0, 40, x=90.0))
+        assert [a["message"].split(":")[0] for a in room.anomalies] == ["Player p1 is jittering"]
+
+    def test_batch_matches_sequential_across_files(self, tmp_path, quiet, monkeypatch):
+        """Test that rolling checks right after a file boundary give the same report in batch mode"""
+        monkeypatch.setattr(analyze_sync, "HISTORY_SIZE", 8)
+        files = [
+            walk(0.0, 10),
+            [(1.5, 590.0, 0.0)] + walk(1.6, 3, x=600.0) + jitter(2.0, 6, x=620.0),
+            jitter(2.6, 4, x=620.0) + walk(3.0, 12, x=700.0) + [(4.5, 1300.0, 0.0)],
+        ]
+        for index, moves in enumerate(files):
+            name = "game_state.log" + (f".{len(files) - 1 - index}" if index < len(files) - 1 else "")
+            with open(tmp_path / name, "w") as f:
+                for seconds, x, y in moves:
+                    f.write(line(seconds, "R1", "PLAYER_STATE", f"Player:p1 Pos:({x}, {y})"))
+
+        sequential = {}
+        for name in ("game_state.log.2", "game_state.log.1", "game_state.log"):
+            analyze_sync.read_text_log(str(tmp_path / name), sequential)
+        _, rooms = analyze_sync.analyze_batch(str(tmp_path / "game_state.log*"), workers=2)
+
+        assert report(rooms) == report(sequential)
+        assert sorted({message.split(":")[0] for _, _, message in report(rooms)["R1"]}) == [
+            "Player p1 is jittering", "Player p1 teleported"]
+        assert list(rooms["R1"].players["p1"].history) == list(sequential["R1"].players["p1"].history)
@@ -0,0 +1,135 @@
+"""
+Tests for the response cache and ETag handling
+Run with: pytest test_cache.py -v
+"""
+
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from cache import ResponseCache, etag_matches
+from main import app, API_KEY
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def valid_headers():
+    return {"X-API-Key": API_KEY}
+
+
+class TestResponseCache:
+    """TTL, LRU and invalidation"""
+
+    def test_entries_expire(self):
+        """Test that an entry is gone after its TTL"""
+        cache = ResponseCache(ttl=0.05)
+        cache.put(("bosses",), b"[]")
+        assert cache.get(("bosses",)).body == b"[]"
+        time.sleep(0.06)
+        assert cache.get(("bosses",)) is None
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the cache stays within max_entries"""
+        cache = ResponseCache(max_entries=2)
+        cache.put(("leaderboard", 1), b"1")
+        cache.put(("leaderboard", 2), b"2")
+        cache.get(("leaderboard", 1))
+        cache.put(("leaderboard", 3), b"3")
+        assert cache.get(("leaderboard", 2)) is None
+        assert cache.get(("leaderboard", 1)) is not None
+
+    def test_invalidate_by_endpoint(self):
+        """Test that invalidation only drops the given endpoint"""
+        cache = ResponseCache()
+        cache.put(("leaderboard", 10, None), b"[]")
+        cache.put(("leaderboard", 10, "levels"), b"[]")
+        cache.put(("bosses",), b"[]")
+        cache.invalidate("leaderboard")
+        assert cache.get(("leaderboard", 10, None)) is None
+        assert cache.get(("leaderboard", 10, "levels")) is None
+        assert cache.get(("bosses",)) is not None
+
+    def test_build_overtaken_by_invalidation_not_stored(self):
+        """Test that a body built before an invalidation isn't cached after it"""
+        cache = ResponseCache()
+        key = ("leaderboard", 10, None)
+        generation = cache.generation(key)
+        cache.invalidate("leaderboard")  # A score was submitted while the body was being built
+        assert cache.put(key, b"[]", generation=generation).body == b"[]"
+        assert cache.get(key) is None
+
+        cache.invalidate("bosses")
+        cache.put(key, b"[]", generation=cache.generation(key))
+        assert cache.get(key) is not None
+
+    def test_etag_matching(self):
+        """Test If-None-Match parsing"""
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('"x", W/"abc"', '"abc"')
+        assert etag_matches("*", '"abc"')
+        assert not etag_matches('"x"', '"abc"')
+        assert not etag_matches(None, '"abc"')
+
+
+class TestCachedEndpoints:
+    """ETag / 304 behaviour of the cached endpoints"""
+
+    def test_bosses_not_modified(self, client, valid_headers):
+        """Test that a matching If-None-Match gets a 304 with no body"""
+        response = client.get("/api/bosses", headers=valid_headers)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        response = client.get("/api/bosses", headers={**valid_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_cached_endpoints_revalidate(self, client, valid_headers):
+        """Test that cached endpoints let clients keep the body (no-cache without no-store)"""
+        for url in ("/api/bosses", "/api/scores/leaderboard"):
+            response = client.get(url, headers=valid_headers)
+            assert response.headers["cache-control"] == "private, no-cache"
+            assert "pragma" not in response.headers
+
+            response = client.get(url, headers={**valid_headers, "If-None-Match": response.headers["etag"]})
+            assert response.status_code == 304
+            assert response.headers["cache-control"] == "private, no-cache"
+
+    def test_bosses_served_without_database(self, client, valid_headers):
+        """Test that a cached body is served without touching SQLite"""
+        first = client.get("/api/bosses", headers=valid_headers)
+        with patch('main.db_pool.connection', side_effect=Exception("Database error")):
+            second = client.get("/api/bosses", headers=valid_headers)
+        assert second.status_code == 200
+        assert second.content == first.content
+
+    def test_submit_score_invalidates_leaderboard(self, client, valid_headers):
+        """Test that a new score changes the leaderboard ETag"""
+        url = "/api/scores/leaderboard?limit=1000&game_mode=cache_test"
+        before = client.get(url, headers=valid_headers)
+        assert before.status_code == 200
+
+        client.post("/api/scores", headers=valid_headers, json={
+            "player_name": "CacheTest",
+            "score": 4242,
+            "coins": 0,
+            "enemies_defeated": 0,
+            "distance": 0,
+            "level": 1,
+            "game_mode": "cache_test"
+        })
+
+        after = client.get(url, headers={**valid_headers, "If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert after.headers["etag"] != before.headers["etag"]
+        assert any(entry["player_name"] == "CacheTest" for entry in after.json())
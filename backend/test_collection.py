@@ -0,0 +1,161 @@
+"""
+Tests for server-side item collection checks (collection.py)
+Run with: pytest test_collection.py -v
+"""
+
+import asyncio
+
+import collection
+import game_log
+from collection import (DROP_LEEWAY, TOO_FAR, UNKNOWN, VALID, CollectionStats, ItemHash,
+                        collection_outcome)
+from handlers import Connection, dispatcher
+from quantize import FixedPoint
+from rooms import GameRoom
+from test_rooms import FakeWebSocket
+
+
+async def collect_far_coin(conn):
+    """Host room with a coin spawned far from the host's start position (400, 550), then collect it"""
+    await dispatcher.dispatch(conn, {"type": "create_room", "player_id": "host"})
+    await dispatcher.dispatch(conn, {"type": "coin_spawn", "coin": {"coin_id": "c1", "x": 2000.0, "y": 550.0}})
+    await dispatcher.dispatch(conn, {"type": "collect_item", "item_type": "coin", "item_id": "c1"})
+    await conn.room.drain()
+
+
+class TestCollectionOutcome:
+    """Tolerance rules shared with analyze_sync.py"""
+
+    def test_within_reach(self):
+        """Test that claims within MAX_COLLECTION_DISTANCE are valid"""
+        assert collection_outcome("coin_1", 100, 100, 200, 100) == (VALID, 100.0)
+
+    def test_too_far(self):
+        """Test that claims out of reach are reported with their distance"""
+        outcome, distance = collection_outcome("coin_1", 0, 0, 300, 400)
+        assert outcome == TOO_FAR and distance == 500.0
+
+    def test_dropped_coin_leeway_below_spawn(self):
+        """Test that dropped coins can be collected well below where they spawned, but not above"""
+        assert collection_outcome("coin_drop_1_2_0", 100, 650, 100, 300)[0] == DROP_LEEWAY
+        assert collection_outcome("coin_drop_1_2_0", 100, 750, 100, 300)[0] == TOO_FAR
+        assert collection_outcome("coin_drop_1_2_0", 100, 0, 100, 300)[0] == TOO_FAR
+        assert collection_outcome("coin_1", 100, 650, 100, 300)[0] == TOO_FAR
+
+
+class TestItemHash:
+    """Spatial hash of item spawn positions"""
+
+    def test_check_and_remove(self):
+        """Test that known items are checked and removed ones become unknown"""
+        items = ItemHash()
+        items.add("c1", 10.0, 10.0)
+        assert items.check("c1", 20.0, 10.0) == (VALID, 10.0)
+        items.remove("c1")
+        assert items.check("c1", 20.0, 10.0) == (UNKNOWN, 0.0)
+        assert items.cells == {}
+
+    def test_near_returns_neighbouring_cells(self):
+        """Test that near() finds items in the surrounding cells only"""
+        items = ItemHash(100)
+        items.add("a", 50, 50)
+        items.add("b", 190, 120)
+        items.add("c", 900, 50)
+        assert sorted(items.near(60, 60)) == ["a", "b"]
+
+    def test_stats(self):
+        """Test that outcomes are counted and the furthest miss kept"""
+        stats = CollectionStats()
+        stats.record(VALID, 3.0)
+        stats.record(TOO_FAR, 420.0)
+        stats.record(TOO_FAR, 200.0)
+        data = stats.to_dict()
+        assert data[VALID] == 1 and data[TOO_FAR] == 2 and data["max_distance"] == 420.0
+
+
+class TestCollectItemHandler:
+    """collect_item checked against the collector's last known position"""
+
+    def test_monitor_mode_accepts_and_counts(self, monkeypatch):
+        """Test that monitor mode still accepts far claims but counts them"""
+        monkeypatch.setattr(collection, "mode", collection.MONITOR)
+        monkeypatch.setattr(collection, "stats", CollectionStats())
+
+        async def scenario():
+            conn = Connection(FakeWebSocket(), "new")
+            await collect_far_coin(conn)
+            assert conn.websocket.messages("item_collected")[0]["item_id"] == "c1"
+            assert "c1" not in conn.room.items
+            await dispatcher.dispatch(conn, {"type": "leave_room"})
+
+        asyncio.run(scenario())
+        assert collection.stats.counts[TOO_FAR] == 1
+
+    def test_enforce_mode_rejects(self, monkeypatch):
+        """Test that enforce mode refuses far claims and leaves the item collectable"""
+        monkeypatch.setattr(collection, "mode", collection.ENFORCE)
+        monkeypatch.setattr(collection, "stats", CollectionStats())
+
+        async def scenario():
+            conn = Connection(FakeWebSocket(), "new")
+            await collect_far_coin(conn)
+            assert conn.websocket.messages("item_collected") == []
+            assert conn.websocket.messages("item_collect_rejected")[0]["reason"] == TOO_FAR
+            assert not conn.room.is_item_collected("coin", "c1")
+
+            # Walk over to it and try again
+            await dispatcher.dispatch(conn, {"type": "player_state", "state": {"x": 1990.0, "y": 540.0}})
+            await dispatcher.dispatch(conn, {"type": "collect_item", "item_type": "coin", "item_id": "c1"})
+            await conn.room.drain()
+            assert conn.websocket.messages("item_collected")[0]["item_id"] == "c1"
+            await dispatcher.dispatch(conn, {"type": "leave_room"})
+
+        asyncio.run(scenario())
+        assert collection.stats.counts[collection.REJECTED] == 1
+        assert collection.stats.counts[VALID] == 1
+
+    def test_collection_logged_with_position(self, monkeypatch):
+        """Test that ITEM_COLLECT carries the collector's position for analyze_sync"""
+        events = []
+        monkeypatch.setattr(game_log, "event",
+                            lambda event_type, room_id, fmt, *args, **kwargs: events.append((event_type, fmt % args)))
+
+        async def scenario():
+            conn = Connection(FakeWebSocket(), "new")
+            await collect_far_coin(conn)
+            await dispatcher.dispatch(conn, {"type": "leave_room"})
+
+        asyncio.run(scenario())
+        assert ("ITEM_COLLECT", "Player:host Type:coin ID:c1 Pos:(400.0, 550.0)") in events
+
+    def test_unknown_items_accepted(self, monkeypatch):
+        """Test that items the server never saw spawn are let through as unknown"""
+        monkeypatch.setattr(collection, "mode", collection.ENFORCE)
+        monkeypatch.setattr(collection, "stats", CollectionStats())
+
+        async def scenario():
+            conn = Connection(FakeWebSocket(), "new")
+            await dispatcher.dispatch(conn, {"type": "create_room", "player_id": "host"})
+            await dispatcher.dispatch(conn, {"type": "collect_item", "item_type": "coin", "item_id": "level_coin_7"})
+            await conn.room.drain()
+            assert conn.websocket.messages("item_collected")[0]["item_id"] == "level_coin_7"
+            await dispatcher.dispatch(conn, {"type": "leave_room"})
+
+        asyncio.run(scenario())
+        assert collection.stats.counts[UNKNOWN] == 1
+
+    def test_fixed_point_room_checks_in_pixels(self):
+        """Test that fixed-point storage doesn't change the distances"""
+        room = GameRoom("ROOM01", "Room", "host", fixed_point=FixedPoint(1000.0, 0.0))
+        room.spawn_coin(room.ingest_state({"coin_id": "c1", "x": 1500.0, "y": 200.0}))
+        assert room.items.get("c1") == (1500.0, 200.0)
+
+    def test_checkpoint_restores_items(self):
+        """Test that uncollected items are indexed again after a restore"""
+        room = GameRoom("ROOM01", "Room", "host")
+        room.spawn_coin({"coin_id": "c1", "x": 10.0, "y": 20.0})
+        room.spawn_powerup({"powerup_id": "p1", "x": 30.0, "y": 40.0})
+        room.spawn_coin({"coin_id": "c2", "x": 50.0, "y": 60.0})
+        room.mark_item_collected("coin", "c2", "host")
+        restored = GameRoom.from_snapshot(room.to_snapshot())
+        assert restored.items.positions == {"c1": (10.0, 20.0), "p1": (30.0, 40.0)}
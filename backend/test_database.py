@@ -0,0 +1,151 @@
+"""
+Tests for the SQLite pool, schema migrations and query plans
+Run with: pytest test_database.py -v
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from database import SCHEMA_MIGRATIONS, ChangeWatcher, ConnectionPool, migrate
+
+
+@pytest.fixture
+def pool():
+    """Pool on a throwaway, fully migrated database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "test.db"), size=2)
+        with pool.connection() as conn:
+            migrate(conn)
+        yield pool
+        pool.close()
+
+
+def query_plan(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN details as one string"""
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+class TestConnectionPool:
+    """Connection reuse and pragmas"""
+
+    def test_connections_are_reused(self, pool):
+        """Test that a released connection is handed out again"""
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            assert second is first
+
+    def test_wal_mode_enabled(self, pool):
+        """Test that pooled connections use the WAL journal"""
+        with pool.connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_open_transaction_rolled_back_on_release(self, pool):
+        """Test that uncommitted writes don't leak into the next request"""
+        with pool.connection() as conn:
+            conn.execute("""
+                INSERT INTO scores (player_name, score, coins, enemies_defeated, distance, level, game_mode)
+                VALUES ('Ghost', 1, 0, 0, 0, 1, 'levels')
+            """)
+        with pool.connection() as conn:
+            assert not conn.in_transaction
+            assert conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0] == 0
+
+
+class TestChangeWatcher:
+    """Commits from other connections"""
+
+    def test_reports_other_connections_commits_once(self, pool):
+        """Test that a commit through another connection is reported on the next check only"""
+        watcher = ChangeWatcher(pool.db_path, interval=0)
+        assert not watcher.changed()
+        with pool.connection() as conn:
+            conn.execute("""
+                INSERT INTO scores (player_name, score, coins, enemies_defeated, distance, level, game_mode)
+                VALUES ('Other', 1, 0, 0, 0, 1, 'levels')
+            """)
+            conn.commit()
+        assert watcher.changed()
+        assert not watcher.changed()
+        watcher.close()
+
+
+class TestMigrations:
+    """PRAGMA user_version based schema migrations"""
+
+    def test_fresh_database_reaches_latest_version(self, pool):
+        """Test that migrate applies every migration"""
+        with pool.connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == len(SCHEMA_MIGRATIONS)
+            # Running again is a no-op
+            assert migrate(conn) == len(SCHEMA_MIGRATIONS)
+
+    def test_unversioned_database_is_upgraded(self):
+        """Test that a database created before versioning gets the new indexes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = ConnectionPool(os.path.join(tmp, "legacy.db"), size=1)
+            with pool.connection() as conn:
+                # Legacy init_db: tables and idx_score_desc only, user_version 0
+                for statement in SCHEMA_MIGRATIONS[0]:
+                    conn.execute(statement)
+                conn.commit()
+
+                assert migrate(conn) == len(SCHEMA_MIGRATIONS)
+                indexes = {row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'scores'")}
+            pool.close()
+
+        assert {"idx_score_desc", "idx_scores_mode_score", "idx_scores_player_score"} <= indexes
+
+    def test_failed_migration_is_rolled_back(self, pool):
+        """Test that a broken migration leaves the version untouched"""
+        broken = SCHEMA_MIGRATIONS + (("CREATE TABLE extra (id INTEGER)", "NOT VALID SQL"),)
+        with pool.connection() as conn:
+            with pytest.raises(Exception):
+                migrate(conn, broken)
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == len(SCHEMA_MIGRATIONS)
+            assert conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'extra'").fetchone()[0] == 0
+
+
+class TestQueryPlans:
+    """Regression checks that score lookups use an index instead of scanning"""
+
+    def test_player_high_score_uses_player_index(self, pool):
+        """Test get_player_high_score's query"""
+        with pool.connection() as conn:
+            plan = query_plan(conn, """
+                SELECT id, player_name, score, coins, enemies_defeated, distance, level, game_mode, created_at
+                FROM scores
+                WHERE player_name = ?
+                ORDER BY score DESC
+                LIMIT 1
+            """, ("Player",))
+        assert "idx_scores_player_score" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_mode_leaderboard_uses_mode_index(self, pool):
+        """Test the per-mode top-N query"""
+        with pool.connection() as conn:
+            plan = query_plan(conn, """
+                SELECT id, player_name, score, coins, enemies_defeated, distance, level, game_mode, created_at
+                FROM scores
+                WHERE game_mode = ?
+                ORDER BY score DESC
+                LIMIT ?
+            """, ("levels", 10))
+        assert "idx_scores_mode_score" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_mode_rank_count_is_covered(self, pool):
+        """Test the per-mode rank count is answered from the index alone"""
+        with pool.connection() as conn:
+            plan = query_plan(conn, """
+                SELECT COUNT(*) + 1
+                FROM scores
+                WHERE score > ? AND game_mode = ?
+            """, (100, "levels"))
+        assert "COVERING INDEX idx_scores_mode_score" in plan
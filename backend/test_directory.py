@@ -0,0 +1,132 @@
+"""
+Tests for the room directory used to shard rooms across workers
+Run with: pytest test_directory.py -v
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+from directory import FileRoomDirectory, LocalRoomDirectory, WorkerInfo
+from rooms import RoomManager
+from test_rooms import FakeWebSocket
+
+WORKER_A = WorkerInfo("a", "ws://127.0.0.1:8001")
+WORKER_B = WorkerInfo("b", "ws://127.0.0.1:8002")
+
+
+@pytest.fixture
+def directory_path():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield os.path.join(tmp, "rooms.json")
+
+
+class TestDirectories:
+    """Claim / lookup / listing semantics shared by both implementations"""
+
+    @pytest.fixture(params=["local", "file"])
+    def directory(self, request, directory_path):
+        if request.param == "local":
+            return LocalRoomDirectory()
+        return FileRoomDirectory(directory_path)
+
+    def test_claim_is_exclusive(self, directory):
+        """Test that a room_id can only be owned by one worker"""
+        assert directory.claim("ROOM01", WORKER_A)
+        assert not directory.claim("ROOM01", WORKER_B)
+        assert directory.lookup("ROOM01") == WORKER_A
+
+    def test_release_only_by_owner(self, directory):
+        """Test that another worker can't release a room it doesn't own"""
+        directory.claim("ROOM01", WORKER_A)
+        directory.release("ROOM01", WORKER_B)
+        assert directory.lookup("ROOM01") == WORKER_A
+        directory.release("ROOM01", WORKER_A)
+        assert directory.lookup("ROOM01") is None
+
+    def test_listings_exclude_own_worker(self, directory):
+        """Test that list_rooms merges other workers' published rooms"""
+        directory.publish(WORKER_A, [{"room_id": "ROOM01"}])
+        directory.publish(WORKER_B, [{"room_id": "ROOM02"}])
+        assert [room["room_id"] for room in directory.list_rooms(exclude_worker="a")] == ["ROOM02"]
+        assert len(directory.list_rooms()) == 2
+
+
+class TestFileRoomDirectory:
+    """Behaviour specific to the shared file directory"""
+
+    def test_dead_worker_rooms_are_dropped(self, directory_path):
+        """Test that rooms of a worker that stopped publishing can't be routed to"""
+        directory = FileRoomDirectory(directory_path, worker_ttl=0.05)
+        directory.claim("ROOM01", WORKER_A)
+        directory.publish(WORKER_A, [{"room_id": "ROOM01"}])
+        time.sleep(0.06)
+
+        assert directory.lookup("ROOM01") is None
+        assert directory.list_rooms() == []
+        # Its room_ids become available again
+        assert directory.claim("ROOM01", WORKER_B)
+
+    def test_instances_share_state(self, directory_path):
+        """Test that two directory objects (as in two processes) see each other's claims"""
+        FileRoomDirectory(directory_path).claim("ROOM01", WORKER_A)
+        assert FileRoomDirectory(directory_path).lookup("ROOM01") == WORKER_A
+
+
+class TestShardedRoomManager:
+    """RoomManager with a directory shared between workers"""
+
+    def test_rooms_visible_and_routable_across_workers(self, directory_path):
+        """Test that worker b lists and locates a room created on worker a"""
+        async def scenario():
+            manager_a = RoomManager(FileRoomDirectory(directory_path), WORKER_A)
+            manager_b = RoomManager(FileRoomDirectory(directory_path), WORKER_B)
+            room = await manager_a.create_room("Room", "host", "Host", FakeWebSocket())
+            await manager_a.flush_directory()
+
+            assert await manager_b.locate(room.room_id) == WORKER_A
+            assert await manager_a.locate(room.room_id) is None  # Local room, no routing
+            assert [info["room_id"] for info in manager_b.get_available_rooms()] == [room.room_id]
+
+            await manager_a.leave_room(room.room_id, "host")
+            await manager_a.flush_directory()
+            assert await manager_b.locate(room.room_id) is None
+            assert manager_b.get_all_rooms() == []
+
+        asyncio.run(scenario())
+
+    def test_local_directory_never_routes(self):
+        """Test that the default single-process setup keeps everything local"""
+        manager = RoomManager()
+        assert asyncio.run(manager.locate("ROOM01")) is None
+
+    def test_publisher_writes_off_the_event_loop(self, directory_path, monkeypatch):
+        """Test that room changes reach the directory from the background publisher, not the caller"""
+        directory = FileRoomDirectory(directory_path)
+        threads = set()
+        publish = directory.publish
+
+        def recording_publish(worker, rooms):
+            threads.add(threading.get_ident())
+            publish(worker, rooms)
+
+        monkeypatch.setattr(directory, "publish", recording_publish)
+
+        async def scenario():
+            manager = RoomManager(directory, WORKER_A)
+            room = await manager.create_room("Room", "host", "Host", FakeWebSocket())
+            for _ in range(100):
+                if FileRoomDirectory(directory_path).list_rooms():
+                    break
+                await asyncio.sleep(0.01)
+            assert [info["room_id"] for info in FileRoomDirectory(directory_path).list_rooms()] == [room.room_id]
+            await manager.leave_room(room.room_id, "host")
+            await manager._publisher_task
+            assert FileRoomDirectory(directory_path).lookup(room.room_id) is None
+
+        asyncio.run(scenario())
+        assert threads and threading.get_ident() not in threads
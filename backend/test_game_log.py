@@ -0,0 +1,143 @@
+"""
+Tests for queue-backed game_state logging (game_log.py)
+Run with: pytest test_game_log.py -v
+"""
+
+import logging
+import queue
+import re
+
+import pytest
+
+import game_log
+from game_log import BatchingFileHandler, NonBlockingQueueHandler
+
+
+class CountingStr:
+    """Argument that records when it is turned into a string"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "counted"
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """Records reaching game_logger, unformatted"""
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = game_log.game_logger
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    monkeypatch.setattr(game_log, "_seen", {})
+    monkeypatch.setattr(game_log, "stats", game_log.GameLogStats())
+    yield records
+    logger.removeHandler(handler)
+    logger.setLevel(level)
+
+
+class TestSampling:
+    """1-in-N sampling per event type"""
+
+    def test_one_in_n(self, captured, monkeypatch):
+        """Test that a sampled type logs every Nth event, starting with the first"""
+        monkeypatch.setattr(game_log, "SAMPLING", {"PLAYER_STATE": 4})
+        for i in range(10):
+            game_log.event("PLAYER_STATE", "ROOM01", "Player:%s Pos:(%s, %s)", "p1", i, 0)
+        assert [r.args[3] for r in captured] == [0, 4, 8]
+        assert game_log.stats.sampled_out == 7
+
+    def test_unlisted_types_always_logged(self, captured, monkeypatch):
+        """Test that events without a sampling rate are never skipped"""
+        monkeypatch.setattr(game_log, "SAMPLING", {"PLAYER_STATE": 4})
+        for _ in range(3):
+            game_log.event("ITEM_COLLECT", "ROOM01", "Player:%s Type:%s ID:%s", "p1", "coin", "c1")
+        assert len(captured) == 3
+        assert captured[0].getMessage() == "[ROOM:ROOM01] [ITEM_COLLECT] Player:p1 Type:coin ID:c1"
+
+    def test_sampled_out_never_formatted(self, captured, monkeypatch):
+        """Test that no string is built for skipped events"""
+        monkeypatch.setattr(game_log, "SAMPLING", {"ENEMY_STATE": 0})
+        arg = CountingStr()
+        game_log.event("ENEMY_STATE", "ROOM01", "Enemy:%s", arg)
+        assert captured == [] and arg.calls == 0
+
+    def test_sampling_from_env(self, monkeypatch):
+        """Test that GAME_LOG_SAMPLING overrides the defaults and skips malformed entries"""
+        monkeypatch.setenv("GAME_LOG_SAMPLING", "player_state=20, COIN_SPAWN=3,bogus,ENEMY_STATE=x")
+        sampling = game_log.sampling_from_env({"PLAYER_STATE": 5, "ENEMY_STATE": 10})
+        assert sampling == {"PLAYER_STATE": 20, "ENEMY_STATE": 10, "COIN_SPAWN": 3}
+
+
+class TestPaths:
+    """Log and journal paths"""
+
+    def test_single_worker(self, monkeypatch):
+        """Test that one process logs to game_state.log and game_state.journal"""
+        monkeypatch.delenv("GAME_LOG_FORMAT", raising=False)
+        assert game_log.paths_from_env("game_state.log") == ("game_state.log", "game_state.journal")
+        monkeypatch.setenv("GAME_LOG_FORMAT", "journal")
+        assert game_log.paths_from_env("game_state.log") == (None, "game_state.journal")
+
+    def test_one_file_per_worker(self, monkeypatch):
+        """Test that workers sharing a directory don't write to the same files"""
+        monkeypatch.delenv("GAME_LOG_FORMAT", raising=False)
+        assert game_log.paths_from_env("/tmp/game_state.log", "w1") == ("/tmp/game_state.w1.log",
+                                                                       "/tmp/game_state.w1.journal")
+        assert game_log.paths_from_env("game_state.log", "host/1") == ("game_state.host_1.log",
+                                                                      "game_state.host_1.journal")
+
+
+class TestPipeline:
+    """Queue handler, batching writer and listener thread"""
+
+    def test_queue_handler_defers_formatting(self):
+        """Test that records are queued with their arguments unformatted"""
+        records = queue.Queue(10)
+        logger = logging.getLogger("test_game_log.defer")
+        logger.propagate = False
+        logger.addHandler(NonBlockingQueueHandler(records))
+        arg = CountingStr()
+        logger.warning("value %s", arg)
+        record = records.get_nowait()
+        assert arg.calls == 0 and record.args == (arg,)
+        assert record.getMessage() == "value counted"
+
+    def test_full_queue_drops(self, monkeypatch):
+        """Test that a full queue drops and counts records instead of blocking"""
+        monkeypatch.setattr(game_log, "stats", game_log.GameLogStats())
+        logger = logging.getLogger("test_game_log.full")
+        logger.propagate = False
+        logger.addHandler(NonBlockingQueueHandler(queue.Queue(1)))
+        for i in range(3):
+            logger.warning("line %s", i)
+        assert game_log.stats.dropped == 2
+
+    def test_batched_flush(self, tmp_path):
+        """Test that lines reach the file in batches"""
+        path = tmp_path / "game_state.log"
+        handler = BatchingFileHandler(str(path), flush_every=2)
+        for i in range(3):
+            handler.emit(logging.makeLogRecord({"msg": f"line {i}"}))
+        assert path.read_text().splitlines() == ["line 0", "line 1"]
+        handler.flush()
+        assert path.read_text().splitlines() == ["line 0", "line 1", "line 2"]
+        handler.close()
+
+    def test_setup_writes_analyzable_lines(self, tmp_path, monkeypatch):
+        """Test that events end up in the file in the format analyze_sync.py parses"""
+        monkeypatch.setattr(game_log, "SAMPLING", {})
+        path = tmp_path / "game_state.log"
+        game_log.setup(str(path))
+        try:
+            game_log.event("COIN_SPAWN", "ROOM01", "ID:%s Pos:(%s, %s)", "coin_1", 10.5, 20)
+        finally:
+            game_log.shutdown()
+        line = path.read_text().strip()
+        assert re.match(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - \[ROOM:ROOM01\] \[COIN_SPAWN\] '
+                        r'ID:coin_1 Pos:\(10\.5, 20\)$', line)
@@ -0,0 +1,188 @@
+"""
+Tests for the WebSocket message dispatcher (handlers.py)
+Handlers are driven directly with fake connections, no server needed
+"""
+
+import asyncio
+
+from handlers import (Connection, LatencyHistogram, MessageDispatcher, dispatcher,
+                      latency_middleware, validate)
+from rooms import room_manager
+from test_rooms import FakeWebSocket
+
+
+def run(coro):
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run(coro)
+
+
+class TestDispatcher:
+    """Registry, schema and middleware behaviour"""
+
+    def test_dispatch_calls_registered_handler(self):
+        """Test that the handler registered for a type receives the message"""
+        registry = MessageDispatcher()
+        seen = []
+
+        @registry.register("hello")
+        async def handle_hello(conn, data):
+            seen.append(data["name"])
+
+        assert run(registry.dispatch(Connection(FakeWebSocket(), "new"), {"type": "hello", "name": "a"}))
+        assert seen == ["a"]
+
+    def test_unknown_type_ignored(self):
+        """Test that unregistered message types are dropped silently"""
+        ws = FakeWebSocket()
+        assert not run(MessageDispatcher().dispatch(Connection(ws, "new"), {"type": "nope"}))
+        assert ws.sent == []
+
+    def test_schema_rejects_wrong_type(self):
+        """Test that a wrongly typed field gets an error reply and skips the handler"""
+        registry = MessageDispatcher()
+        seen = []
+
+        @registry.register("move", {"x": (int, float), "ready": bool})
+        async def handle_move(conn, data):
+            seen.append(data)
+
+        ws = FakeWebSocket()
+        conn = Connection(ws, "new")
+        run(registry.dispatch(conn, {"type": "move", "x": "left"}))
+        run(registry.dispatch(conn, {"type": "move", "x": True}))  # bool is not a number here
+        run(registry.dispatch(conn, {"type": "move"}))  # Missing fields are left to the handler
+        run(registry.dispatch(conn, {"type": "move", "x": 1.5, "ready": False}))
+
+        assert len(ws.messages("error")) == 2
+        assert "'x'" in ws.messages("error")[0]["message"]
+        assert len(seen) == 2
+
+    def test_validate_allows_optional_none(self):
+        """Test that None only passes where the schema allows it"""
+        assert validate({"player_id": (str, type(None))}, {"player_id": None}) is None
+        assert validate({"player_id": str}, {"player_id": None}) == "player_id"
+
+    def test_middleware_order(self):
+        """Test that middleware added first runs outermost, including for later registrations"""
+        registry = MessageDispatcher()
+        calls = []
+
+        def tracer(name):
+            async def middleware(conn, message_type, data, handler):
+                calls.append(f"{name}>")
+                await handler(conn, data)
+                calls.append(f"<{name}")
+            return middleware
+
+        registry.use(tracer("outer"))
+
+        @registry.register("hello")
+        async def handle_hello(conn, data):
+            calls.append(data["type"])
+
+        registry.use(tracer("inner"))
+        run(registry.dispatch(Connection(FakeWebSocket(), "new"), {"type": "hello"}))
+        assert calls == ["outer>", "inner>", "hello", "<inner", "<outer"]
+
+    def test_middleware_can_drop_message(self):
+        """Test that a middleware (e.g. a rate limit) can skip the handler"""
+        registry = MessageDispatcher()
+        seen = []
+
+        async def drop_all(conn, message_type, data, handler):
+            pass
+
+        @registry.register("hello")
+        async def handle_hello(conn, data):
+            seen.append(data)
+
+        registry.use(drop_all)
+        run(registry.dispatch(Connection(FakeWebSocket(), "new"), {"type": "hello"}))
+        assert seen == []
+
+
+class TestLatencyHistograms:
+    """Per-type latency recording"""
+
+    def test_histogram_buckets(self):
+        """Test bucket placement and summary stats"""
+        histogram = LatencyHistogram()
+        for seconds in (0.00001, 0.0003, 0.0003, 0.2):
+            histogram.record(seconds)
+
+        stats = histogram.to_dict()
+        assert stats["count"] == 4
+        assert stats["buckets"]["0.05"] == 1
+        assert stats["buckets"]["0.5"] == 2
+        assert stats["buckets"]["+inf"] == 1
+        assert stats["p50_ms"] == 0.5
+        assert stats["p99_ms"] == stats["max_ms"] == 200.0
+
+    def test_middleware_records_per_type(self):
+        """Test that every dispatched message lands in its type's histogram"""
+        registry = MessageDispatcher()
+        registry.use(latency_middleware(registry.histograms))
+
+        @registry.register("hello")
+        async def handle_hello(conn, data):
+            pass
+
+        conn = Connection(FakeWebSocket(), "new")
+        for _ in range(3):
+            run(registry.dispatch(conn, {"type": "hello"}))
+        assert registry.histograms["hello"].count == 3
+
+
+class TestRoomHandlers:
+    """The registered game handlers, called through the shared dispatcher"""
+
+    def test_create_join_and_chat(self):
+        """Test a lobby round trip through the dispatcher"""
+        async def scenario():
+            host_ws, guest_ws = FakeWebSocket(), FakeWebSocket()
+            host, guest = Connection(host_ws, "new"), Connection(guest_ws, "new")
+            await dispatcher.dispatch(host, {"type": "create_room", "player_id": "host", "player_name": "Host"})
+            await host.room.drain()
+            room_id = host_ws.messages("room_created")[0]["room_id"]
+
+            await dispatcher.dispatch(guest, {"type": "join_room", "room_id": room_id, "player_id": "guest"})
+            await dispatcher.dispatch(guest, {"type": "chat", "message": "hi"})
+            await host.room.drain()
+
+            assert guest.room is host.room
+            assert guest_ws.messages("room_joined")[0]["player_number"] == 2
+            assert host_ws.messages("chat")[0]["message"] == "hi"
+
+            await dispatcher.dispatch(guest, {"type": "leave_room"})
+            await dispatcher.dispatch(host, {"type": "leave_room"})
+            assert host.room is None and room_manager.get_room(room_id) is None
+
+        run(scenario())
+
+    def test_read_only_messages_keep_room_clean(self):
+        """Test that ping/time_sync don't mark the room for checkpointing, state messages do"""
+        async def scenario():
+            websocket = FakeWebSocket()
+            conn = Connection(websocket, "new")
+            await dispatcher.dispatch(conn, {"type": "create_room", "player_id": "host"})
+            conn.room.dirty = False
+            sequence_id = conn.room.sequence_id
+
+            await dispatcher.dispatch(conn, {"type": "ping"})
+            await dispatcher.dispatch(conn, {"type": "time_sync", "client_time": 1})
+            assert not conn.room.dirty
+            assert conn.room.sequence_id == sequence_id
+            await conn.room.drain()
+            assert websocket.messages("time_sync_response")[-1]["sequence_id"] == sequence_id
+
+            await dispatcher.dispatch(conn, {"type": "player_state", "state": {"x": 1.0, "y": 2.0}})
+            assert conn.room.dirty
+
+            await dispatcher.dispatch(conn, {"type": "leave_room"})
+
+        run(scenario())
+
+    def test_shared_dispatcher_records_latency(self):
+        """Test that the module dispatcher has the latency middleware installed"""
+        run(dispatcher.dispatch(Connection(FakeWebSocket(), "new"), {"type": "ping"}))
+        assert dispatcher.histograms["ping"].count >= 1
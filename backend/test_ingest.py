@@ -0,0 +1,146 @@
+"""
+Tests for batched score ingestion
+Run with: pytest test_ingest.py -v
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from database import ConnectionPool, migrate
+from ingest import ScoreWriter
+
+
+@pytest.fixture
+def pool():
+    """Pool on a throwaway, fully migrated database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "test.db"), size=2)
+        with pool.connection() as conn:
+            migrate(conn)
+        yield pool
+        pool.close()
+
+
+def submit(writer, player_name="Player", score=100, game_mode="levels"):
+    return writer.submit(player_name, score, 0, 0, 0, 1, game_mode)
+
+
+def stored_rows(pool):
+    with pool.connection() as conn:
+        return conn.execute("SELECT * FROM scores ORDER BY id").fetchall()
+
+
+class TestScoreWriter:
+    """Id assignment, batching and shutdown"""
+
+    def test_rows_written_in_background(self, pool):
+        """Test that submissions reach the table after a flush, with the returned ids"""
+        writer = ScoreWriter(pool, flush_interval=0.01)
+        writer.start()
+        rows = [submit(writer, score=score) for score in (10, 20, 30)]
+        assert writer.flush(timeout=5)
+        writer.close()
+
+        assert [row[0] for row in rows] == [1, 2, 3]
+        assert stored_rows(pool) == rows
+
+    def test_ids_continue_after_existing_rows(self, pool):
+        """Test that preassigned ids never collide with rows already in the table"""
+        with pool.connection() as conn:
+            conn.execute("""
+                INSERT INTO scores (player_name, score, coins, enemies_defeated, distance, level, game_mode)
+                VALUES ('Old', 1, 0, 0, 0, 1, 'levels')
+            """)
+            conn.execute("INSERT INTO scores (id, player_name, score, coins, enemies_defeated, distance, level,"
+                         " game_mode) VALUES (7, 'Old', 1, 0, 0, 0, 1, 'levels')")
+            # Deleted ids are not reused by AUTOINCREMENT either
+            conn.execute("DELETE FROM scores WHERE id = 7")
+            conn.commit()
+
+        writer = ScoreWriter(pool)
+        writer.start()
+        row = submit(writer)
+        writer.close()
+        assert row[0] == 8
+
+    def test_full_batch_written_without_waiting(self, pool):
+        """Test that a full batch doesn't wait for the flush interval"""
+        writer = ScoreWriter(pool, batch_size=5, flush_interval=60)
+        writer.start()
+        for score in range(5):
+            submit(writer, score=score)
+        assert writer.flush(timeout=5)
+        assert len(stored_rows(pool)) == 5
+        writer.close()
+
+    def test_unsaved_until_written(self, pool):
+        """Test that queued rows are reported as unsaved until they are committed"""
+        writer = ScoreWriter(pool, flush_interval=10)
+        writer.start()
+        rows = [submit(writer, score=score) for score in (10, 20)]
+        assert writer.unsaved() == rows
+        writer.close()
+        assert writer.unsaved() == []
+        assert stored_rows(pool) == rows
+
+    def test_close_writes_pending_rows(self, pool):
+        """Test the shutdown flush"""
+        writer = ScoreWriter(pool, flush_interval=60)
+        writer.start()
+        for score in range(3):
+            submit(writer, score=score)
+        writer.close()
+
+        assert len(stored_rows(pool)) == 3
+        with pytest.raises(RuntimeError):
+            submit(writer)
+
+    def test_writers_sharing_a_database_get_distinct_ids(self, pool):
+        """Test that id blocks are reserved in the database, not per process"""
+        first, second = ScoreWriter(pool, id_block=3), ScoreWriter(pool, id_block=3)
+        first.start()
+        second.start()
+        rows = [submit(writer) for _ in range(4) for writer in (first, second)]
+        first.close()
+        second.close()
+
+        ids = [row[0] for row in rows]
+        assert len(set(ids)) == len(ids)
+        assert len(stored_rows(pool)) == 8 and first.failed == second.failed == 0
+
+    def test_autoincrement_skips_reserved_ids(self, pool):
+        """Test that plain inserts don't take ids a writer has handed out but not written yet"""
+        writer = ScoreWriter(pool, flush_interval=60)
+        writer.start()
+        row = submit(writer)
+        with pool.connection() as conn:
+            conn.execute("""
+                INSERT INTO scores (player_name, score, coins, enemies_defeated, distance, level, game_mode)
+                VALUES ('Other', 1, 0, 0, 0, 1, 'levels')
+            """)
+            conn.commit()
+        writer.close()
+        assert writer.failed == 0 and row in stored_rows(pool)
+
+    def test_bad_row_does_not_drop_batch(self, pool):
+        """Test that a conflicting row is isolated and the rest of the batch is written"""
+        dropped = []
+        writer = ScoreWriter(pool, flush_interval=60, on_failure=dropped.extend)
+        writer.start()
+        first = submit(writer, player_name="First")
+        second = submit(writer, player_name="Second")
+        with pool.connection() as conn:
+            # Something else took the id handed to the second submission
+            conn.execute("INSERT INTO scores (id, player_name, score, coins, enemies_defeated, distance, level,"
+                         " game_mode) VALUES (?, 'Other', 1, 0, 0, 0, 1, 'levels')", (second[0],))
+            conn.commit()
+        writer.close()
+
+        names = [row[1] for row in stored_rows(pool)]
+        assert names == ["First", "Other"]
+        assert writer.written == 1 and writer.failed == 1
+        assert first[0] == 1
+        assert dropped == [second]
+        assert writer.to_dict() == {"written": 1, "failed": 1, "pending": 0}
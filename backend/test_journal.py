@@ -0,0 +1,155 @@
+"""
+Tests for the binary event journal (journal.py)
+Run with: pytest test_journal.py -v
+"""
+
+import logging
+import math
+import os
+from datetime import datetime
+
+import analyze_sync
+import game_log
+from journal import (MAGIC, JournalReader, JournalRecord, JournalWriter, decode_records, encode_record,
+                     journal_files, read_journals, record_from_event)
+
+
+def write_events(text_path, journal_path, events):
+    """Write (ts, args) game_log events both as text lines and as a journal"""
+    writer = JournalWriter(str(journal_path))
+    with open(text_path, "w") as f:
+        for ts, details, args in events:
+            record = logging.makeLogRecord({"msg": "[ROOM:%s] [%s] " + details, "args": args, "created": ts})
+            asctime = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") + f",{int(ts % 1 * 1000):03d}"
+            f.write(f"{asctime} - {record.getMessage()}\n")
+            writer.write(record_from_event(ts, args))
+    writer.close()
+
+
+class TestRecords:
+    """Record encoding"""
+
+    def test_round_trip(self):
+        """Test that every field survives encode/decode"""
+        record = JournalRecord(1700000000.25, "ITEM_COLLECT", "ROOM01", "plåyer", "coin_drop_1_2_0", "coin", 1.5, -2.0)
+        records, offset = decode_records(encode_record(record))
+        assert records == [record] and offset == len(encode_record(record))
+
+    def test_missing_position_is_nan(self):
+        """Test that events without x/y store NaN"""
+        record = JournalRecord(1.0, "ITEM_COLLECT", "R", "p1", x=None, y="garbage")
+        decoded = decode_records(encode_record(record))[0][0]
+        assert math.isnan(decoded.x) and math.isnan(decoded.y)
+
+    def test_partial_record_left_for_later(self):
+        """Test that a record cut off at the end of the buffer is not decoded"""
+        data = encode_record(JournalRecord(1.0, "COIN_SPAWN", "R", "c1", x=1, y=2)) * 2
+        records, offset = decode_records(data[:-3])
+        assert len(records) == 1 and offset == len(data) // 2
+
+    def test_malformed_record_stops_decoding(self):
+        """Test that a body that doesn't fit the schema ends decoding instead of raising"""
+        good = encode_record(JournalRecord(1.0, "COIN_SPAWN", "R", "c1"))
+        bad = b"\x03\x00abc" + good
+        records, offset = decode_records(good + bad)
+        assert len(records) == 1 and offset == len(good)
+
+    def test_record_from_event(self):
+        """Test that game_log.event() arguments map onto the schema"""
+        record = record_from_event(5.0, ("ROOM01", "SYNC_ERROR", "p1", "coin", "c1", 512.3, 10.0, 20.0, ["c2"]))
+        assert record == JournalRecord(5.0, "SYNC_ERROR", "ROOM01", "p1", "c1", "coin", 10.0, 20.0)
+        record = record_from_event(5.0, ("ROOM01", "ITEM_COLLECT", "p1", "coin", "c1", 10.0, 20.0))
+        assert record == JournalRecord(5.0, "ITEM_COLLECT", "ROOM01", "p1", "c1", "coin", 10.0, 20.0)
+        assert record_from_event(5.0, ("ROOM01", "CHAT", "hello")) is None
+        assert record_from_event(5.0, ()) is None
+
+
+class TestFiles:
+    """Writer rotation and readers"""
+
+    def test_rotation_and_read_order(self, tmp_path):
+        """Test that rotated files are read back oldest first"""
+        path = str(tmp_path / "game_state.journal")
+        writer = JournalWriter(path, max_bytes=200, backup_count=10)
+        for i in range(20):
+            writer.write(JournalRecord(float(i), "PLAYER_STATE", "R", "p1", x=i, y=0))
+        writer.close()
+        assert len(journal_files(path)) > 2
+        assert [r.ts for r in read_journals(path)] == [float(i) for i in range(20)]
+
+    def test_backup_count_limits_files(self, tmp_path):
+        """Test that the oldest backups are deleted"""
+        path = str(tmp_path / "game_state.journal")
+        writer = JournalWriter(path, max_bytes=100, backup_count=2)
+        for i in range(30):
+            writer.write(JournalRecord(float(i), "PLAYER_STATE", "R", "p1"))
+        writer.close()
+        assert journal_files(path) == [path + ".2", path + ".1", path]
+
+    def test_torn_tail_cut_on_reopen(self, tmp_path):
+        """Test that records appended after a crash mid-record are still readable"""
+        path = str(tmp_path / "game_state.journal")
+        writer = JournalWriter(path)
+        for i in range(3):
+            writer.write(JournalRecord(float(i), "PLAYER_STATE", "R", "p1", x=i, y=0))
+        writer.close()
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 5)
+
+        writer = JournalWriter(path)
+        for i in range(3, 6):
+            writer.write(JournalRecord(float(i), "PLAYER_STATE", "R", "p1", x=i, y=0))
+        writer.close()
+        assert [r.ts for r in read_journals(path)] == [0.0, 1.0, 3.0, 4.0, 5.0]
+
+    def test_reader_continues_live_file(self, tmp_path):
+        """Test that records() picks up what was written since the last call"""
+        path = str(tmp_path / "game_state.journal")
+        writer = JournalWriter(path)
+        writer.write(JournalRecord(1.0, "COIN_SPAWN", "R", "c1"))
+        writer.flush()
+        reader = JournalReader(path)
+        assert [r.entity_id for r in reader.records()] == ["c1"]
+        writer.write(JournalRecord(2.0, "COIN_SPAWN", "R", "c2"))
+        writer.flush()
+        assert [r.entity_id for r in reader.records()] == ["c2"]
+        reader.close()
+        writer.close()
+        with open(path, "rb") as f:
+            assert f.read(len(MAGIC)) == MAGIC
+
+    def test_game_log_writes_journal(self, tmp_path, monkeypatch):
+        """Test that game_log.event() reaches the journal through the writer thread"""
+        monkeypatch.setattr(game_log, "SAMPLING", {})
+        path = str(tmp_path / "game_state.journal")
+        game_log.setup(None, path)
+        try:
+            game_log.event("COIN_SPAWN", "ROOM01", "ID:%s Pos:(%s, %s)", "coin_1", 10.5, 20)
+        finally:
+            game_log.shutdown()
+        [record] = list(read_journals(path))
+        assert (record.room, record.type, record.entity_id, record.x, record.y) == ("ROOM01", "COIN_SPAWN", "coin_1", 10.5, 20.0)
+
+
+class TestAnalyzeSync:
+    """analyze_sync reads journals like text logs"""
+
+    def test_same_anomalies_as_text_log(self, tmp_path, monkeypatch):
+        """Test that a journal and the equivalent text log give the same findings"""
+        monkeypatch.setattr(analyze_sync, "ANALYSIS_LOG_FILE", str(tmp_path / "sync_analysis.log"))
+        events = [
+            (1000.0, "ID:%s Pos:(%s, %s)", ("ROOM01", "COIN_SPAWN", "coin_1", 100.0, 100.0)),
+            (1000.1, "Player:%s Pos:(%s, %s)", ("ROOM01", "PLAYER_STATE", "p1", 100.0, 100.0)),
+            (1000.2, "Player:%s Pos:(%s, %s)", ("ROOM01", "PLAYER_STATE", "p1", 900.0, 100.0)),
+            (1000.3, "Player:%s Type:%s ID:%s", ("ROOM01", "ITEM_COLLECT", "p1", "coin", "coin_1")),
+        ]
+        text_path, journal_path = tmp_path / "game_state.log", tmp_path / "game_state.journal"
+        write_events(text_path, journal_path, events)
+
+        results = []
+        for reader, path in ((analyze_sync.read_text_log, text_path), (analyze_sync.read_journal, journal_path)):
+            rooms = {}
+            reader(str(path), rooms)
+            results.append([(a["severity"], a["message"]) for a in rooms["ROOM01"].anomalies])
+        assert results[0] == results[1]
+        assert [severity for severity, _ in results[1]] == ["SUSPICIOUS", "CRITICAL"]
@@ -0,0 +1,116 @@
+"""
+Tests for the in-memory leaderboard index
+Run with: pytest test_leaderboard.py -v
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from database import ConnectionPool, migrate
+from leaderboard import LeaderboardIndex
+
+
+def make_row(score_id, score, game_mode="levels", player_name="Player"):
+    return (score_id, player_name, score, 0, 0, 0, 1, game_mode, "2024-01-01 00:00:00")
+
+
+@pytest.fixture
+def pool():
+    """Pool on a throwaway, fully migrated database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "test.db"), size=2)
+        with pool.connection() as conn:
+            migrate(conn)
+        yield pool
+        pool.close()
+
+
+class TestLeaderboardIndex:
+    """Top-N and rank queries against the sorted index"""
+
+    def test_top_orders_by_score_then_id(self):
+        """Test that the best scores come first and ties keep submission order"""
+        index = LeaderboardIndex()
+        for row in (make_row(1, 50), make_row(2, 300), make_row(3, 50), make_row(4, 120)):
+            index.add(row)
+
+        assert [row[0] for row in index.top(10)] == [2, 4, 1, 3]
+        assert [row[0] for row in index.top(2)] == [2, 4]
+        assert index.top(0) == []
+        assert len(index.top(-1)) == 4  # Same as SQLite's LIMIT -1
+
+    def test_game_mode_filter(self):
+        """Test that each game mode has its own leaderboard"""
+        index = LeaderboardIndex()
+        index.add(make_row(1, 100, "levels"))
+        index.add(make_row(2, 500, "endless"))
+        index.add(make_row(3, 200, "levels"))
+
+        assert [row[0] for row in index.top(10, "levels")] == [3, 1]
+        assert [row[0] for row in index.top(10, "endless")] == [2]
+        assert index.top(10, "unknown") == []
+
+    def test_remove(self):
+        """Test that a removed row leaves both the overall and the mode leaderboard"""
+        index = LeaderboardIndex()
+        rows = [make_row(1, 100, "levels"), make_row(2, 200, "levels"), make_row(3, 150, "endless")]
+        for row in rows:
+            index.add(row)
+        index.remove(rows[1])
+        index.remove(make_row(9, 100))  # Not in the index
+
+        assert [row[0] for row in index.top(10)] == [3, 1]
+        assert [row[0] for row in index.top(10, "levels")] == [1]
+
+    def test_load_keeps_unsaved_rows(self, pool):
+        """Test that a reload keeps rows still queued for the database, without doubling written ones"""
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", make_row(1, 100))
+            conn.commit()
+        index = LeaderboardIndex()
+        index.load(pool, [make_row(1, 100), make_row(2, 300, "endless")])
+
+        assert [row[0] for row in index.top(10)] == [2, 1]
+        assert [row[0] for row in index.top(10, "endless")] == [2]
+
+    def test_rank_counts_strictly_higher_scores(self):
+        """Test that rank matches COUNT(*) + 1 WHERE score > ?"""
+        index = LeaderboardIndex()
+        for score_id, score in enumerate((100, 200, 200, 300), start=1):
+            index.add(make_row(score_id, score, "levels" if score_id % 2 else "endless"))
+
+        assert index.rank(400) == 1
+        assert index.rank(300) == 1
+        assert index.rank(200) == 2
+        assert index.rank(150) == 4
+        assert index.rank(0) == 5
+        # levels holds 100 and 200, endless holds 200 and 300
+        assert index.rank(150, "levels") == 2
+        assert index.rank(150, "endless") == 3
+        assert index.rank(150, "unknown") == 1
+
+    def test_load_matches_database(self, pool):
+        """Test that loading from SQLite gives the same answers as the SQL queries"""
+        with pool.connection() as conn:
+            for score, mode in ((10, "levels"), (40, "endless"), (40, "levels"), (25, "levels")):
+                conn.execute("""
+                    INSERT INTO scores (player_name, score, coins, enemies_defeated, distance, level, game_mode)
+                    VALUES ('P', ?, 0, 0, 0, 1, ?)
+                """, (score, mode))
+            conn.commit()
+            expected = conn.execute("""
+                SELECT id FROM scores WHERE game_mode = 'levels' ORDER BY score DESC, id ASC
+            """).fetchall()
+            expected_rank = conn.execute("SELECT COUNT(*) + 1 FROM scores WHERE score > 20").fetchone()[0]
+
+        index = LeaderboardIndex()
+        index.load(pool)
+
+        assert [row[0] for row in index.top(10, "levels")] == [row[0] for row in expected]
+        assert index.rank(20) == expected_rank
+
+        # Writes after the load are merged into the loaded arrays
+        index.add(make_row(99, 30, "levels"))
+        assert [row[2] for row in index.top(10, "levels")] == [40, 30, 25, 10]
@@ -0,0 +1,212 @@
+"""
+Tests for tail-following logs (logtail.py)
+Run with: pytest test_logtail.py -v
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import logtail
+from journal import MAGIC, JournalRecord, JournalWriter, decode_records
+from logtail import InotifyWatcher, LogFollower, PollingWatcher, split_lines
+
+
+def append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "game_state.log"
+    path.write_text("")
+    return str(path)
+
+
+@pytest.fixture
+def follow(log, tmp_path):
+    """Followers on log, closed after the test"""
+    followers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("checkpoint", str(tmp_path / "sync_analysis.checkpoint"))
+        follower = LogFollower(log, **kwargs)
+        followers.append(follower)
+        return follower
+
+    yield make
+    for follower in followers:
+        follower.close()
+
+
+class TestSplitLines:
+    """Buffer splitting"""
+
+    def test_partial_line_left(self):
+        """Test that a line without its newline isn't returned yet"""
+        assert split_lines(b"one\ntwo\nthr") == (["one", "two"], 8)
+        assert split_lines(b"thr") == ([], 0)
+
+
+class TestLogFollower:
+    """Reading, rotation, truncation and checkpoints"""
+
+    def test_appended_lines(self, log, follow):
+        """Test that each read returns what was appended since the last one, complete lines only"""
+        append(log, "a\nb\n")
+        follower = follow()
+        assert follower.read() == ["a", "b"]
+        append(log, "c\nd")
+        assert follower.read() == ["c"]
+        append(log, "\n")
+        assert follower.read() == ["d"]
+        assert follower.read() == []
+
+    def test_rotation(self, log, follow):
+        """Test that the rest of a rotated file is read, then the new file from its start"""
+        append(log, "a\n")
+        follower = follow()
+        assert follower.read() == ["a"]
+        append(log, "b\n")
+        os.replace(log, log + ".1")
+        assert follower.read() == ["b"]  # New file not created yet
+        append(log, "c\n")
+        assert follower.read() == ["c"]
+
+    def test_truncation(self, log, follow):
+        """Test that a log truncated in place is read again from the start"""
+        append(log, "a long first line\n")
+        follower = follow()
+        assert follower.read() == ["a long first line"]
+        with open(log, "w") as f:
+            f.write("b\n")
+        assert follower.read() == ["b"]
+
+    def test_resume_from_checkpoint(self, log, follow):
+        """Test that a new follower carries on where the last one stopped"""
+        append(log, "a\nb\n")
+        follower = follow()
+        assert follower.read() == ["a", "b"]
+        follower.save_checkpoint()
+        follower.close()
+        append(log, "c\n")
+        assert follow().read() == ["c"]
+        assert follow(resume=False).read() == ["a", "b", "c"]
+
+    def test_resume_after_rotation(self, log, follow):
+        """Test that lines written before a rotation that happened while stopped aren't lost"""
+        append(log, "a\n")
+        follower = follow()
+        assert follower.read() == ["a"]
+        follower.save_checkpoint()
+        follower.close()
+        append(log, "b\n")
+        os.replace(log, log + ".1")
+        append(log, "c\n")
+        assert follow().read() == ["b", "c"]
+
+    def test_checkpoint_only_rewritten_when_moved(self, log, follow, tmp_path, monkeypatch):
+        """Test that an idle follower doesn't keep rewriting its checkpoint"""
+        monkeypatch.setattr(logtail, "CHECKPOINT_INTERVAL", 0.0)
+        checkpoint = tmp_path / "sync_analysis.checkpoint"
+        append(log, "a\n")
+        follower = follow()
+        follower.read()
+        follower.save_checkpoint()
+        inode = checkpoint.stat().st_ino  # Every save replaces the file
+        follower.read()
+        follower.save_checkpoint()
+        follower.close()
+        assert checkpoint.stat().st_ino == inode
+
+        append(log, "b\n")
+        follower = follow()
+        assert follower.read() == ["b"]
+        follower.save_checkpoint()
+        follower.close()
+        assert json.loads(checkpoint.read_text())["offset"] == 4
+
+    def test_unprocessed_items_not_checkpointed(self, log, follow):
+        """Test that items read but not processed before close are read again"""
+        append(log, "a\n")
+        follower = follow()
+        assert follower.read() == ["a"]
+        follower.save_checkpoint(force=True)
+        append(log, "b\n")
+        assert follower.read() == ["b"]
+        follower.close()  # Interrupted before "b" was processed
+        assert follow().read() == ["b"]
+
+    def test_checkpoint_for_other_log_ignored(self, log, follow, tmp_path):
+        """Test that a checkpoint saved for another path isn't applied"""
+        other = tmp_path / "other.log"
+        other.write_text("x\ny\n")
+        follower = LogFollower(str(other), checkpoint=str(tmp_path / "sync_analysis.checkpoint"))
+        follower.read()
+        follower.save_checkpoint()
+        follower.close()
+        append(log, "a\n")
+        assert follow().read() == ["a"]
+
+    def test_journal(self, tmp_path, follow):
+        """Test that journals are followed record by record across rotation"""
+        path = str(tmp_path / "game_state.journal")
+        writer = JournalWriter(path, max_bytes=120, backup_count=3)
+        follower = LogFollower(path, decode_records, MAGIC)
+        seen = []
+        for i in range(10):
+            writer.write(JournalRecord(float(i), "PLAYER_STATE", "R", "p1", x=i, y=0))
+            writer.flush()
+            seen.extend(record.ts for record in follower.read())
+        writer.close()
+        follower.close()
+        assert seen == [float(i) for i in range(10)]
+
+
+class TestWatchers:
+    """Waiting for changes"""
+
+    def test_event_names(self):
+        """Test that names are read from packed, NUL padded inotify events"""
+        buffer = (logtail.EVENT_HEADER.pack(1, logtail.IN_MODIFY, 0, 16) + b"game_state.log\0\0"
+                  + logtail.EVENT_HEADER.pack(-1, logtail.IN_Q_OVERFLOW, 0, 0)
+                  + logtail.EVENT_HEADER.pack(1, logtail.IN_CREATE, 0, 8) + b"a.tmp\0\0\0")
+        assert logtail.event_names(buffer) == ["game_state.log", None, "a.tmp"]
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+    def test_inotify_ignores_other_files(self, log, tmp_path):
+        """Test that writes to other files in the log's directory don't wake the watcher"""
+        watcher = InotifyWatcher(log)
+        try:
+            append(str(tmp_path / "sync_analysis.log"), "report\n")
+            (tmp_path / "sync_analysis.checkpoint.tmp").write_text("{}")
+            os.replace(tmp_path / "sync_analysis.checkpoint.tmp", tmp_path / "sync_analysis.checkpoint")
+            assert watcher.wait(0.1) is False
+            os.replace(log, log + ".1")
+            assert watcher.wait(1.0) is True
+        finally:
+            watcher.close()
+
+    @pytest.mark.parametrize("watcher_class", [
+        pytest.param(InotifyWatcher, marks=pytest.mark.skipif(not sys.platform.startswith("linux"),
+                                                              reason="inotify is Linux only")),
+        PollingWatcher,
+    ])
+    def test_wakes_on_write(self, log, watcher_class):
+        """Test that wait() returns True on a write and False on a timeout"""
+        watcher = watcher_class(log) if watcher_class is InotifyWatcher else watcher_class(log, interval=0.01)
+        try:
+            assert watcher.wait(0.05) is False
+            writer = threading.Timer(0.05, append, (log, "a\n"))
+            writer.start()
+            start = time.monotonic()
+            assert watcher.wait(5.0) is True
+            assert time.monotonic() - start < 2.0
+            writer.join()
+        finally:
+            watcher.close()
@@ -0,0 +1,137 @@
+"""
+Tests for inbound float quantization (quantize.py)
+Run with: pytest test_quantize.py -v
+"""
+
+import asyncio
+
+import pytest
+
+import quantize
+from handlers import Connection, dispatcher
+from quantize import FixedPoint, quantize_entities, quantize_state
+from rooms import GameRoom
+from test_rooms import FakeWebSocket
+
+
+class TestQuantize:
+    """Schema-aware rounding of state dicts and entity lists"""
+
+    def test_only_float_fields_rounded(self):
+        """Test that x/y/velocities are rounded and everything else is passed through"""
+        state = {"x": 10.123456, "y": -3.005001, "velocity_x": 5, "health": 9.87654, "is_alive": True}
+        assert quantize_state(state) is state  # In place
+        assert state == {"x": 10.12, "y": -3.01, "velocity_x": 5, "health": 9.87654, "is_alive": True}
+
+    def test_bool_and_int_untouched(self):
+        """Test that non-float values in float fields keep their type"""
+        state = {"x": True, "y": 7}
+        quantize_state(state)
+        assert state["x"] is True and type(state["y"]) is int
+
+    def test_entities_in_place(self):
+        """Test that every dict in an entity list is quantized and non-dicts are skipped"""
+        entities = [{"enemy_id": "e1", "x": 1.23456}, "garbage", {"coin_id": "c1", "velocity_y": -0.004}]
+        assert quantize_entities(entities) is entities
+        assert entities[0]["x"] == 1.23 and entities[2]["velocity_y"] == -0.0
+
+    @pytest.mark.skipif(quantize.np is None, reason="NumPy not installed")
+    def test_numpy_path_matches_python(self, monkeypatch):
+        """Test that the vectorized path produces the same values as the per-dict one"""
+        entities = [{"x": i * 1.013, "y": i * -0.337, "velocity_x": i} for i in range(200)]
+        expected = [quantize_state(dict(entity)) for entity in entities]
+        monkeypatch.setattr(quantize, "NUMPY_MIN_BATCH", 1)
+        assert quantize_entities(entities) == expected
+
+
+class TestHandlerQuantization:
+    """Inbound messages are quantized once, before storage and relay"""
+
+    def test_player_state_relayed_quantized(self):
+        """Test that the stored and relayed player state carries rounded floats"""
+        async def scenario():
+            host_ws, guest_ws = FakeWebSocket(), FakeWebSocket()
+            host, guest = Connection(host_ws, "new"), Connection(guest_ws, "new")
+            await dispatcher.dispatch(host, {"type": "create_room", "player_id": "host"})
+            await dispatcher.dispatch(guest, {"type": "join_room", "room_id": host.room.room_id, "player_id": "guest"})
+            await dispatcher.dispatch(host, {"type": "player_state", "state": {"x": 100.4567, "y": 20.0001}})
+            await host.room.drain()
+
+            assert host.room.players["host"].x == 100.46
+            assert guest_ws.messages("player_state_update")[-1]["state"] == {"x": 100.46, "y": 20.0}
+
+            await dispatcher.dispatch(guest, {"type": "leave_room"})
+            await dispatcher.dispatch(host, {"type": "leave_room"})
+
+        asyncio.run(scenario())
+
+
+class TestFixedPoint:
+    """Centipixel storage for rooms created with fixed_point"""
+
+    def test_round_trip(self):
+        """Test that positions survive encode/decode relative to the origin"""
+        fixed = FixedPoint(1000.0, -50.0)
+        state = fixed.encode_state({"x": 1234.56, "y": 10.0, "velocity_x": -3.25, "health": 7})
+        assert state == {"x": 23456, "y": 6000, "velocity_x": -325, "health": 7}
+        assert fixed.to_pixels(state) == {"x": 1234.56, "y": 10.0, "velocity_x": -3.25, "health": 7}
+
+    def test_to_pixels_walks_nested_messages(self):
+        """Test that entity lists and per-player dicts are converted and the input is left alone"""
+        fixed = FixedPoint()
+        message = {"type": "state_snapshot", "players": {"p1": {"x": 150}}, "enemies": {"e1": {"y": -5}}}
+        assert fixed.to_pixels(message) == {"type": "state_snapshot", "players": {"p1": {"x": 1.5}},
+                                             "enemies": {"e1": {"y": -0.05}}}
+        assert message["players"]["p1"]["x"] == 150
+
+    def test_pixel_and_fixed_clients(self):
+        """Test that storage is in ints, pixel clients get floats and fixed clients get the ints"""
+        async def scenario():
+            host_ws, guest_ws = FakeWebSocket(), FakeWebSocket()
+            host, guest = Connection(host_ws, "new"), Connection(guest_ws, "new")
+            await dispatcher.dispatch(host, {"type": "create_room", "player_id": "host",
+                                             "fixed_point": True, "origin": [100, 0]})
+            await dispatcher.dispatch(guest, {"type": "join_room", "room_id": host.room.room_id,
+                                              "player_id": "guest", "positions": "fixed"})
+            room = host.room
+            await dispatcher.dispatch(host, {"type": "enemy_spawn", "enemy": {"enemy_id": "e1", "x": 350.25, "y": 40.0}})
+            await dispatcher.dispatch(guest, {"type": "player_state", "state": {"x": 500, "y": 1200}})
+            await room.drain()
+
+            assert room.enemies.get_dict("e1")["x"] == 25025
+            assert room.players["guest"].x == 500  # Sent in fixed point already
+            assert guest_ws.messages("room_joined")[0]["origin"] == [100.0, 0.0]
+            assert guest_ws.messages("enemy_spawned")[0]["enemy"]["x"] == 25025
+            assert host_ws.messages("enemy_spawned")[0]["enemy"]["x"] == 350.25
+            assert host_ws.messages("player_state_update")[-1]["state"] == {"x": 105.0, "y": 12.0}
+
+            await dispatcher.dispatch(guest, {"type": "leave_room"})
+            await dispatcher.dispatch(host, {"type": "leave_room"})
+
+        asyncio.run(scenario())
+
+    def test_coin_drops_use_pixel_positions(self):
+        """Test that server-side drops compute their deterministic IDs in pixels"""
+        async def scenario():
+            conn = Connection(FakeWebSocket(), "new")
+            await dispatcher.dispatch(conn, {"type": "create_room", "player_id": "host", "fixed_point": True})
+            await dispatcher.dispatch(conn, {"type": "enemy_spawn",
+                                             "enemy": {"enemy_id": "e1", "x": 320.0, "y": 200.0, "coin_reward": 1}})
+            await dispatcher.dispatch(conn, {"type": "enemy_killed", "enemy_id": "e1"})
+            await conn.room.drain()
+
+            coin = conn.websocket.messages("coin_spawned")[0]["coin"]
+            assert coin["coin_id"] == "coin_drop_320_200_0"
+            assert coin["x"] == 320.0 + ((320 * 7) % 61) - 30
+
+            await dispatcher.dispatch(conn, {"type": "leave_room"})
+
+        asyncio.run(scenario())
+
+    def test_checkpoint_keeps_fixed_point(self):
+        """Test that a restored room still stores and converts in fixed point"""
+        room = GameRoom("ROOM01", "Room", "host", fixed_point=FixedPoint(10.0, 20.0))
+        room.spawn_enemy(room.ingest_state({"enemy_id": "e1", "x": 11.0, "y": 21.0}))
+        restored = GameRoom.from_snapshot(room.to_snapshot())
+        assert restored.enemies.get_dict("e1")["x"] == 100
+        assert restored.pixel_state(restored.enemies.get_dict("e1"))["y"] == 21.0
@@ -0,0 +1,174 @@
+"""
+Tests for per-connection inbound rate limiting (ratelimit.py)
+Run with: pytest test_ratelimit.py -v
+"""
+
+import asyncio
+
+import pytest
+
+from handlers import Connection, dispatcher
+from ratelimit import (COALESCED, DEFERRED, DROP, DROPPED, ConnectionLimits, Limit, RateLimitExceeded,
+                       RateLimitStats, TokenBucket, coalesce)
+from test_rooms import FakeWebSocket
+
+
+def make_limits(limits, disconnect_threshold=None):
+    """Connection with its own limits and a handler recording what it was given"""
+    conn = Connection(FakeWebSocket(), "new")
+    stats = RateLimitStats()
+    conn.limits = ConnectionLimits(limits, stats, disconnect_threshold)
+    handled = []
+
+    async def handler(conn, data):
+        handled.append(data)
+
+    return conn, stats, handled, handler
+
+
+class TestTokenBucket:
+    """Token bucket arithmetic"""
+
+    def test_burst_then_refill(self):
+        """Test that a full bucket allows a burst and refills at the rate"""
+        bucket = TokenBucket(rate=10, burst=2, now=0.0)
+        assert bucket.take(0.0) and bucket.take(0.0)
+        assert not bucket.take(0.0)
+        assert bucket.wait_time(0.0) == pytest.approx(0.1)
+        assert bucket.take(0.1)
+
+    def test_never_above_burst(self):
+        """Test that idle time doesn't bank more than burst tokens"""
+        bucket = TokenBucket(rate=10, burst=2, now=0.0)
+        assert [bucket.take(100.0) for _ in range(3)] == [True, True, False]
+
+
+class TestCoalesce:
+    """Merging of held-back updates"""
+
+    def test_state_dicts_merged(self):
+        """Test that partial state updates are merged, newest values winning"""
+        merged = coalesce({"type": "player_state", "state": {"x": 1, "health": 3}},
+                          {"type": "player_state", "state": {"x": 2}})
+        assert merged == {"type": "player_state", "state": {"x": 2, "health": 3}}
+
+
+class TestConnectionLimits:
+    """Admission, coalescing, dropping and disconnects"""
+
+    def test_flood_coalesced_to_latest(self):
+        """Test that excess state updates are merged and the latest one is handled later"""
+        async def scenario():
+            conn, stats, handled, handler = make_limits({"player_state": Limit(50, 1)})
+            for i in range(10):
+                await conn.limits.admit(conn, "player_state", {"state": {"x": float(i)}}, handler)
+            assert [d["state"]["x"] for d in handled] == [0.0]
+            await asyncio.sleep(0.1)
+            assert [d["state"]["x"] for d in handled] == [0.0, 9.0]
+            assert stats.counts["player_state"] == {COALESCED: 8, DROPPED: 0, DEFERRED: 1}
+
+        asyncio.run(scenario())
+
+    def test_coalesced_per_entity(self):
+        """Test that updates for different enemies are kept apart"""
+        async def scenario():
+            conn, stats, handled, handler = make_limits({"enemy_state": Limit(100, 1, key="enemy_id")})
+            for enemy_id in ("e1", "e2", "e1", "e2"):
+                await conn.limits.admit(conn, "enemy_state", {"enemy_id": enemy_id, "state": {}}, handler)
+            await asyncio.sleep(0.1)
+            assert [d["enemy_id"] for d in handled] == ["e1", "e2", "e1"]
+
+        asyncio.run(scenario())
+
+    def test_drop_policy(self):
+        """Test that DROP types are discarded over budget, not deferred"""
+        async def scenario():
+            conn, stats, handled, handler = make_limits({"chat": Limit(1, 2, DROP)})
+            for i in range(5):
+                await conn.limits.admit(conn, "chat", {"message": str(i)}, handler)
+            await asyncio.sleep(0.05)
+            assert [d["message"] for d in handled] == ["0", "1"]
+            assert stats.counts["chat"][DROPPED] == 3
+
+        asyncio.run(scenario())
+
+    def test_unlimited_types_pass(self):
+        """Test that types without a limit are always handled"""
+        async def scenario():
+            conn, stats, handled, handler = make_limits({})
+            for _ in range(100):
+                await conn.limits.admit(conn, "collect_item", {}, handler)
+            assert len(handled) == 100 and stats.counts == {}
+
+        asyncio.run(scenario())
+
+    def test_disconnect_threshold(self):
+        """Test that shedding past the threshold raises RateLimitExceeded"""
+        async def scenario():
+            conn, stats, handled, handler = make_limits({"chat": Limit(1, 1, DROP)}, disconnect_threshold=3)
+            for i in range(4):
+                await conn.limits.admit(conn, "chat", {"message": str(i)}, handler)
+            with pytest.raises(RateLimitExceeded):
+                await conn.limits.admit(conn, "chat", {"message": "4"}, handler)
+            assert stats.disconnects == 1
+
+        asyncio.run(scenario())
+
+    def test_deferred_handler_error_logged(self, capsys):
+        """Test that a failing held-back update is reported and doesn't stop the ones after it"""
+        async def scenario():
+            conn, stats, handled, handler = make_limits({"enemy_state": Limit(100, 1, key="enemy_id")})
+
+            async def failing(conn, data):
+                if data["enemy_id"] == "e2":
+                    raise ValueError("bad state")
+                await handler(conn, data)
+
+            for enemy_id in ("e1", "e2", "e3"):
+                await conn.limits.admit(conn, "enemy_state", {"enemy_id": enemy_id, "state": {}}, failing)
+            await asyncio.sleep(0.1)
+            assert [d["enemy_id"] for d in handled] == ["e1", "e3"]
+            assert conn.limits.tasks == {}
+
+        asyncio.run(scenario())
+        assert "Deferred enemy_state handler error: bad state" in capsys.readouterr().out
+
+    def test_close_cancels_pending(self):
+        """Test that held-back updates are discarded when the connection closes"""
+        async def scenario():
+            conn, stats, handled, handler = make_limits({"player_state": Limit(10, 1)})
+            for i in range(3):
+                await conn.limits.admit(conn, "player_state", {"state": {"x": i}}, handler)
+            conn.close()
+            await asyncio.sleep(0.15)
+            assert len(handled) == 1 and conn.limits.tasks == {}
+
+        asyncio.run(scenario())
+
+
+class TestDispatcherRateLimit:
+    """The global dispatcher applies the default limits"""
+
+    def test_player_state_flood_relays_latest(self):
+        """Test that a flood is cut to the burst plus one merged update carrying the last state"""
+        async def scenario():
+            host_ws, guest_ws = FakeWebSocket(), FakeWebSocket()
+            host, guest = Connection(host_ws, "new"), Connection(guest_ws, "new")
+            await dispatcher.dispatch(host, {"type": "create_room", "player_id": "host"})
+            await dispatcher.dispatch(guest, {"type": "join_room", "room_id": host.room.room_id, "player_id": "guest"})
+            for i in range(200):
+                await dispatcher.dispatch(host, {"type": "player_state", "state": {"x": float(i)}})
+            await asyncio.sleep(0.05)
+            await host.room.drain()
+
+            updates = guest_ws.messages("player_state_update")
+            assert len(updates) == 31  # Burst of 30, then the rest merged into one
+            assert updates[-1]["state"] == {"x": 199.0}
+            assert host.room.players["host"].x == 199.0
+
+            await dispatcher.dispatch(guest, {"type": "leave_room"})
+            await dispatcher.dispatch(host, {"type": "leave_room"})
+            host.close()
+            guest.close()
+
+        asyncio.run(scenario())
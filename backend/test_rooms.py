@@ -0,0 +1,660 @@
+"""
+Tests for the online multiplayer room logic (rooms.py)
+Covers state relay, tick scheduling and entity bookkeeping without a real WebSocket
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from rooms import GameRoom, RoomManager, EntityDeltaTracker, diff_entities, TOMBSTONE_TTL
+from protocol import encode_message, decode_message, ProtocolError
+from entities import EntityStore, EnemyRecord
+from database import ConnectionPool, migrate
+from roomstate import SQLiteRoomStateStore
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a WebSocket that records every frame sent to it"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        message = decode_message(data)
+        message["binary"] = True
+        self.sent.append(message)
+
+    def messages(self, message_type):
+        return [m for m in self.sent if m.get("type") == message_type]
+
+
+def run(coro):
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run(coro)
+
+
+async def make_room(tick_rate=None):
+    """Create a two-player room with fake connections"""
+    room = GameRoom("ROOM01", "Test Room", "host", tick_rate=tick_rate)
+    host_ws, guest_ws = FakeWebSocket(), FakeWebSocket()
+    await room.add_player("host", "Host", host_ws)
+    await room.add_player("guest", "Guest", guest_ws)
+    await room.drain()
+    host_ws.sent.clear()
+    guest_ws.sent.clear()
+    return room, host_ws, guest_ws
+
+
+class TestImmediateRelay:
+    """Test the default relay mode (no tick rate)"""
+
+    def test_player_state_relayed_immediately(self):
+        """Test that player state goes straight to the other players"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room()
+            await room.relay_player_state("host", {"x": 10.5, "y": 20})
+            await room.drain()
+            return host_ws, guest_ws
+
+        host_ws, guest_ws = run(scenario())
+        assert host_ws.sent == [], "Sender should not receive its own state"
+        assert guest_ws.messages("player_state_update")[0]["state"] == {"x": 10.5, "y": 20}
+
+    def test_enemy_state_excludes_source(self):
+        """Test that enemy state is not echoed back to the reporting player"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room()
+            await room.relay_enemy_state("enemy_1", {"x": 1}, "host")
+            await room.drain()
+            return host_ws, guest_ws
+
+        host_ws, guest_ws = run(scenario())
+        assert host_ws.sent == []
+        assert guest_ws.messages("enemy_state_update")[0]["enemy_id"] == "enemy_1"
+
+
+class TestTickScheduler:
+    """Test coalesced state snapshots for rooms with a tick rate"""
+
+    def test_updates_coalesced_until_tick(self):
+        """Test that updates are held back and merged until the next flush"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room(tick_rate=20)
+            room.stop_tick_loop()
+            for i in range(10):
+                await room.relay_player_state("host", {"x": float(i)})
+            await room.relay_player_state("host", {"y": 5.0})
+            for i in range(30):
+                await room.relay_enemy_state(f"enemy_{i}", {"x": float(i)}, "host")
+            assert guest_ws.sent == [], "Nothing should be sent before the tick"
+            await room.flush_tick()
+            await room.drain()
+            return host_ws, guest_ws
+
+        host_ws, guest_ws = run(scenario())
+        snapshots = guest_ws.messages("state_snapshot")
+        assert len(guest_ws.sent) == 1 and len(snapshots) == 1
+        assert snapshots[0]["players"]["host"] == {"x": 9.0, "y": 5.0}
+        assert len(snapshots[0]["enemies"]) == 30
+        # Host sent every update itself, so it has nothing to receive
+        assert host_ws.sent == []
+
+    def test_snapshot_excludes_own_updates(self):
+        """Test that each player only receives the other players' states"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room(tick_rate=30)
+            room.stop_tick_loop()
+            await room.relay_player_state("host", {"x": 1.0})
+            await room.relay_player_state("guest", {"x": 2.0})
+            await room.flush_tick()
+            await room.drain()
+            return host_ws, guest_ws
+
+        host_ws, guest_ws = run(scenario())
+        assert host_ws.messages("state_snapshot")[0]["players"] == {"guest": {"x": 2.0}}
+        assert guest_ws.messages("state_snapshot")[0]["players"] == {"host": {"x": 1.0}}
+
+    def test_empty_tick_sends_nothing(self):
+        """Test that a tick with no dirty state does not send frames"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room(tick_rate=60)
+            room.stop_tick_loop()
+            await room.flush_tick()
+            await room.drain()
+            return host_ws, guest_ws
+
+        host_ws, guest_ws = run(scenario())
+        assert host_ws.sent == [] and guest_ws.sent == []
+
+    def test_tick_loop_flushes_periodically(self):
+        """Test that the background tick loop delivers pending state"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room(tick_rate=60)
+            await room.relay_player_state("host", {"x": 3.0})
+            await asyncio.sleep(0.1)
+            room.stop_tick_loop()
+            await room.drain()
+            return guest_ws
+
+        guest_ws = run(scenario())
+        assert guest_ws.messages("state_snapshot")[0]["players"]["host"] == {"x": 3.0}
+
+    def test_tick_rate_clamped(self):
+        """Test that room tick rates are kept within the supported range"""
+        async def scenario():
+            manager = RoomManager()
+            room = await manager.create_room("Room", "host", "Host", FakeWebSocket(), tick_rate=1000)
+            room.stop_tick_loop()
+            return room
+
+        room = run(scenario())
+        assert room.tick_rate == 60
+        assert room.get_room_info()["tick_rate"] == 60
+
+
+class TestDeltaSync:
+    """Test delta-compressed entity syncs with acknowledged baselines"""
+
+    def test_diff_entities(self):
+        """Test that only changed fields, new entities and removals are reported"""
+        baseline = {"a": {"x": 1, "y": 2}, "b": {"x": 5}}
+        current = {"a": {"x": 1, "y": 3}, "c": {"x": 9}}
+        changed, removed = diff_entities(baseline, current)
+        assert changed == {"a": {"y": 3}, "c": {"x": 9}}
+        assert removed == ["b"]
+
+    def test_legacy_clients_get_full_sync(self):
+        """Test that players without delta sync still receive full entity lists"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room()
+            room.spawn_enemy({"enemy_id": "e1", "x": 10, "y": 20})
+            await room.broadcast_entities_sync(exclude="host")
+            await room.drain()
+            return host_ws, guest_ws
+
+        host_ws, guest_ws = run(scenario())
+        assert host_ws.sent == []
+        sync = guest_ws.messages("entities_sync")[0]
+        assert [e["enemy_id"] for e in sync["enemies"]] == ["e1"]
+
+    def test_delta_after_acknowledgement(self):
+        """Test that acknowledged baselines turn the next sync into a delta"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room()
+            room.enable_delta_sync("guest")
+            room.spawn_enemy({"enemy_id": "e1", "x": 10, "y": 20})
+            room.spawn_enemy({"enemy_id": "e2", "x": 30, "y": 20})
+            room.spawn_coin({"coin_id": "c1", "x": 1, "y": 1})
+            await room.broadcast_entities_sync(exclude="host")
+            await room.drain()
+            first = guest_ws.sent[-1]
+            assert first["type"] == "entities_sync"
+            assert room.acknowledge_entities("guest", first["sequence_id"])
+
+            room.update_enemy_state("e1", {"x": 15})
+            room.kill_enemy("e2", "host")
+            room.mark_item_collected("coin", "c1", "guest")
+            await room.broadcast_entities_sync(exclude="host")
+            await room.drain()
+            return first, guest_ws.sent[-1]
+
+        first, delta = run(scenario())
+        assert delta["type"] == "entities_delta"
+        assert delta["baseline_id"] == first["sequence_id"]
+        assert delta["sequence_id"] > first["sequence_id"]
+        assert delta["enemies"]["e1"] == {"x": 15}
+        assert delta["enemies"]["e2"]["is_alive"] is False
+        assert delta["removed_coins"] == ["c1"]
+
+    def test_unacknowledged_sync_stays_full(self):
+        """Test that a player who never acknowledges keeps getting full syncs"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room()
+            room.enable_delta_sync("guest")
+            room.spawn_enemy({"enemy_id": "e1", "x": 10, "y": 20})
+            await room.broadcast_entities_sync(exclude="host")
+            await room.broadcast_entities_sync(exclude="host")
+            await room.drain()
+            return room, guest_ws
+
+        room, guest_ws = run(scenario())
+        assert [m["type"] for m in guest_ws.sent] == ["entities_sync", "entities_sync"]
+        # Unknown sequence IDs can't become a baseline
+        assert not room.acknowledge_entities("guest", 9999)
+
+    def test_baseline_history_bounded(self):
+        """Test that old snapshots are evicted from a player's history"""
+        tracker = EntityDeltaTracker(max_history=4)
+        for seq in range(10):
+            tracker.record(seq, {"enemies": {}, "coins": {}})
+        assert list(tracker.history) == [6, 7, 8, 9]
+        assert not tracker.acknowledge(2)
+        assert tracker.acknowledge(8)
+        assert list(tracker.history) == [8, 9]
+
+
+class TestBinaryProtocol:
+    """Test the packed binary encoding for high-frequency messages"""
+
+    def test_player_state_round_trip(self):
+        """Test that a player state update survives encode/decode"""
+        message = {
+            "type": "player_state_update",
+            "player_id": "abc123",
+            "state": {"x": 1234.56, "y": -20.25, "velocity_x": 0.1, "health": 80,
+                      "facing_right": False, "is_jumping": True}
+        }
+        payload = encode_message(message)
+        assert payload is not None
+        assert len(payload) < len(json.dumps(message)) / 2
+        assert decode_message(payload) == message
+
+    def test_enemy_state_names_packed(self):
+        """Test that known enemy state names use the compact enum"""
+        message = {"type": "enemy_state_update", "enemy_id": "enemy_7", "state": {"state": "attacking", "x": 5.0}}
+        assert decode_message(encode_message(message)) == message
+
+    def test_unsupported_content_falls_back(self):
+        """Test that messages outside the fixed layout are not binary encoded"""
+        assert encode_message({"type": "chat", "message": "hi"}) is None
+        assert encode_message({"type": "player_state_update", "player_id": "p", "state": {"weapon": "laser"}}) is None
+        assert encode_message({"type": "player_state_update", "player_id": "p", "state": {"score": 2 ** 40}}) is None
+        assert encode_message({"type": "player_state_update", "player_id": "p", "state": {"x": 1e40}}) is None
+        assert encode_message({"type": "player_state_update", "player_id": "p", "state": {"x": float("nan")}}) is None
+        assert encode_message({"type": "player_state_update", "player_id": "p", "state": {"x": 10 ** 400}}) is None
+
+    def test_snapshot_round_trip(self):
+        """Test that tick snapshots can be packed"""
+        message = {
+            "type": "state_snapshot",
+            "sequence_id": 42,
+            "server_timestamp": 1700000000123.0,
+            "players": {"p1": {"x": 1.5}},
+            "enemies": {"e1": {"x": 2.0, "is_alive": True}, "e2": {"state": "dead"}}
+        }
+        assert decode_message(encode_message(message)) == message
+
+    def test_malformed_frame_rejected(self):
+        """Test that truncated or unknown frames raise ProtocolError"""
+        payload = encode_message({"type": "enemy_state", "enemy_id": "e1", "state": {"x": 1.0}})
+        with pytest.raises(ProtocolError):
+            decode_message(payload[:-2])
+        with pytest.raises(ProtocolError):
+            decode_message(bytes([250]))
+
+    def test_broadcast_encodes_per_format(self):
+        """Test that binary players get packed frames and JSON players get text"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_room()
+            room.set_encoding("guest", "binary")
+            await room.relay_player_state("host", {"x": 10.0, "y": 20.0})
+            await room.relay_enemy_state("e1", {"x": 1.0}, "guest")
+            await room.broadcast({"type": "chat", "message": "hello"})
+            await room.drain()
+            return host_ws, guest_ws
+
+        host_ws, guest_ws = run(scenario())
+        assert guest_ws.messages("player_state_update")[0].get("binary") is True
+        assert guest_ws.messages("chat")[0].get("binary") is None
+        assert host_ws.messages("enemy_state_update")[0].get("binary") is None
+
+
+class SlowWebSocket(FakeWebSocket):
+    """WebSocket whose sends block until released, like a client on a bad network"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def send_text(self, data):
+        await self.release.wait()
+        await super().send_text(data)
+
+
+class TestSendQueues:
+    """Test per-connection outbound queues and overflow policies"""
+
+    def test_slow_client_does_not_block_others(self):
+        """Test that a stalled connection doesn't delay delivery to other players"""
+        async def scenario():
+            room = GameRoom("ROOM01", "Test Room", "host")
+            slow_ws, fast_ws = SlowWebSocket(), FakeWebSocket()
+            await room.add_player("slow", "Slow", slow_ws)
+            await room.add_player("fast", "Fast", fast_ws)
+            await room.broadcast({"type": "chat", "message": "hi"})
+            await room.senders["fast"].drain()
+            delivered_while_stalled = len(fast_ws.messages("chat"))
+            slow_ws.release.set()
+            await room.drain()
+            return delivered_while_stalled, slow_ws
+
+        delivered_while_stalled, slow_ws = run(scenario())
+        assert delivered_while_stalled == 1
+        assert len(slow_ws.messages("chat")) == 1
+
+    def test_state_updates_drop_oldest(self):
+        """Test that a backed-up queue sheds old state updates but keeps events"""
+        async def scenario():
+            room = GameRoom("ROOM01", "Test Room", "host", send_queue_size=8)
+            slow_ws = SlowWebSocket()
+            await room.add_player("slow", "Slow", slow_ws)
+            await room.broadcast({"type": "enemy_killed", "enemy_id": "e1"})
+            for i in range(20):
+                await room.relay_enemy_state("e2", {"x": float(i)}, "host")
+            await room.broadcast({"type": "item_collected", "item_id": "c1"})
+            dropped = room.senders["slow"].dropped
+            slow_ws.release.set()
+            await room.drain()
+            return dropped, slow_ws
+
+        dropped, slow_ws = run(scenario())
+        assert dropped > 0
+        assert len(slow_ws.messages("enemy_killed")) == 1
+        assert len(slow_ws.messages("item_collected")) == 1
+        # The newest state update always survives
+        assert slow_ws.messages("enemy_state_update")[-1]["state"] == {"x": 19.0}
+
+    def test_failed_send_removes_player(self):
+        """Test that a connection whose send fails is dropped from the room"""
+        class BrokenWebSocket(FakeWebSocket):
+            async def send_text(self, data):
+                raise RuntimeError("connection reset")
+
+        async def scenario():
+            room = GameRoom("ROOM01", "Test Room", "host")
+            await room.add_player("host", "Host", FakeWebSocket())
+            await room.add_player("broken", "Broken", BrokenWebSocket())
+            await room.broadcast({"type": "chat", "message": "hi"})
+            for _ in range(5):
+                await asyncio.sleep(0)
+            return room
+
+        room = run(scenario())
+        assert "broken" not in room.players
+        assert "broken" not in room.senders
+
+
+    def test_hard_limit_removes_player(self):
+        """Test that a client too far behind on events is dropped from the room"""
+        async def scenario():
+            room = GameRoom("ROOM01", "Test Room", "host", send_queue_size=2)
+            await room.add_player("host", "Host", FakeWebSocket())
+            await room.add_player("slow", "Slow", SlowWebSocket())
+            sender = room.senders["slow"]
+            while not sender.closed:
+                await room.broadcast({"type": "item_collected", "item_id": "c1"})
+            await sender._error_task
+            return room
+
+        room = run(scenario())
+        assert "slow" not in room.players
+        assert "slow" not in room.senders
+
+
+class TestEntityStore:
+    """Test slotted entity records and the active-entity indexes"""
+
+    def test_records_use_slots(self):
+        """Test that records don't carry a per-instance dict"""
+        record = EnemyRecord({"enemy_id": "e1", "x": 1.0})
+        assert not hasattr(record, "__dict__")
+        assert record.to_dict() == {"enemy_id": "e1", "x": 1.0}
+
+    def test_unknown_fields_round_trip(self):
+        """Test that fields outside the schema are kept"""
+        store = EntityStore(EnemyRecord, "is_alive", True, "death_timestamp")
+        store.put("e1", {"enemy_id": "e1", "coinReward": 3})
+        store.update("e1", {"phase": 2})
+        assert store.get_dict("e1") == {"enemy_id": "e1", "coinReward": 3, "phase": 2}
+
+    def test_alive_index_maintained(self):
+        """Test that kills remove enemies from the alive index"""
+        room = GameRoom("ROOM01", "Test Room", "host")
+        for i in range(100):
+            room.spawn_enemy({"enemy_id": f"e{i}", "x": i, "y": 0})
+        for i in range(90):
+            assert room.kill_enemy(f"e{i}", "host")
+        assert not room.kill_enemy("e0", "host"), "Dead enemies can't be killed twice"
+        assert len(room.enemies.active) == 10
+        assert [e["enemy_id"] for e in room.get_active_enemies()] == [f"e{i}" for i in range(90, 100)]
+
+    def test_sync_includes_recently_dead(self):
+        """Test that sync enemies include deaths inside the window only"""
+        room = GameRoom("ROOM01", "Test Room", "host")
+        room.spawn_enemy({"enemy_id": "alive", "x": 0, "y": 0})
+        room.spawn_enemy({"enemy_id": "fresh", "x": 0, "y": 0})
+        room.spawn_enemy({"enemy_id": "old", "x": 0, "y": 0})
+        room.kill_enemy("fresh", "host")
+        room.kill_enemy("old", "host")
+        room.enemies.update("old", {"death_timestamp": 0})
+        room.enemies.deactivated[-1] = (0, "old")
+        ids = {e["enemy_id"] for e in room.get_sync_enemies()}
+        assert ids == {"alive", "fresh"}
+
+    def test_collected_items_leave_index(self):
+        """Test that collected coins and powerups are no longer listed"""
+        room = GameRoom("ROOM01", "Test Room", "host")
+        room.spawn_coin({"coin_id": "c1", "x": 0, "y": 0})
+        room.spawn_coin({"coin_id": "c2", "x": 0, "y": 0})
+        room.spawn_powerup({"powerup_id": "p1", "x": 0, "y": 0})
+        room.mark_item_collected("coin", "c1", "host")
+        room.mark_item_collected("powerup", "p1", "host")
+        assert [c["coin_id"] for c in room.get_uncollected_coins()] == ["c2"]
+        assert room.get_uncollected_powerups() == []
+        assert room.coins.get("c1").get("collected_by") == "host"
+
+    def test_host_sync_cannot_resurrect(self):
+        """Test that stale host data doesn't bring a killed enemy back"""
+        room = GameRoom("ROOM01", "Test Room", "host")
+        room.spawn_enemy({"enemy_id": "e1", "x": 0, "y": 0})
+        room.kill_enemy("e1", "guest")
+        room.apply_host_sync([{"enemy_id": "e1", "is_alive": True, "x": 5}], [])
+        assert room.get_active_enemies() == []
+
+
+class TestCompaction:
+    """Test eviction of dead/collected entities and tombstone expiry"""
+
+    def make_long_session(self, rounds=50):
+        room = GameRoom("ROOM01", "Test Room", "host")
+        for i in range(rounds):
+            room.spawn_enemy({"enemy_id": f"e{i}", "x": i, "y": 0})
+            room.spawn_coin({"coin_id": f"c{i}", "x": i, "y": 0})
+            room.kill_enemy(f"e{i}", "host")
+            room.mark_item_collected("coin", f"c{i}", "host")
+        return room
+
+    def test_old_entities_evicted(self):
+        """Test that entities past the sync window are dropped from storage"""
+        room = self.make_long_session()
+        now = room.enemies.get("e0").get("death_timestamp")
+        assert room.compact(now)["evicted_enemies"] == 0, "Recent deaths stay for the sync window"
+        stats = room.compact(now + 60)
+        assert stats["evicted_enemies"] == 50 and stats["evicted_coins"] == 50
+        assert len(room.enemies) == 0 and len(room.coins) == 0
+        assert len(room.enemy_tombstones) == 50
+
+    def test_tombstones_block_resurrection(self):
+        """Test that stale host syncs can't revive evicted entities"""
+        room = self.make_long_session(rounds=1)
+        now = room.enemies.get("e0").get("death_timestamp")
+        room.compact(now + 60)
+        room.apply_host_sync([{"enemy_id": "e0", "is_alive": True}], [{"coin_id": "c0", "x": 0, "y": 0}])
+        assert room.get_active_enemies() == [] and room.get_uncollected_coins() == []
+        assert not room.kill_enemy("e0", "guest")
+        assert not room.mark_item_collected("coin", "c0", "guest")
+
+    def test_synced_dead_without_timestamp_evicted(self):
+        """Test that entities a host sync reports dead/collected without a time are still evicted"""
+        room = GameRoom("ROOM01", "Test Room", "host")
+        room.apply_host_sync([{"enemy_id": "e0", "is_alive": False}],
+                             [{"coin_id": "c0", "x": 0, "y": 0, "is_collected": True}])
+        now = room.enemies.get("e0").get("death_timestamp")
+        collected_at = room.coins.get("c0").get("collected_timestamp")
+        assert now is not None and collected_at is not None
+
+        # A later sync still listing the coin doesn't restart its window
+        time.sleep(0.01)
+        room.apply_host_sync([], [{"coin_id": "c0", "x": 0, "y": 0, "is_collected": True}])
+        assert room.coins.get("c0").get("collected_timestamp") == collected_at
+        stats = room.compact(now + 60)
+        assert stats["evicted_enemies"] == 1 and stats["evicted_coins"] == 1
+
+    def test_tombstones_expire(self):
+        """Test that memory stays bounded once tombstones pass their TTL"""
+        room = self.make_long_session()
+        now = room.enemies.get("e0").get("death_timestamp")
+        room.compact(now + 60)
+        stats = room.compact(now + TOMBSTONE_TTL + 60)
+        assert stats["expired_tombstones"] == 100
+        assert not room.enemy_tombstones and not room.collected_coins
+        assert not room.enemies.deactivated
+
+    def test_explicit_spawn_clears_tombstone(self):
+        """Test that the host can respawn an enemy with a reused ID"""
+        room = self.make_long_session(rounds=1)
+        now = room.enemies.get("e0").get("death_timestamp")
+        room.compact(now + 60)
+        room.spawn_enemy({"enemy_id": "e0", "x": 0, "y": 0})
+        assert [e["enemy_id"] for e in room.get_active_enemies()] == ["e0"]
+
+
+
+class TestCheckpointing:
+    """Test room snapshots and restore across a restart"""
+
+    @pytest.fixture
+    def store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = ConnectionPool(os.path.join(tmp, "rooms.db"), size=2)
+            with pool.connection() as conn:
+                migrate(conn)
+            yield SQLiteRoomStateStore(pool)
+            pool.close()
+
+    async def make_started_room(self, manager):
+        room = await manager.create_room("Room", "host", "Host", FakeWebSocket())
+        await manager.join_room(room.room_id, "guest", "Guest", FakeWebSocket())
+        room.game_started = True
+        room.update_player_state("host", {"x": 123.5, "score": 40})
+        room.spawn_enemy({"enemy_id": "e1", "x": 5, "y": 6})
+        room.kill_enemy("e1", "host")
+        room.mark_item_collected("coin", "c1", "guest")
+        return room
+
+    def test_restore_allows_reconnect(self, store):
+        """Test that a restarted manager accepts the tokens handed out before the restart"""
+        async def before_restart():
+            manager = RoomManager()
+            manager.attach_state_store(store)
+            room = await self.make_started_room(manager)
+            tokens = {pid: room.issue_reconnect_token(pid) for pid in ("host", "guest")}
+            await manager.checkpoint()
+            return room.room_id, tokens
+
+        async def after_restart(room_id, tokens):
+            manager = RoomManager()
+            assert manager.attach_state_store(store) == 1
+            room = manager.get_room(room_id)
+            assert room.game_started and room.is_empty
+            assert not await room.reconnect_player("guest", FakeWebSocket(), "wrong-token")
+            assert await room.reconnect_player("host", FakeWebSocket(), tokens["host"])
+            return room
+
+        room_id, tokens = run(before_restart())
+        room = run(after_restart(room_id, tokens))
+        assert room.players["host"].x == 123.5 and room.players["host"].score == 40
+        assert room.get_player_number("host") == 1
+        assert room.enemies.get("e1").get("is_alive") is False
+        assert room.is_item_collected("coin", "c1")
+
+    def test_lobby_rooms_not_restored(self, store):
+        """Test that a lobby nobody can reconnect to is dropped instead of listed as joinable"""
+        async def before_restart():
+            manager = RoomManager()
+            manager.attach_state_store(store)
+            await manager.create_room("Lobby", "host", "Host", FakeWebSocket())
+            await manager.checkpoint()
+
+        async def after_restart():
+            manager = RoomManager()
+            assert manager.attach_state_store(store) == 0
+            assert manager.get_available_rooms() == []
+            await manager.checkpoint()
+
+        run(before_restart())
+        run(after_restart())
+        assert store.load("local") == []
+
+    def test_abandoned_restored_room_expires(self, store):
+        """Test that a restored game nobody reconnects to is removed after the reconnect window"""
+        async def before_restart():
+            manager = RoomManager()
+            manager.attach_state_store(store)
+            await self.make_started_room(manager)
+            await manager.checkpoint()
+
+        async def after_restart():
+            manager = RoomManager()
+            assert manager.attach_state_store(store) == 1
+            [room] = manager.rooms.values()
+            assert manager.expire_abandoned_rooms() == 0, "Players still have time to reconnect"
+            for pid in room.disconnect_time:
+                room.disconnect_time[pid] -= timedelta(seconds=room.reconnect_timeout + 1)
+            assert manager.get_all_rooms() == [], "Listings skip it before it is removed"
+            later = datetime.now()
+            assert manager.expire_abandoned_rooms(later) == 1
+            assert manager.get_all_rooms() == []
+            await manager.checkpoint()
+
+        run(before_restart())
+        run(after_restart())
+        assert store.load("local") == []
+
+    def test_only_dirty_rooms_written(self, store):
+        """Test that an unchanged room is not re-serialized"""
+        async def scenario():
+            manager = RoomManager()
+            manager.attach_state_store(store)
+            room = await self.make_started_room(manager)
+            first, _ = manager._collect_checkpoint()
+            second, _ = manager._collect_checkpoint()
+            room.dirty = True
+            third, _ = manager._collect_checkpoint()
+            return first, second, third
+
+        first, second, third = run(scenario())
+        assert len(first) == 1 and second == [] and len(third) == 1
+
+    def test_removed_rooms_deleted(self, store):
+        """Test that a room that emptied out is not restored"""
+        async def scenario():
+            manager = RoomManager()
+            manager.attach_state_store(store)
+            room = await manager.create_room("Room", "host", "Host", FakeWebSocket())
+            await manager.checkpoint()
+            await manager.leave_room(room.room_id, "host")
+            await manager.checkpoint()
+
+        run(scenario())
+        assert store.load("local") == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -14,6 +14,9 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from main import app, API_KEY, CORS_ORIGINS, IS_RAILWAY
 
+# Reloads of main with a cleared environment still keep game.db and the logs in tmp (see conftest.py)
+TEST_PATHS = {name: os.environ[name] for name in ("DATA_DIR", "GAME_LOG_PATH")}
+
 
 @pytest.fixture
 def client():
@@ -33,7 +36,7 @@ class TestCORSConfiguration:
     def test_cors_not_wildcard_in_local_mode(self):
         """Test that CORS is not wildcard in local development mode"""
         # When not in Railway mode, should use specific origins
-        with patch.dict(os.environ, {"RAILWAY_ENVIRONMENT": "", "ALLOW_ALL_ORIGINS": "false"}, clear=True):
+        with patch.dict(os.environ, {**TEST_PATHS, "RAILWAY_ENVIRONMENT": "", "ALLOW_ALL_ORIGINS": "false"}, clear=True):
             # Re-import to get fresh configuration
             import importlib
             import main
@@ -45,6 +48,7 @@ class TestCORSConfiguration:
     def test_cors_allows_only_specified_origins_local(self):
         """Test that only specified origins are allowed in local mode"""
         with patch.dict(os.environ, {
+            **TEST_PATHS,
             "ALLOWED_ORIGINS": "http://localhost:3000,http://localhost:5173",
             "RAILWAY_ENVIRONMENT": "",
             "ALLOW_ALL_ORIGINS": "false"
@@ -128,7 +132,7 @@ class TestSecurityHeaders:
 
     def test_cache_control_for_api_endpoints(self, client, valid_headers):
         """Test that API endpoints have proper no-cache headers"""
-        response = client.get("/api/scores/leaderboard", headers=valid_headers)
+        response = client.get("/api/scores/rank/100", headers=valid_headers)
         assert "cache-control" in response.headers, "Cache-Control header should be present"
         cache_control = response.headers["cache-control"]
         assert "no-cache" in cache_control, "Should have no-cache directive"
@@ -395,7 +399,8 @@ class TestErrorHandling:
     def test_500_errors_handled_gracefully(self, client, valid_headers):
         """Test that 500 errors are handled gracefully"""
         # Try to trigger a server error with invalid data
-        with patch('main.sqlite3.connect', side_effect=Exception("Database error")):
+        with patch('main.response_cache.get', return_value=None), \
+                patch('main.leaderboard_index.top', side_effect=Exception("Database error")):
             response = client.get("/api/scores/leaderboard", headers=valid_headers)
             # Should return 500 but not crash
             assert response.status_code >= 400
@@ -0,0 +1,57 @@
+"""
+Tests for the pluggable JSON serializer (serializer.py)
+Run with: pytest test_serializer.py -v
+"""
+
+import json
+
+import pytest
+
+import serializer
+from protocol import encode_message
+
+STATE_FRAME = {
+    "type": "player_state",
+    "state": {"x": 120.25, "y": 340.5, "velocity_x": -3.5, "facing_right": True, "name": "Jümper"},
+}
+
+
+@pytest.fixture(params=sorted(serializer.BACKENDS))
+def backend(request):
+    """Run a test against every installed backend, restoring the default afterwards"""
+    default = serializer.backend.name
+    serializer.use_backend(request.param)
+    yield request.param
+    serializer.use_backend(default)
+
+
+class TestSerializer:
+    """Round trips and compatibility with the stdlib output"""
+
+    def test_round_trip(self, backend):
+        """Test that dumps/loads round-trip a state frame, from bytes and str"""
+        encoded = serializer.dumps(STATE_FRAME)
+        assert isinstance(encoded, bytes)
+        assert serializer.loads(encoded) == STATE_FRAME
+        assert serializer.loads(serializer.dumps_text(STATE_FRAME)) == STATE_FRAME
+
+    def test_output_readable_by_stdlib(self, backend):
+        """Test that clients parsing with a plain JSON parser see the same message"""
+        message = {"type": "item_collected", "player_score": None, "ids": [1, 2], 3: "int key"}
+        assert json.loads(serializer.dumps_text(message)) == json.loads(json.dumps(message))
+
+    def test_malformed_input(self, backend):
+        """Test that both backends raise the shared DecodeError"""
+        with pytest.raises(serializer.DecodeError):
+            serializer.loads("{not json")
+
+    def test_decode_frame(self, backend):
+        """Test decoding of raw ASGI text and binary frames"""
+        assert serializer.decode_frame({"type": "websocket.receive", "text": '{"type":"ping"}'}) == {"type": "ping"}
+        packed = encode_message({"type": "player_state", "state": {"x": 1.0}})
+        assert serializer.decode_frame({"type": "websocket.receive", "bytes": packed})["state"] == {"x": 1.0}
+
+    def test_unknown_backend_rejected(self):
+        """Test that switching to a backend that isn't installed fails loudly"""
+        with pytest.raises(ValueError):
+            serializer.use_backend("simdjson")
@@ -0,0 +1,190 @@
+"""
+Tests for the spatial index and area-of-interest filtering (spatial.py)
+Run with: pytest test_spatial.py -v
+"""
+
+import asyncio
+
+from entities import EntityStore, EnemyRecord
+from quantize import FixedPoint
+from rooms import GameRoom
+from spatial import AreaOfInterest, Window, XGrid
+from test_rooms import FakeWebSocket
+
+
+async def make_aoi_room(width=400, height=None, tick_rate=None, fixed_point=None):
+    """Two-player AOI room: host starts at x=400, guest at x=500"""
+    room = GameRoom("ROOM01", "Test Room", "host", tick_rate=tick_rate, fixed_point=fixed_point,
+                    aoi_width=width, aoi_height=height)
+    room.stop_tick_loop()
+    host_ws, guest_ws = FakeWebSocket(), FakeWebSocket()
+    await room.add_player("host", "Host", host_ws)
+    await room.add_player("guest", "Guest", guest_ws)
+    room.stop_tick_loop()
+    await room.drain()
+    host_ws.sent.clear()
+    guest_ws.sent.clear()
+    return room, host_ws, guest_ws
+
+
+async def move_player(room, player_id, x):
+    room.update_player_state(player_id, {"x": x})
+    await room.relay_player_state(player_id, {"x": x})
+
+
+class TestXGrid:
+    """Uniform x-column grid"""
+
+    def test_query_only_returns_entities_in_window(self):
+        """Test that queries filter on x and, with a height, on y"""
+        grid = XGrid(100)
+        grid.move("a", 50, 0)
+        grid.move("b", 250, 0)
+        grid.move("c", 260, 900)
+        grid.move("d", 1000, 0)
+        assert grid.query(Window(0, 300, None, None)) == ["a", "b", "c"]
+        assert grid.query(Window(0, 300, -10, 10)) == ["a", "b"]
+
+    def test_move_and_remove(self):
+        """Test that moved entities change column and removed ones disappear"""
+        grid = XGrid(100)
+        grid.move("a", 50)
+        grid.move("a", 550)
+        assert grid.query(Window(0, 100, None, None)) == []
+        assert grid.query(Window(500, 600, None, None)) == ["a"]
+        grid.remove("a")
+        assert len(grid) == 0 and grid.cells == {}
+
+    def test_unplaced_always_returned(self):
+        """Test that entities without a numeric x are never filtered out"""
+        grid = XGrid(100)
+        grid.move("a", None)
+        assert grid.query(Window(5000, 5100, None, None)) == ["a"]
+        grid.move("a", 20)
+        assert grid.query(Window(5000, 5100, None, None)) == []
+
+    def test_wide_window_walks_occupied_columns(self):
+        """Test that a window wider than the grid gives the same result"""
+        grid = XGrid(64)
+        for i in range(5):
+            grid.move(f"e{i}", i * 200.0, 0)
+        assert sorted(grid.query(Window(-1e9, 1e9, None, None))) == [f"e{i}" for i in range(5)]
+
+    def test_entity_store_keeps_grid_current(self):
+        """Test that puts, position updates, removals and restores update the grid"""
+        store = EntityStore(EnemyRecord, 'is_alive', True, 'death_timestamp')
+        store.enable_grid(100)
+        store.put("e1", {"enemy_id": "e1", "x": 10, "y": 0})
+        store.put("e2", {"enemy_id": "e2", "x": 900, "y": 0})
+        store.update("e2", {"x": 50})
+        assert store.grid.query(Window(0, 100, None, None)) == ["e1", "e2"]
+        store.remove("e1")
+        store.restore({"e3": {"enemy_id": "e3", "x": 70, "y": 0}})
+        assert store.grid.query(Window(0, 100, None, None)) == ["e3"]
+
+
+class TestAreaOfInterest:
+    """Room traffic filtered to each player's window"""
+
+    def test_window_and_cell_size(self):
+        """Test that the window is centred on the player and cells are about half of it"""
+        aoi = AreaOfInterest(800, 200)
+        assert aoi.window(1000, 50) == Window(600, 1400, -50, 150)
+        assert aoi.cell_size == 400
+        assert AreaOfInterest(40).cell_size == 64
+
+    def test_sync_only_carries_entities_in_view(self):
+        """Test that each player's entities_sync is cut to its own window"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_aoi_room()
+            room.spawn_enemy({"enemy_id": "near", "x": 350.0, "y": 0.0})
+            room.spawn_enemy({"enemy_id": "far", "x": 5000.0, "y": 0.0})
+            room.spawn_coin({"coin_id": "c_near", "x": 450.0, "y": 0.0})
+            room.spawn_coin({"coin_id": "c_far", "x": 680.0, "y": 0.0})
+            await room.broadcast_entities_sync()
+            await room.drain()
+
+            host_sync = host_ws.messages("entities_sync")[0]
+            guest_sync = guest_ws.messages("entities_sync")[0]
+            assert [e["enemy_id"] for e in host_sync["enemies"]] == ["near"]
+            assert [c["coin_id"] for c in host_sync["coins"]] == ["c_near"]
+            assert [c["coin_id"] for c in guest_sync["coins"]] == ["c_near", "c_far"]
+
+        asyncio.run(scenario())
+
+    def test_enemy_updates_outside_view_skipped(self):
+        """Test that immediate enemy updates only go to players that can see the enemy"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_aoi_room()
+            room.spawn_enemy({"enemy_id": "e1", "x": 5000.0, "y": 0.0})
+            room.update_enemy_state("e1", {"x": 5010.0})
+            await room.relay_enemy_state("e1", {"x": 5010.0}, "host")
+            await room.drain()
+            assert guest_ws.sent == []
+
+        asyncio.run(scenario())
+
+    def test_enemy_entering_view_sent_in_full(self):
+        """Test that an enemy walking into view arrives as enemy_spawned, then as updates"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_aoi_room()
+            room.spawn_enemy({"enemy_id": "e1", "x": 900.0, "y": 0.0, "enemy_type": "slime"})
+            for x in (650.0, 640.0):
+                room.update_enemy_state("e1", {"x": x})
+                await room.relay_enemy_state("e1", {"x": x}, "host")
+            await room.drain()
+
+            spawned = guest_ws.messages("enemy_spawned")
+            assert len(spawned) == 1 and spawned[0]["enemy"]["enemy_type"] == "slime"
+            assert spawned[0]["enemy"]["x"] == 650.0
+            assert [m["state"] for m in guest_ws.messages("enemy_state_update")] == [{"x": 640.0}]
+
+        asyncio.run(scenario())
+
+    def test_player_moving_brings_enemies_into_view(self):
+        """Test that moving the player sends the enemies it now sees, once"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_aoi_room()
+            room.spawn_enemy({"enemy_id": "e1", "x": 3000.0, "y": 0.0})
+            await move_player(room, "guest", 2900.0)
+            await move_player(room, "guest", 2910.0)
+            await room.drain()
+            assert [m["enemy"]["enemy_id"] for m in guest_ws.messages("enemy_spawned")] == ["e1"]
+            assert host_ws.messages("enemy_spawned") == []
+
+        asyncio.run(scenario())
+
+    def test_tick_snapshot_filtered(self):
+        """Test that tick snapshots only carry enemies in the recipient's view"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_aoi_room(tick_rate=20)
+            room.spawn_enemy({"enemy_id": "near", "x": 520.0, "y": 0.0})
+            room.spawn_enemy({"enemy_id": "far", "x": 5000.0, "y": 0.0})
+            room.aoi.set_view("guest", ["near"])
+            await room.relay_enemy_state("near", {"x": 521.0}, "host")
+            await room.relay_enemy_state("far", {"x": 5001.0}, "host")
+            await room.flush_tick()
+            await room.drain()
+            assert list(guest_ws.messages("state_snapshot")[0]["enemies"]) == ["near"]
+
+        asyncio.run(scenario())
+
+    def test_fixed_point_window_in_pixels(self):
+        """Test that the window is given in pixels in fixed-point rooms"""
+        async def scenario():
+            room, host_ws, guest_ws = await make_aoi_room(fixed_point=FixedPoint())
+            assert room.players["host"].x == 40000
+            room.spawn_enemy(room.ingest_state({"enemy_id": "e1", "x": 550.0, "y": 0.0}))
+            await room.broadcast_entities_sync()
+            await room.drain()
+            assert [e["x"] for e in host_ws.messages("entities_sync")[0]["enemies"]] == [550.0]
+
+        asyncio.run(scenario())
+
+    def test_checkpoint_keeps_aoi(self):
+        """Test that a restored room filters with the same window"""
+        room = GameRoom("ROOM01", "Room", "host", aoi_width=300, aoi_height=200)
+        room.spawn_enemy({"enemy_id": "e1", "x": 10.0, "y": 0.0})
+        restored = GameRoom.from_snapshot(room.to_snapshot())
+        assert restored.aoi_size == (300, 200)
+        assert restored.enemies.grid.query(restored.aoi.window(0, 0)) == ["e1"]